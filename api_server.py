@@ -0,0 +1,346 @@
+"""Headless HTTP API for the Cross-Domain Learning Tutor.
+
+A plain ASGI application wrapping AsyncCrossDomainTutor, so programmatic clients (and
+a load balancer) can reach the tutor without going through the Streamlit UI. Tutors
+are kept per learner and field pair in a TutorRegistry and share the explanation
+caches and the session store with the Streamlit app, so any worker can serve any
+learner. Identical explanation requests in flight at the same time within a worker are
+coalesced into one set of upstream calls.
+
+Endpoints:
+    GET  /health: Liveness check.
+    GET  /metrics: Prometheus metrics of the worker.
+    POST /v1/explain: {"learner_id", "source_field", "target_field", "query", "stream"}.
+        With "stream" the response is NDJSON: {"delta": ...} lines, then {"done": true, "run": ...}
+        or {"error": ...}.
+    POST /v1/tests: {"learner_id", "source_field", "target_field", "difficulty_level"}.
+        The test is returned with a "test_id".
+    POST /v1/tests/evaluate: {"learner_id", "source_field", "target_field", "test_id", "answers"}.
+        Only tests the server gave the learner are graded, against the stored answer key.
+
+Model calls that run out of their deadline answer 504, calls to a model paused by the
+circuit breaker or turned away by a full scheduler queue answer 503 with "retry_after",
+and other provider errors answer 502.
+
+Example:
+    python api_server.py --port 8000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from openai import APIError
+
+from async_tutor import AsyncCrossDomainTutor
+from explanation_cache import ExplanationCache
+from instrumentation import Instrumentation, JsonlTraceSink, PrometheusSink
+from llm_backends import FakeBackend, LLMBackend, OpenAIBackend, TransientBackendError
+from model_router import load_router
+from prefill_store import PrefillStore
+from prompts.registry import parse_presets
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, LatencyBudget, ResilientBackend
+from scheduler import RequestScheduler, SchedulerOverloaded
+from semantic_cache import SemanticCache
+from session_store import SessionStore
+from single_flight import SingleFlight
+from test_bank import OPTION_KEYS, fingerprint_test
+from tutor_registry import TutorRegistry, create_shared_async_client
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 1024 * 1024
+
+# LLM backends the server can run against
+BACKENDS = ("openai", "fake")
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class HTTPError(Exception):
+    """An error answered with a specific HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def create_registry(metrics: Optional[PrometheusSink] = None) -> TutorRegistry:
+    """Create the worker's tutor registry from the environment.
+
+    Uses the same caches, stores, resilience and rate limit settings as the Streamlit
+    app, plus TUTOR_BACKEND ("openai" or "fake") and TUTOR_API_MAX_CONCURRENCY.
+
+    Args:
+        metrics (Optional[PrometheusSink]): Receives the worker's call records and queue depths.
+
+    Returns:
+        TutorRegistry: A registry of AsyncCrossDomainTutor instances sharing one client.
+
+    Raises:
+        ValueError: If the OpenAI API key is not found in environment variables.
+    """
+    load_dotenv()
+    backend_name = os.getenv("TUTOR_BACKEND", "openai")
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend_name}")
+    if backend_name == "openai" and not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+    instrumentation = Instrumentation([metrics] if metrics is not None else [])
+    if os.getenv("TUTOR_TRACE_PATH"):
+        instrumentation.add_sink(JsonlTraceSink(os.getenv("TUTOR_TRACE_PATH")))
+    backend: LLMBackend = FakeBackend() if backend_name == "fake" else OpenAIBackend(async_client=create_shared_async_client(max_retries=0))
+    latency_budget_s = float(os.getenv("TUTOR_LATENCY_BUDGET", "60"))
+    session_store = SessionStore(os.getenv("TUTOR_SESSION_DB", "tutor_sessions.db"))
+    session_store.start_purging()
+    return TutorRegistry(
+        client_factory=lambda: None,
+        tutor_factory=AsyncCrossDomainTutor,
+        idle_timeout=float(os.getenv("TUTOR_IDLE_TIMEOUT", "1800")),
+        pipeline_mode=os.getenv("TUTOR_PIPELINE_MODE", "two_stage"),
+        test_questions=int(os.getenv("TUTOR_TEST_QUESTIONS", "5")),
+        test_generation_mode=os.getenv("TUTOR_TEST_GENERATION_MODE", "single"),
+        cache=ExplanationCache(os.getenv("TUTOR_CACHE_PATH", "tutor_cache.db")),
+        semantic_cache=SemanticCache(
+            threshold=float(os.getenv("TUTOR_SEMANTIC_THRESHOLD", "0.85")),
+            directory=os.getenv("TUTOR_SEMANTIC_CACHE_DIR", "semantic_cache")
+        ),
+        session_store=session_store,
+        prefill_store=PrefillStore(os.getenv("TUTOR_PREFILL_DB", "tutor_prefill.db")),
+        instrumentation=instrumentation,
+        single_flight=SingleFlight(),
+        router=load_router(os.getenv("TUTOR_ROUTING_CONFIG")) if os.getenv("TUTOR_ROUTING_CONFIG") else None,
+        semaphore=asyncio.Semaphore(int(os.getenv("TUTOR_API_MAX_CONCURRENCY", "64"))),
+        backend=ResilientBackend(
+            backend,
+            max_retries=int(os.getenv("TUTOR_MAX_RETRIES", "3")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("TUTOR_BREAKER_THRESHOLD", "5")),
+                reset_timeout_s=float(os.getenv("TUTOR_BREAKER_RESET", "30"))
+            ),
+            hedge_ratio=float(os.getenv("TUTOR_HEDGE_RATIO", "0.1"))
+        ),
+        latency_budget=LatencyBudget(latency_budget_s) if latency_budget_s > 0 else None,
+        scheduler=RequestScheduler(
+            requests_per_minute=float(os.getenv("TUTOR_REQUESTS_PER_MINUTE", "500")),
+            tokens_per_minute=float(os.getenv("TUTOR_TOKENS_PER_MINUTE", "150000")),
+            metrics=metrics
+        ),
+        prompt_presets=parse_presets(os.getenv("TUTOR_PROMPT_PRESETS", ""))
+    )
+
+
+class TutorAPI:
+    """The ASGI application."""
+
+    def __init__(
+        self,
+        registry_factory: Callable[[Optional[PrometheusSink]], TutorRegistry] = create_registry,
+        max_body_bytes: int = MAX_BODY_BYTES
+    ):
+        """Initialize the application.
+
+        Args:
+            registry_factory (Callable[[Optional[PrometheusSink]], TutorRegistry]): Creates the
+                tutor registry on startup, given the worker's metrics sink.
+            max_body_bytes (int): The largest request body accepted.
+        """
+        self.registry_factory = registry_factory
+        self.max_body_bytes = max_body_bytes
+        self.metrics = PrometheusSink()
+        self._registry: Optional[TutorRegistry] = None
+        self._routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/metrics"): self._metrics,
+            ("POST", "/v1/explain"): self._explain,
+            ("POST", "/v1/tests"): self._generate_test,
+            ("POST", "/v1/tests/evaluate"): self._evaluate_test
+        }
+
+    @property
+    def registry(self) -> TutorRegistry:
+        """The worker's tutor registry, created on first use."""
+        if self._registry is None:
+            self._registry = self.registry_factory(self.metrics)
+        return self._registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        handler = self._routes.get((scope["method"], scope["path"]))
+        try:
+            if handler is None:
+                if any(path == scope["path"] for _, path in self._routes):
+                    raise HTTPError(405, "Method not allowed")
+                raise HTTPError(404, "Not found")
+            body = await self._read_json(receive) if scope["method"] == "POST" else {}
+            await handler(body, send)
+        except HTTPError as e:
+            await _send_json(send, e.status, {"error": e.message})
+        except DeadlineExceeded as e:
+            await _send_json(send, 504, {"error": f"Model call timed out: {e}"})
+        except (CircuitOpenError, SchedulerOverloaded) as e:
+            await _send_json(send, 503, {"error": str(e), "retry_after": round(e.retry_after)})
+        except (APIError, TransientBackendError) as e:
+            await _send_json(send, 502, {"error": f"Model provider error: {e}"})
+        except ValueError as e:
+            # Raised by the pipeline when the model output cannot be used
+            await _send_json(send, 502, {"error": str(e)})
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        """Create the registry on startup so configuration errors stop the worker early."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.registry
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_json(self, receive: Receive) -> Dict:
+        """Read a JSON object request body."""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise HTTPError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        try:
+            body = json.loads(b"".join(chunks) or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return body
+
+    def _tutor(self, body: Dict) -> AsyncCrossDomainTutor:
+        """Get the tutor of the learner and field pair named in a request."""
+        learner_id, source_field, target_field = (
+            _require_text(body, "learner_id"),
+            _require_text(body, "source_field"),
+            _require_text(body, "target_field")
+        )
+        return self.registry.get(learner_id, source_field, target_field)
+
+    async def _health(self, body: Dict, send: Send) -> None:
+        await _send_json(send, 200, {"status": "ok"})
+
+    async def _metrics(self, body: Dict, send: Send) -> None:
+        await _send_response(send, 200, "text/plain; version=0.0.4", self.metrics.render().encode("utf-8"))
+
+    async def _explain(self, body: Dict, send: Send) -> None:
+        tutor = self._tutor(body)
+        query = _require_text(body, "query")
+        if not body.get("stream"):
+            explanation = await tutor.get_explanation(query)
+            await _send_json(send, 200, {"explanation": explanation, "run": tutor.last_run})
+            return
+
+        # Stream NDJSON events; errors after the headers are sent become an error event
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache")]
+        })
+        try:
+            async for fragment in tutor.stream_explanation(query):
+                await _send_event(send, {"delta": fragment})
+            await _send_event(send, {"done": True, "run": tutor.last_run})
+        except (APIError, TransientBackendError, DeadlineExceeded, CircuitOpenError, SchedulerOverloaded, ValueError) as e:
+            await _send_event(send, {"error": str(e)})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _generate_test(self, body: Dict, send: Send) -> None:
+        tutor = self._tutor(body)
+        difficulty_level = body.get("difficulty_level")
+        if difficulty_level is not None and (not isinstance(difficulty_level, int) or not 1 <= difficulty_level <= 5):
+            raise HTTPError(400, "difficulty_level must be an integer from 1 to 5")
+        test_data = await tutor.generate_test(difficulty_level)
+        await _send_json(send, 200, {**test_data, "test_id": fingerprint_test(test_data)})
+
+    async def _evaluate_test(self, body: Dict, send: Send) -> None:
+        tutor = self._tutor(body)
+        test_id, answers = _require_text(body, "test_id"), body.get("answers")
+        if not isinstance(answers, dict) or any(answer not in OPTION_KEYS for answer in answers.values()):
+            raise HTTPError(400, "answers must map question indices to one of A, B, C or D")
+
+        def evaluate() -> Optional[Dict]:
+            # Grade the stored test, never an answer key sent by the client
+            test_data = tutor.find_test(test_id)
+            if test_data is None:
+                return None
+            score, should_increase = tutor.evaluate_test(test_data, answers)
+            return {"score": score, "should_increase": should_increase, "current_difficulty": tutor.current_difficulty}
+
+        # The session store and grading block, so they run off the event loop
+        result = await asyncio.to_thread(evaluate)
+        if result is None:
+            raise HTTPError(404, "test_id must name a test returned by /v1/tests for this learner")
+        await _send_json(send, 200, result)
+
+
+def _require_text(body: Dict, field: str) -> str:
+    """Get a required non-empty string field of a request body."""
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(400, f"{field} is required")
+    return value
+
+
+async def _send_response(send: Send, status: int, content_type: str, payload: bytes) -> None:
+    """Send a complete response."""
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type.encode("ascii"))]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def _send_json(send: Send, status: int, payload: Any) -> None:
+    """Send a complete JSON response."""
+    await _send_response(send, status, "application/json", json.dumps(payload).encode("utf-8"))
+
+
+async def _send_event(send: Send, event: Dict) -> None:
+    """Send one NDJSON line of a streamed response."""
+    await send({"type": "http.response.body", "body": json.dumps(event).encode("utf-8") + b"\n", "more_body": True})
+
+
+app = TutorAPI()
+
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Serve the tutor's HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (share the SQLite stores)")
+    parser.add_argument("--backend", choices=BACKENDS, help="Overrides TUTOR_BACKEND; fake serves canned content for load tests")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    if args.backend:
+        # Workers are separate processes, so configuration travels through the environment
+        os.environ["TUTOR_BACKEND"] = args.backend
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,138 @@ current area of expertise.
 """
 
 import streamlit as st
+import math
 import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
 from dotenv import load_dotenv
+from openai import APIConnectionError, APIError, AuthenticationError, RateLimitError
+from explanation_cache import ExplanationCache
+from instrumentation import Instrumentation, JsonlTraceSink, PrometheusSink, RingBufferSink
+from llm_backends import OpenAIBackend, TransientBackendError
+from model_router import load_router
+from prefill_store import PrefillStore
+from prompts.registry import parse_presets
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, LatencyBudget, ResilientBackend
+from scheduler import RequestScheduler, SchedulerOverloaded
+from semantic_cache import SemanticCache
+from session_store import SessionStore
+from test_bank import TestBank
 from tutor_pipeline import CrossDomainTutor
+from tutor_registry import TutorRegistry, create_shared_client
 
-def initialize_app(source_field: str, target_field: str) -> CrossDomainTutor:
-    """Initialize the application and its dependencies.
+# Rerun timings kept per view for the sidebar
+RERUN_TIMINGS_KEPT = 50
+
+@st.cache_resource
+def get_explanation_cache() -> ExplanationCache:
+    """Get the explanation cache shared by every session and worker.
+    
+    Returns:
+        ExplanationCache: A SQLite-backed cache at TUTOR_CACHE_PATH (default: tutor_cache.db).
+    """
+    return ExplanationCache(os.getenv("TUTOR_CACHE_PATH", "tutor_cache.db"))
+
+@st.cache_resource
+def get_semantic_cache() -> SemanticCache:
+    """Get the near-duplicate question cache shared by every session.
+    
+    Returns:
+        SemanticCache: A cache whose entry logs are kept under TUTOR_SEMANTIC_CACHE_DIR.
+    """
+    return SemanticCache(
+        threshold=float(os.getenv("TUTOR_SEMANTIC_THRESHOLD", "0.85")),
+        directory=os.getenv("TUTOR_SEMANTIC_CACHE_DIR", "semantic_cache")
+    )
+
+@st.cache_resource
+def get_test_bank() -> TestBank:
+    """Get the pool of pre-generated tests shared by every session.
+    
+    Returns:
+        TestBank: A test bank persisted to TUTOR_TEST_BANK_PATH (default: test_bank.json).
+    """
+    return TestBank(os.getenv("TUTOR_TEST_BANK_PATH", "test_bank.json"))
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    """Get the store of learners' conversations, tests and difficulty levels.
+    
+    Sessions idle for longer than the store's TTL are purged at startup and then hourly.
+    
+    Returns:
+        SessionStore: A SQLite-backed store at TUTOR_SESSION_DB (default: tutor_sessions.db).
+    """
+    store = SessionStore(os.getenv("TUTOR_SESSION_DB", "tutor_sessions.db"))
+    store.start_purging()
+    return store
+
+@st.cache_resource
+def get_prefill_store() -> PrefillStore:
+    """Get the curriculum explanations generated offline by prefill.py.
+    
+    Returns:
+        PrefillStore: A SQLite-backed store at TUTOR_PREFILL_DB (default: tutor_prefill.db).
+    """
+    return PrefillStore(os.getenv("TUTOR_PREFILL_DB", "tutor_prefill.db"))
+
+@st.cache_resource
+def get_call_log() -> RingBufferSink:
+    """Get the in-memory buffer of recent LLM call records.
+    
+    Returns:
+        RingBufferSink: The records behind the sidebar metrics panel.
+    """
+    return RingBufferSink()
+
+@st.cache_resource
+def get_metrics_exporter() -> Optional[PrometheusSink]:
+    """Get the Prometheus exporter serving /metrics on TUTOR_METRICS_PORT.
     
-    Args:
-        source_field (str): The field the user is proficient in.
-        target_field (str): The field the user wants to learn about.
-        
     Returns:
-        CrossDomainTutor: An initialized tutor instance.
+        Optional[PrometheusSink]: The exporter, or None when TUTOR_METRICS_PORT is unset.
+    """
+    if not os.getenv("TUTOR_METRICS_PORT"):
+        return None
+    exporter = PrometheusSink()
+    exporter.serve(int(os.getenv("TUTOR_METRICS_PORT")))
+    return exporter
+
+@st.cache_resource
+def get_instrumentation() -> Instrumentation:
+    """Get the instrumentation shared by every session.
+    
+    Call records always go to the in-memory call log. They are also appended to
+    TUTOR_TRACE_PATH and exported on TUTOR_METRICS_PORT at /metrics when those are set.
+    
+    Returns:
+        Instrumentation: The process-wide instrumentation.
+    """
+    instrumentation = Instrumentation([get_call_log()])
+    if os.getenv("TUTOR_TRACE_PATH"):
+        instrumentation.add_sink(JsonlTraceSink(os.getenv("TUTOR_TRACE_PATH")))
+    if get_metrics_exporter() is not None:
+        instrumentation.add_sink(get_metrics_exporter())
+    return instrumentation
+
+@st.cache_resource
+def get_tutor_registry() -> TutorRegistry:
+    """Get the registry of per-session tutors, loading the environment once per process.
+    
+    Every model call goes through a ResilientBackend: calls get deadlines from the
+    TUTOR_LATENCY_BUDGET end-to-end budget, transient failures are retried up to
+    TUTOR_MAX_RETRIES times, up to TUTOR_HEDGE_RATIO of calls are hedged, and a model
+    that fails TUTOR_BREAKER_THRESHOLD times in a row is paused for TUTOR_BREAKER_RESET
+    seconds. All sessions share one RequestScheduler that keeps the process within
+    TUTOR_REQUESTS_PER_MINUTE and TUTOR_TOKENS_PER_MINUTE, serving chat before tests.
+    TUTOR_PROMPT_PRESETS picks alternative system prompts per role, such as
+    "expert=rust,adapter=python".
+    
+    Returns:
+        TutorRegistry: A registry whose tutors share one pooled OpenAI client.
         
     Raises:
         ValueError: If the OpenAI API key is not found in environment variables.
@@ -30,11 +149,359 @@ def initialize_app(source_field: str, target_field: str) -> CrossDomainTutor:
     if not os.getenv("OPENAI_API_KEY"):
         raise ValueError("OPENAI_API_KEY not found in environment variables")
     
-    # Initialize the tutor
-    return CrossDomainTutor(source_field, target_field)
+    # The ResilientBackend owns retries, so the SDK must not retry underneath it
+    client = create_shared_client(max_retries=0)
+    backend = ResilientBackend(
+        OpenAIBackend(client=client),
+        max_retries=int(os.getenv("TUTOR_MAX_RETRIES", "3")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("TUTOR_BREAKER_THRESHOLD", "5")),
+            reset_timeout_s=float(os.getenv("TUTOR_BREAKER_RESET", "30"))
+        ),
+        hedge_ratio=float(os.getenv("TUTOR_HEDGE_RATIO", "0.1"))
+    )
+    latency_budget_s = float(os.getenv("TUTOR_LATENCY_BUDGET", "60"))
+    return TutorRegistry(
+        client_factory=lambda: client,
+        idle_timeout=float(os.getenv("TUTOR_IDLE_TIMEOUT", "1800")),
+        pipeline_mode=os.getenv("TUTOR_PIPELINE_MODE", "two_stage"),
+        test_questions=int(os.getenv("TUTOR_TEST_QUESTIONS", "5")),
+        test_generation_mode=os.getenv("TUTOR_TEST_GENERATION_MODE", "single"),
+        cache=get_explanation_cache(),
+        semantic_cache=get_semantic_cache(),
+        test_bank=get_test_bank(),
+        instrumentation=get_instrumentation(),
+        session_store=get_session_store(),
+        prefill_store=get_prefill_store(),
+        router=load_router(os.getenv("TUTOR_ROUTING_CONFIG")) if os.getenv("TUTOR_ROUTING_CONFIG") else None,
+        backend=backend,
+        latency_budget=LatencyBudget(latency_budget_s) if latency_budget_s > 0 else None,
+        scheduler=RequestScheduler(
+            requests_per_minute=float(os.getenv("TUTOR_REQUESTS_PER_MINUTE", "500")),
+            tokens_per_minute=float(os.getenv("TUTOR_TOKENS_PER_MINUTE", "150000")),
+            metrics=get_metrics_exporter()
+        ),
+        prompt_presets=parse_presets(os.getenv("TUTOR_PROMPT_PRESETS", ""))
+    )
 
-def main():
-    """Main application entry point."""
+def initialize_app(source_field: str, target_field: str) -> CrossDomainTutor:
+    """Get the session's tutor for the selected fields.
+    
+    The tutor keeps its conversation history and adaptive difficulty in the session
+    store, so they persist across reruns, reloads and server restarts.
+    
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+        
+    Returns:
+        CrossDomainTutor: The session's tutor instance.
+        
+    Raises:
+        ValueError: If the OpenAI API key is not found in environment variables.
+    """
+    registry = get_tutor_registry()
+    return registry.get(st.session_state.session_id, source_field, target_field)
+
+def describe_error(error: Exception) -> str:
+    """Explain a failed request to the learner.
+    
+    Args:
+        error (Exception): The error raised while answering.
+        
+    Returns:
+        str: A message saying what went wrong and what to do about it.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return f"The tutor took too long to answer ({error}). Please try again or ask a narrower question."
+    if isinstance(error, CircuitOpenError):
+        return (
+            "The language model is unavailable after repeated failures. "
+            f"Please try again in {error.retry_after:.0f} seconds."
+        )
+    if isinstance(error, SchedulerOverloaded):
+        return f"The tutor is very busy right now. Please try again in {error.retry_after:.0f} seconds."
+    if isinstance(error, AuthenticationError):
+        return "The OpenAI API key was rejected. Please check OPENAI_API_KEY."
+    if isinstance(error, RateLimitError):
+        return "The language model is rate-limiting requests. Please wait a moment and try again."
+    if isinstance(error, APIConnectionError):
+        return "Could not reach the language model service. Please check the connection and try again."
+    if isinstance(error, (APIError, TransientBackendError)):
+        return f"The language model service returned an error: {error}"
+    return str(error)
+
+def show_session_metrics() -> None:
+    """Show the session's LLM latency, token and cost numbers in the sidebar."""
+    summary = get_call_log().summary(st.session_state.session_id)
+    with st.sidebar:
+        st.subheader("📊 Session metrics")
+        if not summary:
+            st.caption("No model calls yet.")
+            return
+        totals = summary.pop("all")
+        col1, col2 = st.columns(2)
+        col1.metric("Model calls", totals["calls"])
+        col2.metric("Cache hits", totals["cache_hits"])
+        col1.metric("Tokens", totals["prompt_tokens"] + totals["completion_tokens"])
+        col2.metric("Est. cost", f"${totals['cost_usd']:.4f}")
+        st.dataframe(
+            [
+                {
+                    "stage": stage,
+                    "calls": numbers["calls"],
+                    "cache hits": numbers["cache_hits"],
+                    "p50 s": round(numbers["p50_s"], 2),
+                    "p95 s": round(numbers["p95_s"], 2),
+                    "tokens": numbers["prompt_tokens"] + numbers["completion_tokens"],
+                    "errors": numbers["errors"]
+                }
+                for stage, numbers in sorted(summary.items())
+            ],
+            hide_index=True
+        )
+
+
+def show_rerun_timings() -> None:
+    """Show how long recent reruns of the app and of each fragment took in the sidebar."""
+    timings = st.session_state.get("rerun_timings", {})
+    if not timings:
+        return
+    with st.sidebar:
+        st.subheader("⏱️ Reruns")
+        st.dataframe(
+            [
+                {
+                    "view": view,
+                    "reruns": len(values),
+                    "last s": round(values[-1], 3),
+                    "p50 s": round(sorted(values)[len(values) // 2], 3),
+                    "max s": round(max(values), 3)
+                }
+                for view, values in sorted(timings.items())
+            ],
+            hide_index=True
+        )
+
+@contextmanager
+def timed_rerun(view: str) -> Iterator[None]:
+    """Time a rerun of the whole script or of one fragment.
+    
+    The latest timings of each view are kept in the session for the sidebar, and are
+    exported as the tutor_ui_rerun_seconds histogram when metrics are served.
+    
+    Args:
+        view (str): "app" for the whole script, or the name of the fragment.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = st.session_state.setdefault("rerun_timings", {})
+        timings.setdefault(view, deque(maxlen=RERUN_TIMINGS_KEPT)).append(elapsed)
+        if get_metrics_exporter() is not None:
+            get_metrics_exporter().observe_rerun(view, elapsed)
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def load_history_page(
+    learner_id: str,
+    source_field: str,
+    target_field: str,
+    revision: int,
+    page: int,
+    page_size: int
+) -> Dict:
+    """Load one page of a session's conversation.
+    
+    Pages are cached per session revision, so they are only read again once the
+    conversation has changed.
+    
+    Args:
+        learner_id (str): Identifies the learner.
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+        revision (int): The session's revision in the store.
+        page (int): 0 for the most recent turns, counting back in time.
+        page_size (int): Turns per page.
+        
+    Returns:
+        Dict: The "turns" of the page (oldest first), its "page" number clamped to the
+            history, and the number of "pages".
+    """
+    store = get_session_store()
+    pages = max(math.ceil(store.turn_count(learner_id, source_field, target_field) / page_size), 1)
+    page = min(max(page, 0), pages - 1)
+    turns = store.recent_turns(learner_id, source_field, target_field, page_size, offset=page * page_size)
+    return {"turns": turns, "page": page, "pages": pages}
+
+def turn_history_page(step: int) -> None:
+    """Move the chat history by a number of pages; positive steps go back in time."""
+    st.session_state.history_page = max(st.session_state.history_page + step, 0)
+
+@st.fragment
+def show_history(source_field: str, target_field: str) -> None:
+    """Show one page of the conversation; paging reruns only this fragment.
+    
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+    """
+    with timed_rerun("history"):
+        learner_id = st.session_state.session_id
+        state = get_session_store().load(learner_id, source_field, target_field)
+        history = load_history_page(
+            learner_id,
+            source_field,
+            target_field,
+            state["revision"] if state else 0,
+            st.session_state.history_page,
+            int(os.getenv("TUTOR_HISTORY_TURNS", "20"))
+        )
+        if history["pages"] > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            col1.button(
+                "⬆️ Earlier",
+                key="history_earlier",
+                on_click=turn_history_page,
+                args=(1,),
+                disabled=history["page"] >= history["pages"] - 1
+            )
+            col2.caption(f"Page {history['pages'] - history['page']} of {history['pages']}")
+            col3.button(
+                "Later ⬇️",
+                key="history_later",
+                on_click=turn_history_page,
+                args=(-1,),
+                disabled=history["page"] == 0
+            )
+        for message in history["turns"]:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+@st.fragment
+def show_feedback(answer_id: str) -> None:
+    """Ask whether an answer helped; a click reruns only this fragment.
+    
+    Args:
+        answer_id (str): Keeps the buttons of different answers apart.
+    """
+    with timed_rerun("feedback"):
+        st.markdown("### Was this helpful?")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("👍 Yes", key=f"yes_{answer_id}"):
+                st.success("Thank you for your feedback!")
+        with col2:
+            if st.button("👎 No", key=f"no_{answer_id}"):
+                st.info("We'll try to improve our explanations!")
+
+def submit_test(source_field: str, target_field: str) -> None:
+    """Grade the submitted test form before the test fragment reruns.
+    
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+    """
+    questions = st.session_state.current_test["questions"]
+    keys = [f"test{st.session_state.test_round}_q{i}" for i in range(len(questions))]
+    answers = {str(i): st.session_state.get(key) for i, key in enumerate(keys)}
+    if not all(answers.values()):
+        st.session_state.test_incomplete = True
+        return
+    score, should_increase = initialize_app(source_field, target_field).evaluate_test(
+        st.session_state.current_test,
+        answers
+    )
+    st.session_state.test_incomplete = False
+    st.session_state.test_result = {"score": score, "should_increase": should_increase}
+
+def reset_test() -> None:
+    """Drop the current test so a new one can be generated."""
+    st.session_state.current_test = None
+    st.session_state.test_result = None
+    st.session_state.test_incomplete = False
+    # New widget keys, so the next test starts without the previous answers
+    st.session_state.test_round += 1
+
+@st.fragment
+def show_test(source_field: str, target_field: str) -> None:
+    """Run the test tab; generating, submitting and starting over rerun only this fragment.
+    
+    Answers are collected in a form, so picking an option reruns nothing.
+    
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+    """
+    with timed_rerun("test"):
+        tutor = initialize_app(source_field, target_field)
+        
+        # Generate new test if none exists
+        if st.session_state.current_test is None:
+            # Make sure a test is ready by the time the learner asks for one
+            tutor.prefetch_tests()
+            if not st.button("Generate New Test"):
+                return
+            try:
+                # Show each question as soon as it has been generated
+                with st.status("Generating test...") as status:
+                    for i, question in enumerate(tutor.stream_test()):
+                        st.markdown(f"**Question {i+1}:** {question['question']}")
+                        status.update(label=f"Generating test... {i+1} questions ready")
+                    status.update(label="Test ready", state="complete", expanded=False)
+            except Exception as e:
+                st.error(f"Failed to generate test: {describe_error(e)}")
+                return
+            st.session_state.current_test = tutor.test_history[-1]
+            st.session_state.test_result = None
+        
+        test = st.session_state.current_test
+        questions = test["questions"]
+        st.markdown(f"### Test (Difficulty Level: {test['difficulty_level']})")
+        
+        if st.session_state.test_result is None:
+            with st.form(f"test_form_{st.session_state.test_round}"):
+                for i, question in enumerate(questions):
+                    st.markdown(f"**Question {i+1}:** {question['question']}")
+                    st.radio(
+                        f"Select your answer for Question {i+1}",
+                        options=list(question["options"]),
+                        format_func=lambda x, options=question["options"]: f"{x}: {options[x]}",
+                        index=None,
+                        key=f"test{st.session_state.test_round}_q{i}"
+                    )
+                st.form_submit_button("Submit Test", on_click=submit_test, args=(source_field, target_field))
+            if st.session_state.test_incomplete:
+                st.warning("Please answer all questions before submitting!")
+            return
+        
+        # Display results
+        result = st.session_state.test_result
+        st.markdown("### Test Results")
+        st.markdown(f"**Score:** {result['score']:.1f}%")
+        if result["should_increase"]:
+            st.success("Great job! The next test will be more challenging.")
+        else:
+            st.info("Keep practicing! You can try another test at the same difficulty level.")
+        
+        # Display explanations
+        st.markdown("### Detailed Explanations")
+        for i, question in enumerate(questions):
+            with st.expander(f"Question {i+1} Explanation"):
+                st.markdown(f"**Correct Answer:** {question['correct_answer']}")
+                st.markdown(f"**Explanation:** {question['explanation']}")
+                st.markdown(f"**Connection to {source_field}:** {question['source_field_connection']}")
+        
+        # Option to generate new test
+        st.button("Generate New Test", key="next_test", on_click=reset_test)
+
+def show_latest_history() -> None:
+    """Jump the chat history back to the latest page when a question is sent."""
+    st.session_state.history_page = 0
+
+def render_app() -> None:
+    """Render the whole page."""
     # Set up the Streamlit page
     st.set_page_config(
         page_title="Cross-Domain Learning Tutor",
@@ -64,134 +531,72 @@ def main():
             help="Enter the field you want to learn about"
         )
     
-    # Initialize session state
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
+    # Initialize session state; the learner id lives in the URL so a reload resumes the session
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = st.query_params.get("learner") or uuid.uuid4().hex
+        st.query_params["learner"] = st.session_state.session_id
+    if 'history_page' not in st.session_state:
+        st.session_state.history_page = 0
     if 'current_test' not in st.session_state:
         st.session_state.current_test = None
-    if 'user_answers' not in st.session_state:
-        st.session_state.user_answers = {}
-    if 'show_results' not in st.session_state:
-        st.session_state.show_results = False
+    if 'test_result' not in st.session_state:
+        st.session_state.test_result = None
+    if 'test_round' not in st.session_state:
+        st.session_state.test_round = 0
+    if 'test_incomplete' not in st.session_state:
+        st.session_state.test_incomplete = False
     
     # Create tabs for different modes
     chat_tab, test_tab = st.tabs(["💬 Chat", "📝 Test Your Knowledge"])
     
     with chat_tab:
-        # Display conversation history
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+        # Display a page of the conversation history from the session store
+        if source_field and target_field:
+            show_history(source_field, target_field)
         
         # Chat input
-        if prompt := st.chat_input(f"What would you like to know about {target_field}?"):
+        if prompt := st.chat_input(f"What would you like to know about {target_field}?", on_submit=show_latest_history):
             if not source_field or not target_field:
                 st.warning("Please specify both your field of expertise and the field you want to explore!")
             else:
-                # Add user message to chat history
-                st.session_state.messages.append({"role": "user", "content": prompt})
                 with st.chat_message("user"):
                     st.markdown(prompt)
                 
                 # Get tutor response
                 with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        try:
-                            # Initialize the tutor with selected fields
-                            tutor = initialize_app(source_field, target_field)
-                            
-                            # Get the explanation
-                            response = tutor.get_explanation(prompt)
-                            
-                            # Display the response
-                            st.markdown(response)
-                            
-                            # Add assistant response to chat history
-                            st.session_state.messages.append({"role": "assistant", "content": response})
-                        except Exception as e:
-                            st.error(f"An error occurred: {str(e)}")
+                    try:
+                        # Initialize the tutor with selected fields
+                        tutor = initialize_app(source_field, target_field)
+                        
+                        # Stream the explanation as the adapter produces it
+                        st.write_stream(tutor.stream_explanation(prompt))
+                        run = tutor.last_run
+                        if run:
+                            source = "cache" if run["cache_hit"] else f"{run['mode']} pipeline"
+                            st.caption(
+                                f"{source} · {run['latency_s']:.1f}s · "
+                                f"{run['prompt_tokens']} prompt / {run['completion_tokens']} completion tokens · "
+                                f"${run['cost_usd']:.4f}"
+                            )
+                    except Exception as e:
+                        st.error(describe_error(e))
                 
                 # Add feedback section
-                st.markdown("### Was this helpful?")
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("👍 Yes", key="yes_button"):
-                        st.success("Thank you for your feedback!")
-                with col2:
-                    if st.button("👎 No", key="no_button"):
-                        st.info("We'll try to improve our explanations!")
+                show_feedback(uuid.uuid4().hex)
     
     with test_tab:
         if not source_field or not target_field:
             st.warning("Please specify both your field of expertise and the field you want to explore!")
         else:
-            # Initialize tutor
-            tutor = initialize_app(source_field, target_field)
-            
-            # Generate new test if none exists
-            if st.session_state.current_test is None:
-                if st.button("Generate New Test"):
-                    with st.spinner("Generating test..."):
-                        try:
-                            st.session_state.current_test = tutor.generate_test()
-                            st.session_state.user_answers = {}
-                            st.session_state.show_results = False
-                        except Exception as e:
-                            st.error(f"Failed to generate test: {str(e)}")
-            
-            # Display current test
-            if st.session_state.current_test:
-                st.markdown(f"### Test (Difficulty Level: {st.session_state.current_test['difficulty_level']})")
-                
-                for i, question in enumerate(st.session_state.current_test["questions"]):
-                    st.markdown(f"**Question {i+1}:** {question['question']}")
-                    
-                    # Display options as radio buttons
-                    options = list(question["options"].items())
-                    selected = st.radio(
-                        f"Select your answer for Question {i+1}",
-                        options=[opt[0] for opt in options],
-                        format_func=lambda x: f"{x}: {question['options'][x]}",
-                        key=f"q{i}"
-                    )
-                    if selected:
-                        st.session_state.user_answers[str(i)] = selected
-                
-                # Submit button
-                if st.button("Submit Test"):
-                    if len(st.session_state.user_answers) == len(st.session_state.current_test["questions"]):
-                        score, should_increase = tutor.evaluate_test(
-                            st.session_state.current_test,
-                            st.session_state.user_answers
-                        )
-                        
-                        st.session_state.show_results = True
-                        
-                        # Display results
-                        st.markdown("### Test Results")
-                        st.markdown(f"**Score:** {score:.1f}%")
-                        
-                        if should_increase:
-                            st.success("Great job! The next test will be more challenging.")
-                        else:
-                            st.info("Keep practicing! You can try another test at the same difficulty level.")
-                        
-                        # Display explanations
-                        st.markdown("### Detailed Explanations")
-                        for i, question in enumerate(st.session_state.current_test["questions"]):
-                            with st.expander(f"Question {i+1} Explanation"):
-                                st.markdown(f"**Correct Answer:** {question['correct_answer']}")
-                                st.markdown(f"**Explanation:** {question['explanation']}")
-                                st.markdown(f"**Connection to {source_field}:** {question['source_field_connection']}")
-                        
-                        # Option to generate new test
-                        if st.button("Generate New Test"):
-                            st.session_state.current_test = None
-                            st.session_state.user_answers = {}
-                            st.session_state.show_results = False
-                            st.experimental_rerun()
-                    else:
-                        st.warning("Please answer all questions before submitting!")
+            show_test(source_field, target_field)
+    
+    show_session_metrics()
+    show_rerun_timings()
+
+def main():
+    """Main application entry point."""
+    with timed_rerun("app"):
+        render_app()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
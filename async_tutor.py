@@ -0,0 +1,921 @@
+"""Asynchronous Cross-Domain Learning Tutor Pipeline.
+
+This module implements an asyncio variant of the two-step pipeline built on the
+AsyncOpenAI client, so that a single process can keep many pipeline stages in flight
+at once. Batch APIs run many pipelines concurrently behind a semaphore and return
+results in input order. Every method of CrossDomainTutor that makes LLM calls is
+overridden with a coroutine (or an async generator), including test generation and
+the summarizer.
+"""
+
+import asyncio
+import concurrent.futures
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from llm_backends import CallStats, LLMBackend, OpenAIBackend
+from model_router import STRONG_MODEL, ModelRouter
+from prefill_store import PrefillStore
+from prompts.registry import PromptRegistry
+
+from context_window import count_tokens, extractive_summary
+from explanation_cache import ADAPTED_TIER, TARGET_TIER, ExplanationCache
+from instrumentation import Instrumentation
+from question_stream import QuestionStreamParser, parse_questions
+from resilience import RETRYABLE_ERRORS, LatencyBudget
+from scheduler import RequestScheduler, Ticket, current_priority, estimate_call_tokens, request_priority
+from semantic_cache import SemanticCache
+from session_store import SessionStore
+from single_flight import SingleFlight
+from test_bank import TestBank
+from tutor_pipeline import (
+    CONTEXT_TOKEN_BUDGET,
+    MAX_TEST_REPAIRS,
+    MIN_SECTION_CHARS,
+    PARALLEL_SLICE_SIZE,
+    SUMMARY_MODEL,
+    TEST_QUESTION_COUNT,
+    CrossDomainTutor,
+    _find_section_break
+)
+
+# Longest a test bank thread waits for a background test from the event loop
+BACKGROUND_TEST_TIMEOUT_S = 300.0
+
+
+class AsyncCrossDomainTutor(CrossDomainTutor):
+    """An asyncio tutor with the same methods as CrossDomainTutor plus batch APIs."""
+
+    def __init__(
+        self,
+        source_field: str,
+        target_field: str,
+        cache: Optional[ExplanationCache] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        client: Optional[AsyncOpenAI] = None,
+        test_bank: Optional[TestBank] = None,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        pipeline_mode: str = "two_stage",
+        backend: Optional[LLMBackend] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        test_questions: int = TEST_QUESTION_COUNT,
+        test_generation_mode: str = "single",
+        learner_id: str = "default",
+        session_store: Optional[SessionStore] = None,
+        single_flight: Optional[SingleFlight] = None,
+        router: Optional[ModelRouter] = None,
+        latency_budget: Optional[LatencyBudget] = None,
+        prefill_store: Optional[PrefillStore] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        prompt_registry: Optional[PromptRegistry] = None,
+        prompt_presets: Optional[Dict[str, str]] = None
+    ):
+        """Initialize the tutor.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            cache (Optional[ExplanationCache]): A shared cache for expert and adapted explanations.
+            semantic_cache (Optional[SemanticCache]): A shared cache matching near-duplicate questions.
+            client (Optional[AsyncOpenAI]): The async OpenAI client for the default backend; a new one is
+                created if omitted.
+            test_bank (Optional[TestBank]): A shared pool of pre-generated tests.
+            max_concurrency (int): The maximum number of LLM calls this tutor keeps in flight.
+            max_retries (int): How many times a rate-limited or failed call is retried, unless the
+                backend retries calls itself.
+            semaphore (Optional[asyncio.Semaphore]): A semaphore shared with other tutors to bound
+                concurrency process-wide; overrides max_concurrency.
+            context_token_budget (int): The token budget for conversation context in prompts.
+            pipeline_mode (str): "two_stage", "fused" or "auto" (see PIPELINE_MODES).
+            backend (Optional[LLMBackend]): The LLM backend; defaults to OpenAI through the client.
+            instrumentation (Optional[Instrumentation]): Receives a call record for every LLM call and cache hit.
+            test_questions (int): The number of questions in a generated test.
+            test_generation_mode (str): "single" or "parallel" (see TEST_GENERATION_MODES).
+            learner_id (str): Identifies the learner in the session store.
+            session_store (Optional[SessionStore]): Keeps the conversation, tests and difficulty
+                level out of process memory and shares them between workers.
+            single_flight (Optional[SingleFlight]): Shared with other tutors so that identical
+                questions in flight at the same time make one set of upstream calls.
+            router (Optional[ModelRouter]): Picks a fast or strong model per stage and query;
+                every stage uses STRONG_MODEL if omitted.
+            latency_budget (Optional[LatencyBudget]): Gives each call a deadline from its stage's
+                share of the end-to-end budget; calls have no deadline if omitted.
+            prefill_store (Optional[PrefillStore]): Curriculum explanations generated offline,
+                checked before the caches.
+            scheduler (Optional[RequestScheduler]): The process-wide scheduler every call waits
+                for, by priority class and learner; calls are sent at once if omitted.
+            prompt_registry (Optional[PromptRegistry]): Renders and counts the system prompts;
+                defaults to the registry shared by the process.
+            prompt_presets (Optional[Dict[str, str]]): The prompt preset per role, e.g.
+                {"expert": "rust"}; other roles use their default (see prompts.registry.PROMPT_PRESETS).
+        """
+        if backend is None:
+            backend = OpenAIBackend(async_client=client if client is not None else AsyncOpenAI())
+        super().__init__(
+            source_field,
+            target_field,
+            cache=cache,
+            semantic_cache=semantic_cache,
+            test_bank=test_bank,
+            context_token_budget=context_token_budget,
+            pipeline_mode=pipeline_mode,
+            backend=backend,
+            instrumentation=instrumentation,
+            test_questions=test_questions,
+            test_generation_mode=test_generation_mode,
+            learner_id=learner_id,
+            session_store=session_store,
+            router=router,
+            latency_budget=latency_budget,
+            prefill_store=prefill_store,
+            scheduler=scheduler,
+            prompt_registry=prompt_registry,
+            prompt_presets=prompt_presets
+        )
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._semaphore = semaphore
+        self.single_flight = single_flight
+        self._compaction: Optional[asyncio.Future] = None
+
+    async def get_explanation(self, query: str) -> str:
+        """Get an explanation adapted to the user's field of expertise.
+
+        Args:
+            query (str): The user's question about the target field.
+
+        Returns:
+            str: An explanation adapted to the user's field.
+        """
+        started = time.perf_counter()
+        recent_context = self._recent_context()
+        run = self._new_run(query, recent_context)
+        adapted_explanation = await self._explain(query, recent_context, run)
+
+        # Update conversation history
+        self._record_exchange(query, adapted_explanation)
+        self._finish_run(run, started)
+
+        return adapted_explanation
+
+    async def stream_explanation(self, query: str) -> AsyncIterator[str]:
+        """Stream an explanation adapted to the user's field of expertise.
+
+        The adapter starts on completed paragraphs of the expert explanation while
+        the expert stage is still streaming.
+
+        Args:
+            query (str): The user's question about the target field.
+
+        Yields:
+            str: Fragments of the adapted explanation as they arrive.
+        """
+        started = time.perf_counter()
+        recent_context = self._recent_context()
+        run = self._new_run(query, recent_context, streaming=True)
+        cached = self._lookup_adapted(query, recent_context, run)
+        if cached is not None:
+            yield cached
+            self._record_exchange(query, cached)
+            self._finish_run(run, started)
+            return
+
+        if self.single_flight is None:
+            fragments = self._stream_pipeline(query, recent_context, run)
+        else:
+            # Follow an identical explanation that is already being streamed, if any
+            fragments, leader = self.single_flight.stream(
+                self._versioned_key(ADAPTED_TIER, self._adapted_key(query, recent_context)),
+                lambda: self._stream_pipeline(query, recent_context, run)
+            )
+            if not leader:
+                self._record_cache_hit(run, "adapter", "inflight")
+
+        adapted_parts: List[str] = []
+        async for fragment in fragments:
+            adapted_parts.append(fragment)
+            yield fragment
+
+        # Update conversation history
+        self._record_exchange(query, "".join(adapted_parts).strip())
+        self._finish_run(run, started)
+
+    async def _stream_pipeline(self, query: str, recent_context: List[Dict[str, str]], run: Dict) -> AsyncIterator[str]:
+        """Stream the pipeline for one query and cache the result, without touching the history.
+
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            run (Dict): The run record to add stage metrics to.
+
+        Yields:
+            str: Fragments of the adapted explanation as they arrive.
+        """
+        if run["mode"] == "fused":
+            fragments = self._stream_completion("fused", self._fused_messages(query, recent_context), run)
+        else:
+            fragments = self._stream_two_stage(query, recent_context, run)
+
+        adapted_parts: List[str] = []
+        async for fragment in fragments:
+            adapted_parts.append(fragment)
+            yield fragment
+
+        adapted_explanation = "".join(adapted_parts).strip()
+        self._cache_set(ADAPTED_TIER, self._adapted_key(query, recent_context), adapted_explanation, run)
+        self._semantic_insert(query, recent_context, adapted_explanation, run)
+
+    async def _stream_two_stage(self, query: str, recent_context: List[Dict[str, str]], run: Dict) -> AsyncIterator[str]:
+        """Stream the two-stage pipeline, adapting expert paragraphs as they complete.
+
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            run (Dict): The run record to add stage metrics to.
+
+        Yields:
+            str: Fragments of the adapted explanation as they arrive.
+        """
+        cached_target = self._cache_get(TARGET_TIER, self._target_key(query, recent_context))
+        if cached_target is not None:
+            self._record_cache_hit(run, "expert", "exact")
+        sections: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        async def produce_sections() -> None:
+            # Step 1: Stream the target field explanation, split into paragraphs
+            try:
+                if cached_target is not None:
+                    await sections.put(cached_target)
+                    return
+                buffer = ""
+                target_parts: List[str] = []
+                async for fragment in self._stream_completion("expert", self._target_messages(query, recent_context), run):
+                    buffer += fragment
+                    split_at = _find_section_break(buffer, MIN_SECTION_CHARS)
+                    while split_at >= 0:
+                        target_parts.append(buffer[:split_at])
+                        await sections.put(buffer[:split_at])
+                        buffer = buffer[split_at:]
+                        split_at = _find_section_break(buffer, MIN_SECTION_CHARS)
+                if buffer.strip():
+                    target_parts.append(buffer)
+                    await sections.put(buffer)
+                self._cache_set(TARGET_TIER, self._target_key(query, recent_context), "".join(target_parts), run)
+            finally:
+                await sections.put(None)
+
+        producer = asyncio.ensure_future(produce_sections())
+        adapted_so_far = ""
+        finished = False
+        try:
+            while not finished:
+                # Wait for the next section, then take everything else already queued
+                pending = [await sections.get()]
+                while pending[-1] is not None and not sections.empty():
+                    pending.append(sections.get_nowait())
+                finished = pending[-1] is None
+                batch = "".join(section for section in pending if section is not None)
+                if not batch.strip():
+                    continue
+
+                # Step 2: Adapt the completed sections for the source field
+                messages = self._adapter_messages(batch, recent_context, adapted_so_far)
+                async for fragment in self._stream_completion("adapter", messages, run):
+                    adapted_so_far += fragment
+                    yield fragment
+                if not finished:
+                    adapted_so_far += "\n\n"
+                    yield "\n\n"
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+        # Surface errors from the expert stage
+        await producer
+
+    async def generate_test(self, difficulty_level: Optional[int] = None) -> Dict:
+        """Generate a test with test_questions MCQs at the current difficulty level.
+
+        A ready test from the test bank is served when there is one; the bank is then
+        refilled in the background.
+
+        Args:
+            difficulty_level (Optional[int]): The difficulty level (1-5); defaults to the current level.
+
+        Returns:
+            Dict: A dictionary containing the test questions and metadata.
+        """
+        difficulty_level = difficulty_level or self.current_difficulty
+        test_data = None
+        if self.test_bank is not None:
+            test_data = self.test_bank.take_test(
+                self.source_field,
+                self.target_field,
+                difficulty_level,
+                self.learner_id,
+                self._test_variant(difficulty_level)
+            )
+        if test_data is None:
+            test_data = await self._create_test(difficulty_level)
+            if self.test_bank is not None:
+                self.test_bank.add_test(
+                    self.source_field,
+                    self.target_field,
+                    difficulty_level,
+                    self.learner_id,
+                    test_data,
+                    self._test_variant(difficulty_level)
+                )
+        self._request_refill(difficulty_level)
+        self._record_test(test_data)
+        return test_data
+
+    async def stream_test(self, difficulty_level: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Stream a test with test_questions MCQs question by question.
+
+        A ready test from the test bank is yielded at once. When the stream ends, the
+        complete test is appended to test_history.
+
+        Args:
+            difficulty_level (Optional[int]): The difficulty level (1-5); defaults to the current level.
+
+        Yields:
+            Dict: The test questions, in order.
+
+        Raises:
+            ValueError: If no valid question could be generated.
+        """
+        difficulty_level = difficulty_level or self.current_difficulty
+        test_data = None
+        if self.test_bank is not None:
+            test_data = self.test_bank.take_test(
+                self.source_field,
+                self.target_field,
+                difficulty_level,
+                self.learner_id,
+                self._test_variant(difficulty_level)
+            )
+
+        if test_data is not None:
+            for question in test_data["questions"]:
+                yield question
+        else:
+            route = self._route_test(difficulty_level)
+            if self.test_generation_mode == "parallel":
+                generated = self._iter_parallel_questions(difficulty_level, route)
+            else:
+                generated = self._iter_streamed_questions(difficulty_level, route)
+            questions: List[Dict] = []
+            async for question in generated:
+                questions.append(question)
+                yield question
+
+            # Regenerate only the questions lost to malformed output or duplicates
+            missing_questions = await self._generate_missing_questions(difficulty_level, questions, route)
+            for question in missing_questions:
+                yield question
+            test_data = self._assemble_test(difficulty_level, questions + missing_questions)
+            if self.test_bank is not None:
+                self.test_bank.add_test(
+                    self.source_field,
+                    self.target_field,
+                    difficulty_level,
+                    self.learner_id,
+                    test_data,
+                    self._test_variant(difficulty_level)
+                )
+
+        self._request_refill(self.current_difficulty)
+        self._record_test(test_data)
+
+    async def prefetch_tests(self) -> None:
+        """Start filling the test bank for the current difficulty level in the background."""
+        self._request_refill(self.current_difficulty)
+
+    def _request_refill(self, difficulty_level: int) -> None:
+        """Ask the test bank for a background refill, generating its tests on the running event loop.
+
+        The bank's refill threads cannot run coroutines, so each test they ask for is
+        scheduled on this loop and the thread waits for it.
+        """
+        if self.test_bank is None:
+            return
+        loop = asyncio.get_running_loop()
+        self.test_bank.request_refill(
+            self.source_field,
+            self.target_field,
+            difficulty_level,
+            lambda level: self._generate_on_loop(loop, level),
+            self._test_variant(difficulty_level)
+        )
+
+    def _generate_on_loop(self, loop: asyncio.AbstractEventLoop, difficulty_level: int) -> Dict:
+        """Generate a background test on the event loop from a test bank thread.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the test took over BACKGROUND_TEST_TIMEOUT_S,
+                for example because the loop stopped; the test is cancelled.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._create_background_test(difficulty_level), loop)
+        try:
+            return future.result(timeout=BACKGROUND_TEST_TIMEOUT_S)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def _create_background_test(self, difficulty_level: int) -> Dict:
+        """Generate a test for the test bank behind interactive calls and on-demand tests."""
+        with request_priority("background"):
+            return await self._create_test(difficulty_level)
+
+    async def _create_test(self, difficulty_level: int) -> Dict:
+        """Generate a new test with the LLM.
+
+        In the parallel test generation mode the slices of the test are generated
+        concurrently behind the tutor's concurrency limit.
+
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+
+        Returns:
+            Dict: The test data.
+        """
+        route = self._route_test(difficulty_level)
+        if self.test_generation_mode == "parallel":
+            questions = [question async for question in self._iter_parallel_questions(difficulty_level, route)]
+        else:
+            content = await self._complete("test_generator", self._test_messages(difficulty_level), route=route)
+            questions = self._new_questions([], parse_questions(content))
+
+        # Keep every valid question and regenerate only the ones that are missing
+        questions += await self._generate_missing_questions(difficulty_level, questions, route)
+        return self._assemble_test(difficulty_level, questions)
+
+    async def _iter_streamed_questions(self, difficulty_level: int, route: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """Stream a whole test from one call, yielding each valid question as it completes.
+
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            route (Optional[Dict]): The routing decision for the test generator.
+
+        Yields:
+            Dict: The questions, in order.
+        """
+        parser = QuestionStreamParser()
+        accepted: List[Dict] = []
+        async for fragment in self._stream_completion("test_generator", self._test_messages(difficulty_level), route=route):
+            new_questions = self._new_questions(accepted, parser.feed(fragment))
+            accepted += new_questions
+            for question in new_questions:
+                yield question
+
+    async def _iter_parallel_questions(self, difficulty_level: int, route: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """Generate slices of a test concurrently, yielding questions as each slice completes.
+
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            route (Optional[Dict]): The routing decision for the test generator.
+
+        Yields:
+            Dict: The accepted questions, in completion order.
+        """
+        sizes = [min(PARALLEL_SLICE_SIZE, self.test_questions - start) for start in range(0, self.test_questions, PARALLEL_SLICE_SIZE)]
+        tasks = [
+            asyncio.ensure_future(
+                self._complete("test_generator", self._slice_messages(difficulty_level, i, len(sizes), size), route=route)
+            )
+            for i, size in enumerate(sizes)
+        ]
+        accepted: List[Dict] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    content = await next_done
+                except Exception:
+                    continue
+                new_questions = self._new_questions(accepted, parse_questions(content))
+                accepted += new_questions
+                for question in new_questions:
+                    yield question
+        finally:
+            # Stop the slices a caller that stopped reading no longer needs
+            for task in tasks:
+                task.cancel()
+
+    async def _generate_missing_questions(self, difficulty_level: int, questions: List[Dict], route: Optional[Dict] = None) -> List[Dict]:
+        """Generate the questions a test is missing after malformed output or duplicates.
+
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            questions (List[Dict]): The valid questions received so far.
+            route (Optional[Dict]): The routing decision the draft was generated with.
+
+        Returns:
+            List[Dict]: The additional questions.
+        """
+        route = self._repair_route(route)
+        missing_questions: List[Dict] = []
+        for _ in range(MAX_TEST_REPAIRS):
+            have = questions + missing_questions
+            if len(have) >= self.test_questions:
+                break
+            content = await self._complete(
+                "test_generator",
+                self._missing_question_messages(difficulty_level, have, self.test_questions - len(have)),
+                route=route
+            )
+            missing_questions += self._new_questions(have, parse_questions(content))
+        return missing_questions
+
+    async def batch_explain(self, queries: List[str]) -> List[str]:
+        """Explain many independent queries concurrently.
+
+        Every query sees the same conversation context, taken when the batch starts.
+        The exchanges are appended to the conversation history in input order.
+
+        Args:
+            queries (List[str]): The user's questions.
+
+        Returns:
+            List[str]: The adapted explanations, in the same order as the queries.
+        """
+        recent_context = self._recent_context()
+        explanations = await asyncio.gather(*(
+            self._explain(query, recent_context, self._new_run(query, recent_context))
+            for query in queries
+        ))
+        for query, explanation in zip(queries, explanations):
+            self._record_exchange(query, explanation)
+        return list(explanations)
+
+    async def batch_generate_tests(self, levels: List[int]) -> List[Dict]:
+        """Generate tests at several difficulty levels concurrently.
+
+        Args:
+            levels (List[int]): The difficulty level (1-5) of each test.
+
+        Returns:
+            List[Dict]: The generated tests, in the same order as the levels.
+        """
+        return list(await asyncio.gather(*(self.generate_test(level) for level in levels)))
+
+    async def _explain(self, query: str, recent_context: List[Dict[str, str]], run: Dict) -> str:
+        """Run the pipeline for one query without touching the history.
+
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            run (Dict): The run record to add stage metrics to.
+
+        Returns:
+            str: The adapted explanation.
+        """
+        adapted_explanation = self._lookup_adapted(query, recent_context, run)
+        if adapted_explanation is not None:
+            return adapted_explanation
+        if self.single_flight is None:
+            return await self._run_pipeline(query, recent_context, run)
+
+        # Join an identical explanation that is already in flight, if any
+        adapted_explanation, leader = await self.single_flight.do(
+            self._versioned_key(ADAPTED_TIER, self._adapted_key(query, recent_context)),
+            lambda: self._run_pipeline(query, recent_context, run)
+        )
+        if not leader:
+            self._record_cache_hit(run, "adapter", "inflight")
+        return adapted_explanation.strip()
+
+    async def _run_pipeline(self, query: str, recent_context: List[Dict[str, str]], run: Dict) -> str:
+        """Run the pipeline for one query and cache the result.
+
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            run (Dict): The run record to add stage metrics to.
+
+        Returns:
+            str: The adapted explanation.
+        """
+        if run["mode"] == "fused":
+            # Explain and adapt in a single call
+            adapted_explanation = await self._complete("fused", self._fused_messages(query, recent_context), run)
+            self._cache_set(ADAPTED_TIER, self._adapted_key(query, recent_context), adapted_explanation, run)
+            self._semantic_insert(query, recent_context, adapted_explanation, run)
+            return adapted_explanation
+
+        # Step 1: Generate detailed explanation in target field
+        target_explanation = self._cache_get(TARGET_TIER, self._target_key(query, recent_context))
+        if target_explanation is not None:
+            self._record_cache_hit(run, "expert", "exact")
+        else:
+            target_explanation = await self._generate_target_explanation(query, run, recent_context)
+            self._cache_set(TARGET_TIER, self._target_key(query, recent_context), target_explanation, run)
+
+        # Step 2: Adapt the explanation for the source field
+        adapted_explanation = await self._adapt_for_source_field(target_explanation, run, recent_context)
+        self._cache_set(ADAPTED_TIER, self._adapted_key(query, recent_context), adapted_explanation, run)
+        self._semantic_insert(query, recent_context, adapted_explanation, run)
+        return adapted_explanation
+
+    def _record_exchange(self, query: str, answer: str) -> None:
+        """Append an exchange to the context and fold overflow into the summary in the background.
+
+        Args:
+            query (str): The user's question.
+            answer (str): The adapted explanation returned to the user.
+        """
+        self.context.add("user", query)
+        self.context.add("assistant", answer)
+        overflow = self.context.take_overflow() if self.context.over_budget() else []
+        self._persist_exchange(query, answer)
+        if overflow:
+            self._compaction = asyncio.ensure_future(self._fold_summary(overflow, self._compaction))
+
+    async def _fold_summary(self, overflow: List[Dict[str, str]], previous: Optional[asyncio.Future]) -> None:
+        """Fold removed turns into the rolling summary, after any earlier fold finishes."""
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            summary = await self._summarize(self.context.summary, overflow)
+        except Exception:
+            summary = ""
+        self.context.fold(summary or extractive_summary(self.context.summary, overflow, self.context.max_summary_tokens))
+        if self.session_store is not None:
+            self._advance_revision(
+                self.session_store.save(self.learner_id, self.source_field, self.target_field, summary=self.context.summary)
+            )
+
+    async def _summarize(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold turns into the rolling conversation summary with a cheap model.
+
+        Args:
+            summary (str): The current summary.
+            turns (List[Dict[str, str]]): The turns to fold in, oldest first.
+
+        Returns:
+            str: The updated summary.
+        """
+        return await self._complete(
+            "summarizer",
+            self._summary_messages(summary, turns),
+            model=SUMMARY_MODEL,
+            temperature=0.3,
+            max_tokens=self.context.max_summary_tokens
+        )
+
+    async def _generate_target_explanation(
+        self,
+        query: str,
+        run: Optional[Dict] = None,
+        recent_context: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """Generate a detailed explanation in the target field.
+
+        Args:
+            query (str): The user's question.
+            run (Optional[Dict]): The run record to add stage metrics to.
+            recent_context (Optional[List[Dict[str, str]]]): The conversation context of the
+                run; defaults to the current context.
+
+        Returns:
+            str: A detailed explanation in the target field.
+        """
+        if recent_context is None:
+            recent_context = self._recent_context()
+        return await self._complete("expert", self._target_messages(query, recent_context), run)
+
+    async def _adapt_for_source_field(
+        self,
+        target_explanation: str,
+        run: Optional[Dict] = None,
+        recent_context: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """Adapt an explanation for the source field.
+
+        Args:
+            target_explanation (str): The explanation in the target field.
+            run (Optional[Dict]): The run record to add stage metrics to.
+            recent_context (Optional[List[Dict[str, str]]]): The conversation context of the
+                run; defaults to the current context.
+
+        Returns:
+            str: An explanation adapted for the source field.
+        """
+        if recent_context is None:
+            recent_context = self._recent_context()
+        return await self._complete("adapter", self._adapter_messages(target_explanation, recent_context), run)
+
+    def _limiter(self) -> asyncio.Semaphore:
+        """Get the concurrency semaphore, creating it inside the running event loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _max_retries(self) -> int:
+        """Get how many times to retry a call; none if the backend already retries it."""
+        return 0 if self.backend.handles_retries else self.max_retries
+
+    async def _admit(self, stage: str, run: Optional[Dict], prompt_tokens: int, options: Dict) -> Tuple[Optional[Ticket], Dict]:
+        """Wait until the scheduler lets a call through, then get the call's options.
+
+        Raises:
+            DeadlineExceeded: If the call was not admitted in time.
+            SchedulerOverloaded: If too many calls of its priority class are waiting.
+        """
+        if self.scheduler is None:
+            return None, self._call_options(stage, run, options)
+        ticket = await self.scheduler.aacquire(
+            current_priority(stage),
+            self.learner_id,
+            estimate_call_tokens(prompt_tokens, options.get("max_tokens")),
+            self._call_options(stage, run, options).get("timeout")
+        )
+        try:
+            return ticket, self._ticketed(ticket, self._call_options(stage, run, options))
+        except Exception:
+            self._release(ticket, 0)
+            raise
+
+    async def _backoff(self, attempt: int, error: Exception) -> None:
+        """Sleep before retrying, honoring the server's Retry-After header when present."""
+        delay = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        await asyncio.sleep(delay)
+
+    async def _complete(
+        self,
+        stage: str,
+        messages: List[Dict[str, str]],
+        run: Optional[Dict] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        route: Optional[Dict] = None,
+        **options
+    ) -> str:
+        """Run a chat completion behind the scheduler and the concurrency limit, retrying rate limits.
+
+        A cascade draft explanation that fails validation is retried on the strong model.
+
+        Args:
+            stage (str): The pipeline stage making the call.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            run (Optional[Dict]): The run record to add stage metrics to.
+            model (Optional[str]): The model to use; defaults to the routed model.
+            temperature (float): The sampling temperature.
+            route (Optional[Dict]): The routing decision; defaults to the stage's decision in the run.
+            **options: Extra completion options such as max_tokens.
+
+        Returns:
+            str: The completion content.
+        """
+        route = self._resolve_route(stage, run, route)
+        model = model or (route["model"] if route is not None else STRONG_MODEL)
+        max_retries = self._max_retries()
+        # Wait for the scheduler before taking a concurrency slot, so queued batch calls never hold one
+        prompt_tokens, budgeted = self._budget(stage, model, messages, options)
+        ticket, call_options = await self._admit(stage, run, prompt_tokens, budgeted)
+        # Counts the retries of a backend that retries calls itself
+        stats = CallStats()
+        used_tokens = prompt_tokens
+        try:
+            for attempt in range(max_retries + 1):
+                if attempt > 0:
+                    # Every attempt waits for the scheduler like a new call
+                    self._release(ticket, prompt_tokens)
+                    ticket = None
+                    ticket, call_options = await self._admit(stage, run, prompt_tokens, budgeted)
+                try:
+                    async with self._limiter():
+                        started = time.perf_counter()
+                        completion = await self.backend.acomplete(model, messages, temperature, stats=stats, **call_options)
+                    break
+                except Exception as e:
+                    if not isinstance(e, RETRYABLE_ERRORS) or attempt == max_retries:
+                        self._record_stage(
+                            run,
+                            stage,
+                            model,
+                            started,
+                            prompt_tokens,
+                            0,
+                            retries=attempt + stats.retries,
+                            error=e,
+                            route=route,
+                            ticket=ticket
+                        )
+                        raise
+                    await self._backoff(attempt, e)
+            used_tokens = completion.prompt_tokens + completion.completion_tokens
+        finally:
+            self._release(ticket, used_tokens)
+        self._record_stage(
+            run,
+            stage,
+            model,
+            started,
+            completion.prompt_tokens,
+            completion.completion_tokens,
+            retries=attempt + stats.retries,
+            route=route,
+            ticket=ticket
+        )
+        if self._needs_escalation(route, completion.content):
+            return await self._complete(stage, messages, run, None, temperature, self._escalate(run, route), **options)
+        self._note_truncation(run, stage, completion.finish_reason)
+        return completion.content
+
+    async def _stream_completion(
+        self,
+        stage: str,
+        messages: List[Dict[str, str]],
+        run: Optional[Dict] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        route: Optional[Dict] = None,
+        **options
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion behind the scheduler and the concurrency limit.
+
+        Args:
+            stage (str): The pipeline stage making the call.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            run (Optional[Dict]): The run record to add stage metrics to.
+            model (Optional[str]): The model to use; defaults to the routed model.
+            temperature (float): The sampling temperature.
+            route (Optional[Dict]): The routing decision; defaults to the stage's decision in the run.
+            **options: Extra completion options such as max_tokens.
+
+        Yields:
+            str: Content fragments as they arrive.
+        """
+        route = self._resolve_route(stage, run, route)
+        model = model or (route["model"] if route is not None else STRONG_MODEL)
+        max_retries = self._max_retries()
+        prompt_tokens, budgeted = self._budget(stage, model, messages, options)
+        ticket, call_options = await self._admit(stage, run, prompt_tokens, budgeted)
+        # Counts the retries of a backend that retries calls itself
+        stats = CallStats()
+        parts: List[str] = []
+        try:
+            for attempt in range(max_retries + 1):
+                if attempt > 0:
+                    # Every attempt waits for the scheduler like a new call, without holding a concurrency slot
+                    self._release(ticket, prompt_tokens)
+                    ticket = None
+                    ticket, call_options = await self._admit(stage, run, prompt_tokens, budgeted)
+                started = time.perf_counter()
+                first_token_at = None
+                try:
+                    async with self._limiter():
+                        async for fragment in self.backend.astream(model, messages, temperature, stats=stats, **call_options):
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(fragment)
+                            yield fragment
+                    break
+                except Exception as e:
+                    # Only retry failures that happen before anything reached the caller
+                    if not isinstance(e, RETRYABLE_ERRORS) or parts or attempt == max_retries:
+                        self._record_stage(
+                            run,
+                            stage,
+                            model,
+                            started,
+                            prompt_tokens,
+                            count_tokens("".join(parts)),
+                            first_token_at,
+                            retries=attempt + stats.retries,
+                            error=e,
+                            route=route,
+                            ticket=ticket
+                        )
+                        raise
+                    await self._backoff(attempt, e)
+        finally:
+            # Also settles streams the caller stopped reading
+            self._release(ticket, prompt_tokens + count_tokens("".join(parts)))
+        self._record_stage(
+            run,
+            stage,
+            model,
+            started,
+            prompt_tokens,
+            count_tokens("".join(parts)),
+            first_token_at,
+            retries=attempt + stats.retries,
+            route=route,
+            ticket=ticket
+        )
+        self._note_truncation(run, stage, stats.finish_reason)
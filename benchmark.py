@@ -0,0 +1,242 @@
+"""Benchmark suite for the Cross-Domain Learning Tutor pipeline.
+
+Drives get_explanation, generate_test and evaluate_test at a configurable concurrency
+against the local FakeBackend (so no network access or API spend is needed) and
+reports latency percentiles, throughput, failures and memory use.
+
+Example:
+    python benchmark.py --scenario all --requests 200 --concurrency 16 --latency-ms 300
+"""
+
+import argparse
+import json
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from llm_backends import FakeBackend, LLMBackend, fake_test_payload
+from tutor_pipeline import PIPELINE_MODES, TEST_GENERATION_MODES, TEST_QUESTION_COUNT, CrossDomainTutor
+
+# Benchmark scenarios and the tutor method each one drives
+SCENARIOS = ("explain", "stream", "generate_test", "evaluate_test")
+
+# Questions cycled through by the explanation scenarios
+SAMPLE_QUERIES = [
+    "What is ownership?",
+    "How does borrowing work?",
+    "Explain lifetimes with an example",
+    "What is the difference between a trait and an interface?",
+    "How do I handle errors with Result?",
+    "When should I use Box, Rc or Arc?",
+    "How does pattern matching work?",
+    "What are iterators and closures?"
+]
+
+
+def summarize_latencies(latencies: List[float], failures: int, elapsed: float) -> Dict:
+    """Compute latency percentiles and throughput for one scenario.
+
+    Args:
+        latencies (List[float]): Seconds taken by each successful operation.
+        failures (int): The number of failed operations.
+        elapsed (float): Wall-clock seconds for the whole scenario.
+
+    Returns:
+        Dict: Counts, p50/p95/p99/max latency in milliseconds, and operations per second.
+    """
+    values = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "operations": len(latencies),
+        "failures": failures,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(values.max()), 2),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def run_scenario(
+    scenario: str,
+    make_tutor: Callable[[int], CrossDomainTutor],
+    requests: int,
+    concurrency: int,
+    seed: int = 0
+) -> Dict:
+    """Run one scenario and measure it.
+
+    Each request uses its own tutor, as independent learner sessions would.
+
+    Args:
+        scenario (str): One of SCENARIOS.
+        make_tutor (Callable[[int], CrossDomainTutor]): Creates the tutor for a request index.
+        requests (int): The number of operations to run.
+        concurrency (int): The number of operations in flight at once.
+        seed (int): Seed for the simulated learner answers.
+
+    Returns:
+        Dict: The scenario summary (see summarize_latencies) plus peak traced memory.
+    """
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    # Build tests up front so evaluate_test measures grading alone
+    tests: List[Dict] = []
+    answers: List[Dict[str, str]] = []
+    if scenario == "evaluate_test":
+        tests = [json.loads(fake_test_payload(5, (i % 5) + 1, seed=i)) for i in range(20)]
+        answers = [{str(q): rng.choice("ABCD") for q in range(5)} for _ in range(requests)]
+
+    def operation(index: int) -> None:
+        nonlocal failures
+        tutor = make_tutor(index)
+        started = time.perf_counter()
+        try:
+            if scenario == "explain":
+                tutor.get_explanation(SAMPLE_QUERIES[index % len(SAMPLE_QUERIES)])
+            elif scenario == "stream":
+                for _ in tutor.stream_explanation(SAMPLE_QUERIES[index % len(SAMPLE_QUERIES)]):
+                    pass
+            elif scenario == "generate_test":
+                tutor.generate_test()
+            else:
+                tutor.evaluate_test(tests[index % len(tests)], answers[index])
+        except Exception:
+            with lock:
+                failures += 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(operation, range(requests)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = summarize_latencies(latencies, failures, elapsed)
+    summary["peak_traced_mb"] = round(peak / (1024 * 1024), 2)
+    return summary
+
+
+def run_benchmark(
+    backend: LLMBackend,
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    pipeline_mode: str = "two_stage",
+    test_questions: int = TEST_QUESTION_COUNT,
+    test_generation_mode: str = "single",
+    source_field: str = "Python",
+    target_field: str = "Rust"
+) -> Dict[str, Dict]:
+    """Run several scenarios against a backend.
+
+    Args:
+        backend (LLMBackend): The backend every tutor uses.
+        scenarios (List[str]): The scenarios to run, from SCENARIOS.
+        requests (int): Operations per scenario.
+        concurrency (int): Operations in flight at once.
+        pipeline_mode (str): The tutors' pipeline mode.
+        test_questions (int): The number of questions in a generated test.
+        test_generation_mode (str): The tutors' test generation mode.
+        source_field (str): The field the simulated learners are proficient in.
+        target_field (str): The field the simulated learners want to learn about.
+
+    Returns:
+        Dict[str, Dict]: Summaries keyed by scenario, plus the process's peak RSS.
+    """
+    def make_tutor(index: int) -> CrossDomainTutor:
+        return CrossDomainTutor(
+            source_field,
+            target_field,
+            backend=backend,
+            learner_id=f"learner-{index}",
+            pipeline_mode=pipeline_mode,
+            test_questions=test_questions,
+            test_generation_mode=test_generation_mode
+        )
+
+    results = {scenario: run_scenario(scenario, make_tutor, requests, concurrency) for scenario in scenarios}
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["process"] = {"peak_rss_mb": round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)}
+    return results
+
+
+def format_results(results: Dict[str, Dict]) -> str:
+    """Format benchmark results as a plain-text table.
+
+    Args:
+        results (Dict[str, Dict]): The output of run_benchmark.
+
+    Returns:
+        str: One row per scenario.
+    """
+    columns = ["operations", "failures", "p50_ms", "p95_ms", "p99_ms", "max_ms", "throughput_per_s", "peak_traced_mb"]
+    lines = ["scenario".ljust(15) + "".join(column.rjust(18) for column in columns)]
+    for scenario, summary in results.items():
+        if scenario == "process":
+            continue
+        lines.append(scenario.ljust(15) + "".join(str(summary[column]).rjust(18) for column in columns))
+    lines.append(f"peak RSS: {results['process']['peak_rss_mb']} MB")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the tutor pipeline against a local fake LLM backend.")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all", help="Which operation to drive")
+    parser.add_argument("--requests", type=int, default=100, help="Operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Operations in flight at once")
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default="two_stage", help="Tutor pipeline mode")
+    parser.add_argument("--test-questions", type=int, default=TEST_QUESTION_COUNT, help="Questions per generated test")
+    parser.add_argument("--test-mode", choices=TEST_GENERATION_MODES, default="single", help="Tutor test generation mode")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean time to first token of the fake backend")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Spread of the time to first token")
+    parser.add_argument("--distribution", choices=("constant", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Fake generation speed (0 for instant)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that a fake call fails")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    backend = FakeBackend(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.jitter_ms,
+        latency_distribution=args.distribution,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        seed=args.seed
+    )
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = run_benchmark(
+        backend,
+        scenarios,
+        args.requests,
+        args.concurrency,
+        args.mode,
+        test_questions=args.test_questions,
+        test_generation_mode=args.test_mode
+    )
+    print(format_results(results))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Token-budgeted conversation context for the Cross-Domain Learning Tutor.
+
+Splicing the last few full answers into every prompt makes prompt size (and latency)
+grow with answer length while silently forgetting everything older. The context window
+counts tokens locally, keeps the most recent turns that fit a token budget, and folds
+older turns into an incrementally updated summary. The summary is sent as its own
+message after the system prompt, so the system prompt prefix stays byte-stable and
+provider-side prompt caching can hit.
+"""
+
+import re
+from typing import Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens added by the chat format around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Heading of the message carrying the summary of folded turns
+SUMMARY_HEADING = "Summary of the earlier conversation:"
+
+_encoding = None
+
+
+def _get_encoding():
+    """Load the tiktoken encoding on first use, or None if it is unavailable."""
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text locally.
+
+    Uses tiktoken when it is installed, and otherwise estimates from the number of
+    words and punctuation marks.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The (estimated) number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    pieces = re.findall(r"\w+|[^\w\s]", text)
+    return int(sum(1 + len(piece) // 6 for piece in pieces) * 1.1) + 1
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Count the tokens of a list of chat messages.
+
+    Args:
+        messages (List[Dict[str, str]]): The chat messages.
+
+    Returns:
+        int: The (estimated) number of prompt tokens.
+    """
+    return sum(count_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten a text to roughly a token limit, keeping its beginning.
+
+    Args:
+        text (str): The text to shorten.
+        max_tokens (int): The token limit.
+
+    Returns:
+        str: The text, cut at a word boundary with an ellipsis if it was too long.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    clipped = text[:low].rsplit(" ", 1)[0] if " " in text[:low] else text[:low]
+    return clipped.rstrip() + " ..."
+
+
+def extractive_summary(summary: str, turns: List[Dict[str, str]], max_tokens: int = 300) -> str:
+    """Fold turns into a summary without an LLM call.
+
+    Keeps each question and the first sentence of each answer.
+
+    Args:
+        summary (str): The current summary.
+        turns (List[Dict[str, str]]): The turns to fold in, oldest first.
+        max_tokens (int): The token limit of the summary.
+
+    Returns:
+        str: The updated summary.
+    """
+    lines = [summary] if summary else []
+    for msg in turns:
+        if msg["role"] == "user":
+            lines.append(f"- Asked: {msg['content'].strip()}")
+        else:
+            first_sentence = re.split(r"(?<=[.!?])\s", msg["content"].strip(), maxsplit=1)[0]
+            lines.append(f"  Answered: {first_sentence}")
+    text = "\n".join(lines)
+    # Keep the most recent part when the summary outgrows its budget
+    while count_tokens(text) > max_tokens and len(lines) > 1:
+        lines.pop(0)
+        text = "\n".join(lines)
+    return clip_to_tokens(text, max_tokens)
+
+
+class ContextWindow:
+    """Recent conversation turns that fit a token budget, plus a rolling summary."""
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        max_summary_tokens: int = 300,
+        summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = None
+    ):
+        """Initialize the context window.
+
+        Args:
+            token_budget (int): The maximum number of context tokens, summary included.
+            max_summary_tokens (int): The maximum size of the rolling summary.
+            summarizer (Optional[Callable[[str, List[Dict[str, str]]], str]]): Folds turns into the
+                current summary; defaults to an extractive summary.
+        """
+        self.token_budget = token_budget
+        self.max_summary_tokens = max_summary_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+        self._turn_tokens: List[int] = []
+
+    def add(self, role: str, content: str) -> None:
+        """Append a turn without compacting.
+
+        Args:
+            role (str): The message role ("user" or "assistant").
+            content (str): The message content.
+        """
+        self.turns.append({"role": role, "content": content})
+        self._turn_tokens.append(count_tokens(content) + MESSAGE_OVERHEAD_TOKENS)
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Get the context messages to splice in after the system prompt.
+
+        Returns:
+            List[Dict[str, str]]: The summary message (if any) followed by the recent turns.
+        """
+        context = [{"role": "system", "content": f"{SUMMARY_HEADING}\n{self.summary}"}] if self.summary else []
+        return context + [dict(msg) for msg in self.turns]
+
+    def token_count(self) -> int:
+        """Count the tokens of the current context messages.
+
+        Returns:
+            int: The number of context tokens.
+        """
+        summary_tokens = count_tokens(self.summary) + MESSAGE_OVERHEAD_TOKENS if self.summary else 0
+        return summary_tokens + sum(self._turn_tokens)
+
+    def over_budget(self) -> bool:
+        """Check whether the context exceeds its token budget."""
+        return self.token_count() > self.token_budget
+
+    def take_overflow(self) -> List[Dict[str, str]]:
+        """Remove the oldest turns until the context fits its budget.
+
+        The latest exchange is always kept; if it alone exceeds the budget, its
+        answer is clipped instead.
+
+        Returns:
+            List[Dict[str, str]]: The removed turns, oldest first, to be folded into the summary.
+        """
+        budget = self.token_budget - self.max_summary_tokens - MESSAGE_OVERHEAD_TOKENS
+        overflow: List[Dict[str, str]] = []
+        while len(self.turns) > 2 and sum(self._turn_tokens) > budget:
+            overflow.append(self.turns.pop(0))
+            self._turn_tokens.pop(0)
+        if sum(self._turn_tokens) > budget and self.turns:
+            other_tokens = sum(self._turn_tokens[:-1])
+            last = self.turns[-1]
+            last["content"] = clip_to_tokens(last["content"], max(budget - other_tokens - MESSAGE_OVERHEAD_TOKENS, 32))
+            self._turn_tokens[-1] = count_tokens(last["content"]) + MESSAGE_OVERHEAD_TOKENS
+        return overflow
+
+    def fold(self, summary: str) -> None:
+        """Replace the rolling summary.
+
+        Args:
+            summary (str): The updated summary, clipped to the summary budget.
+        """
+        self.summary = clip_to_tokens(summary.strip(), self.max_summary_tokens)
+
+    def compact(self) -> None:
+        """Fold the oldest turns into the summary if the context exceeds its budget."""
+        if not self.over_budget():
+            return
+        overflow = self.take_overflow()
+        if not overflow:
+            return
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self.summary, overflow)
+            except Exception:
+                summary = None
+        if not summary:
+            summary = extractive_summary(self.summary, overflow, self.max_summary_tokens)
+        self.fold(summary)
+
+    def clear(self) -> None:
+        """Forget the summary and every turn."""
+        self.summary = ""
+        self.turns = []
+        self._turn_tokens = []
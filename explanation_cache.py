@@ -0,0 +1,210 @@
+"""Persistent cache for the Cross-Domain Learning Tutor pipeline.
+
+The expert explanation only depends on the target field, the recent context and the
+query, so it is cached in a tier shared by every source field. The adapted explanation
+is cached in a second tier that is additionally keyed on the source field. Entries are
+stored in SQLite so they survive restarts and are shared between app workers.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Cache tier for stage one (expert explanations in the target field)
+TARGET_TIER = "target"
+
+# Cache tier for stage two (explanations adapted for the source field)
+ADAPTED_TIER = "adapted"
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different phrasings share a cache key.
+
+    Args:
+        query (str): The user's question.
+
+    Returns:
+        str: The lower-cased query with collapsed whitespace and no trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?!. ")
+
+
+def context_fingerprint(context: List[Dict[str, str]]) -> str:
+    """Compute a stable fingerprint of the conversation context.
+
+    Args:
+        context (List[Dict[str, str]]): The messages included as prompt context.
+
+    Returns:
+        str: A hex digest, or an empty string when there is no context.
+    """
+    if not context:
+        return ""
+    payload = json.dumps(
+        [[msg["role"], msg["content"]] for msg in context],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def target_key(target_field: str, query: str, context: List[Dict[str, str]]) -> str:
+    """Build the stage one cache key.
+
+    Args:
+        target_field (str): The field the user wants to learn about.
+        query (str): The user's question.
+        context (List[Dict[str, str]]): The messages included as prompt context.
+
+    Returns:
+        str: The cache key for the expert explanation.
+    """
+    return "\x1f".join([target_field.strip().lower(), normalize_query(query), context_fingerprint(context)])
+
+
+def adapted_key(source_field: str, target_field: str, query: str, context: List[Dict[str, str]]) -> str:
+    """Build the stage two cache key.
+
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+        query (str): The user's question.
+        context (List[Dict[str, str]]): The messages included as prompt context.
+
+    Returns:
+        str: The cache key for the adapted explanation.
+    """
+    return "\x1f".join([source_field.strip().lower(), target_key(target_field, query, context)])
+
+
+class ExplanationCache:
+    """A two-tier SQLite-backed cache with LRU and TTL eviction."""
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 10000, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        """Initialize the cache.
+
+        Args:
+            path (str): The SQLite database file, or ":memory:" for a process-local cache.
+            max_entries (int): The maximum number of entries kept per tier.
+            ttl_seconds (Optional[float]): How long entries stay valid, or None to never expire.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._counters = {tier: {"hits": 0, "misses": 0, "evictions": 0} for tier in (TARGET_TIER, ADAPTED_TIER)}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL lets several worker processes read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache_entries (
+                tier TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (tier, key)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (tier, accessed_at)"
+        )
+
+    def get(self, tier: str, key: str) -> Optional[str]:
+        """Look up a cached value.
+
+        Args:
+            tier (str): The cache tier (TARGET_TIER or ADAPTED_TIER).
+            key (str): The cache key.
+
+        Returns:
+            Optional[str]: The cached value, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache_entries WHERE tier = ? AND key = ?",
+                (tier, key)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM cache_entries WHERE tier = ? AND key = ?", (tier, key))
+                self._counters[tier]["evictions"] += 1
+                row = None
+            if row is None:
+                self._counters[tier]["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE tier = ? AND key = ?",
+                (now, tier, key)
+            )
+            self._counters[tier]["hits"] += 1
+            return row[0]
+
+    def set(self, tier: str, key: str, value: str) -> None:
+        """Store a value and evict the least recently used entries beyond the size bound.
+
+        Args:
+            tier (str): The cache tier (TARGET_TIER or ADAPTED_TIER).
+            key (str): The cache key.
+            value (str): The value to store.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (tier, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (tier, key, value, now, now)
+            )
+            cursor = self._conn.execute(
+                """DELETE FROM cache_entries WHERE tier = ? AND key IN (
+                    SELECT key FROM cache_entries WHERE tier = ?
+                    ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (tier, tier, self.max_entries)
+            )
+            self._counters[tier]["evictions"] += max(cursor.rowcount, 0)
+
+    def purge_expired(self) -> int:
+        """Remove every entry older than the TTL.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM cache_entries WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            return max(cursor.rowcount, 0)
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Get per-tier hit, miss, eviction and size counters.
+
+        Hit and miss counters are local to this process; sizes reflect the shared store.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Counters keyed by tier.
+        """
+        with self._lock:
+            sizes = dict(self._conn.execute("SELECT tier, COUNT(*) FROM cache_entries GROUP BY tier").fetchall())
+            return {
+                tier: {**counters, "size": sizes.get(tier, 0)}
+                for tier, counters in self._counters.items()
+            }
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,270 @@
+"""Vectorized bulk grading for the Cross-Domain Learning Tutor.
+
+Cohort exams produce thousands of submissions for the same test. Instead of grading
+each learner's answer dict in a Python loop, the answer key and submissions are
+encoded as compact int8 arrays (A-D as 0-3, missing or invalid answers as -1) and
+graded in NumPy: per-learner scores and promotions, per-question p-values (the share
+of learners answering correctly) and distractor frequencies. Submission files are read
+in chunks, so a cohort of any size is graded in bounded memory.
+
+Example:
+    python grading.py test.json submissions.jsonl --json report.json
+"""
+
+import argparse
+import csv
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from test_bank import OPTION_KEYS
+
+# Code of a missing or invalid answer
+MISSING = -1
+
+# Score (in percent) at or above which a learner moves up a difficulty level
+PROMOTION_THRESHOLD = 80.0
+
+# Highest difficulty level
+MAX_DIFFICULTY = 5
+
+# Submissions encoded and graded per chunk when reading files
+CHUNK_SIZE = 10000
+
+# Byte value -> answer code; every byte but A-D decodes as missing
+_ANSWER_CODES = np.full(256, MISSING, dtype=np.int8)
+for _code, _key in enumerate(OPTION_KEYS):
+    _ANSWER_CODES[ord(_key)] = _code
+
+_VALID_ANSWERS = frozenset(OPTION_KEYS)
+
+
+def _encode_row(answers: Iterable) -> str:
+    """Spell a row of answers as one character each, with "-" for anything but A-D."""
+    return "".join([answer if isinstance(answer, str) and answer in _VALID_ANSWERS else "-" for answer in answers])
+
+
+def encode_answer_key(test_data: Dict) -> np.ndarray:
+    """Encode a test's correct answers.
+
+    Args:
+        test_data (Dict): The test data containing questions and correct answers.
+
+    Returns:
+        np.ndarray: An int8 vector with one answer code per question.
+    """
+    text = _encode_row(question["correct_answer"] for question in test_data["questions"])
+    return _ANSWER_CODES[np.frombuffer(text.encode("ascii"), dtype=np.uint8)]
+
+
+def encode_submissions(submissions: Iterable[Dict[str, str]], num_questions: int) -> np.ndarray:
+    """Encode learners' answers as a matrix.
+
+    Args:
+        submissions (Iterable[Dict[str, str]]): One dict per learner mapping question
+            indices ("0", "1", ...) to answers, as taken by evaluate_test.
+        num_questions (int): The number of questions in the test.
+
+    Returns:
+        np.ndarray: An int8 matrix with one row per learner and one column per question.
+    """
+    keys = [str(i) for i in range(num_questions)]
+    rows = [_encode_row(map(answers.get, keys)) for answers in submissions]
+    if not rows:
+        return np.empty((0, num_questions), dtype=np.int8)
+    text = "".join(rows).encode("ascii")
+    return _ANSWER_CODES[np.frombuffer(text, dtype=np.uint8)].reshape(len(rows), num_questions)
+
+
+def grade_submissions(answer_key: np.ndarray, answers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Score encoded submissions against an answer key.
+
+    Args:
+        answer_key (np.ndarray): The encoded correct answers (see encode_answer_key).
+        answers (np.ndarray): The encoded submissions (see encode_submissions).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Each learner's score as a percentage, and whether
+            it meets the promotion threshold.
+    """
+    correct = (answers == answer_key) & (answers != MISSING)
+    scores = correct.sum(axis=1) / len(answer_key) * 100
+    return scores, scores >= PROMOTION_THRESHOLD
+
+
+class CohortGrader:
+    """Grades a cohort's submissions for one test, chunk by chunk."""
+
+    def __init__(self, test_data: Dict):
+        """Initialize the grader.
+
+        Args:
+            test_data (Dict): The test data containing questions and correct answers.
+        """
+        self.answer_key = encode_answer_key(test_data)
+        self.difficulty_level = int(test_data.get("difficulty_level", 1))
+        self.num_questions = len(self.answer_key)
+        self.learner_ids: List[str] = []
+        self._scores: List[np.ndarray] = []
+        # Per question, how many learners chose each option; the last column counts missing answers
+        self._choice_counts = np.zeros((self.num_questions, len(OPTION_KEYS) + 1), dtype=np.int64)
+        self._correct_counts = np.zeros(self.num_questions, dtype=np.int64)
+
+    def add(self, answers: np.ndarray, learner_ids: Optional[List[str]] = None) -> np.ndarray:
+        """Grade a chunk of encoded submissions.
+
+        Args:
+            answers (np.ndarray): The encoded submissions (see encode_submissions).
+            learner_ids (Optional[List[str]]): The learner of each row; defaults to row numbers.
+
+        Returns:
+            np.ndarray: The chunk's scores as percentages.
+        """
+        if learner_ids is None:
+            start = len(self.learner_ids)
+            learner_ids = [str(start + i) for i in range(len(answers))]
+        scores, _ = grade_submissions(self.answer_key, answers)
+        self._correct_counts += ((answers == self.answer_key) & (answers != MISSING)).sum(axis=0)
+        # Count choices per (question, option) cell; missing answers (-1) land in the last column
+        width = len(OPTION_KEYS) + 1
+        cells = np.arange(self.num_questions) * width + np.where(answers == MISSING, len(OPTION_KEYS), answers)
+        self._choice_counts += np.bincount(cells.ravel(), minlength=self.num_questions * width).reshape(self.num_questions, width)
+        self.learner_ids.extend(learner_ids)
+        self._scores.append(scores)
+        return scores
+
+    def add_submissions(self, submissions: Iterable[Dict[str, str]], learner_ids: Optional[List[str]] = None) -> np.ndarray:
+        """Grade a chunk of answer dicts, as taken by evaluate_test.
+
+        Args:
+            submissions (Iterable[Dict[str, str]]): One answer dict per learner.
+            learner_ids (Optional[List[str]]): The learner of each submission.
+
+        Returns:
+            np.ndarray: The chunk's scores as percentages.
+        """
+        return self.add(encode_submissions(submissions, self.num_questions), learner_ids)
+
+    def report(self) -> Dict:
+        """Summarize the cohort graded so far.
+
+        Returns:
+            Dict: Per-learner "scores", "promoted" flags and "next_difficulty"; per-question
+                "p_values", "distractor_frequencies" (share of learners choosing each
+                option, keyed by option) and "omission_rates"; and cohort totals.
+        """
+        scores = np.concatenate(self._scores) if self._scores else np.zeros(0)
+        promoted = scores >= PROMOTION_THRESHOLD
+        learners = max(len(scores), 1)
+        shares = self._choice_counts / learners
+        return {
+            "submissions": len(scores),
+            "learner_ids": self.learner_ids,
+            "scores": scores,
+            "promoted": promoted,
+            "next_difficulty": np.where(promoted, min(self.difficulty_level + 1, MAX_DIFFICULTY), self.difficulty_level),
+            "mean_score": float(scores.mean()) if len(scores) else 0.0,
+            "promotion_rate": float(promoted.mean()) if len(scores) else 0.0,
+            "p_values": self._correct_counts / learners,
+            "distractor_frequencies": {key: shares[:, i] for i, key in enumerate(OPTION_KEYS)},
+            "omission_rates": shares[:, len(OPTION_KEYS)]
+        }
+
+
+def read_submissions(path: str, num_questions: int, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """Stream encoded submissions from a file in chunks.
+
+    JSONL files hold one {"learner_id": ..., "answers": {"0": "A", ...}} object per line.
+    CSV files have a learner_id column followed by one answer column per question.
+
+    Args:
+        path (str): The submissions file (.jsonl or .csv).
+        num_questions (int): The number of questions in the test.
+        chunk_size (int): The number of submissions per chunk.
+
+    Yields:
+        Tuple[List[str], np.ndarray]: The learner ids and encoded answers of each chunk.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            reader = csv.reader(f)
+            next(reader, None)
+            records = ((row[0], {str(i): answer for i, answer in enumerate(row[1:])}) for row in reader if row)
+        else:
+            lines = (json.loads(line) for line in f if line.strip())
+            records = ((str(record.get("learner_id", "")), record.get("answers", {})) for record in lines)
+
+        learner_ids: List[str] = []
+        submissions: List[Dict[str, str]] = []
+        for learner_id, answers in records:
+            learner_ids.append(learner_id)
+            submissions.append(answers)
+            if len(submissions) >= chunk_size:
+                yield learner_ids, encode_submissions(submissions, num_questions)
+                learner_ids, submissions = [], []
+        if submissions:
+            yield learner_ids, encode_submissions(submissions, num_questions)
+
+
+def grade_file(test_data: Dict, path: str, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """Grade every submission in a file.
+
+    Args:
+        test_data (Dict): The test data containing questions and correct answers.
+        path (str): The submissions file (see read_submissions).
+        chunk_size (int): The number of submissions graded at once.
+
+    Returns:
+        Dict: The cohort report (see CohortGrader.report).
+    """
+    grader = CohortGrader(test_data)
+    for learner_ids, answers in read_submissions(path, grader.num_questions, chunk_size):
+        grader.add(answers, learner_ids)
+    return grader.report()
+
+
+def format_report(report: Dict) -> str:
+    """Format the per-question part of a cohort report as a plain-text table.
+
+    Args:
+        report (Dict): The output of CohortGrader.report.
+
+    Returns:
+        str: Cohort totals followed by one row per question.
+    """
+    lines = [
+        f"submissions: {report['submissions']}  mean score: {report['mean_score']:.1f}%  "
+        f"promoted: {report['promotion_rate']:.1%}",
+        "question".ljust(10) + "p-value".rjust(10) + "".join(key.rjust(8) for key in OPTION_KEYS) + "omitted".rjust(10)
+    ]
+    for i, p_value in enumerate(report["p_values"]):
+        shares = "".join(f"{report['distractor_frequencies'][key][i]:.2f}".rjust(8) for key in OPTION_KEYS)
+        lines.append(str(i + 1).ljust(10) + f"{p_value:.2f}".rjust(10) + shares + f"{report['omission_rates'][i]:.2f}".rjust(10))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Grade a cohort's submissions for one test.")
+    parser.add_argument("test", help="The test JSON file")
+    parser.add_argument("submissions", help="The submissions file (.jsonl or .csv)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Submissions graded at once")
+    parser.add_argument("--json", dest="json_path", help="Also write per-learner results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.test, "r", encoding="utf-8") as f:
+        test_data = json.load(f)
+    report = grade_file(test_data, args.submissions, args.chunk_size)
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                key: value.tolist() if isinstance(value, np.ndarray) else
+                {option: shares.tolist() for option, shares in value.items()} if isinstance(value, dict) else value
+                for key, value in report.items()
+            }, f)
+
+
+if __name__ == "__main__":
+    main()
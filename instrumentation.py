@@ -0,0 +1,346 @@
+"""Latency, token and cost instrumentation for the Cross-Domain Learning Tutor.
+
+Every LLM call (and every cache hit that replaces one) produces a call record with the
+stage, model, wall time, time to first token, token usage, estimated cost, retries and
+cache status. Records are fanned out to pluggable sinks: an in-process ring buffer for
+live per-session panels, a JSONL trace file, and a Prometheus text exporter that can
+serve /metrics.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# USD prices per 1K (prompt, completion) tokens, matched by longest model name prefix
+MODEL_PRICES_PER_1K = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015)
+}
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the USD cost of a call from its token usage.
+
+    Args:
+        model (str): The model name.
+        prompt_tokens (int): Tokens in the prompt.
+        completion_tokens (int): Tokens in the completion.
+
+    Returns:
+        float: The estimated cost, or 0.0 for unknown models.
+    """
+    matches = [name for name in MODEL_PRICES_PER_1K if model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES_PER_1K[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000.0
+
+
+class RingBufferSink:
+    """Keeps the most recent call records in memory."""
+
+    def __init__(self, capacity: int = 5000):
+        """Initialize the sink.
+
+        Args:
+            capacity (int): The number of records kept.
+        """
+        self._records: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    def records(self, session: Optional[str] = None) -> List[Dict]:
+        """Get the buffered records, oldest first.
+
+        Args:
+            session (Optional[str]): Only return records from this session.
+
+        Returns:
+            List[Dict]: The call records.
+        """
+        with self._lock:
+            return [record for record in self._records if session is None or record.get("session") == session]
+
+    def summary(self, session: Optional[str] = None) -> Dict[str, Dict]:
+        """Aggregate the buffered records per stage.
+
+        Args:
+            session (Optional[str]): Only aggregate records from this session.
+
+        Returns:
+            Dict[str, Dict]: Per-stage call counts, cache hits, errors, tokens, cost and
+                p50/p95 wall time, plus an "all" entry with the totals.
+        """
+        by_stage: Dict[str, List[Dict]] = {}
+        for record in self.records(session):
+            by_stage.setdefault(record["stage"], []).append(record)
+            by_stage.setdefault("all", []).append(record)
+        summary = {}
+        for stage, records in by_stage.items():
+            wall_times = [record["wall_time_s"] for record in records if not record["cache_hit"]]
+            p50, p95 = np.percentile(wall_times, [50, 95]) if wall_times else (0.0, 0.0)
+            summary[stage] = {
+                "calls": sum(not record["cache_hit"] for record in records),
+                "cache_hits": sum(record["cache_hit"] for record in records),
+                "errors": sum(record["status"] != "ok" for record in records),
+                "prompt_tokens": sum(record["prompt_tokens"] for record in records),
+                "completion_tokens": sum(record["completion_tokens"] for record in records),
+                "cost_usd": sum(record["cost_usd"] for record in records),
+                "p50_s": float(p50),
+                "p95_s": float(p95)
+            }
+        return summary
+
+
+class JsonlTraceSink:
+    """Appends every call record to a JSONL trace file."""
+
+    def __init__(self, path: str):
+        """Initialize the sink.
+
+        Args:
+            path (str): The trace file, opened in append mode.
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink:
+    """Aggregates call records into Prometheus counters and histograms."""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+        self._gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def emit(self, record: Dict) -> None:
+        stage = (("stage", record["stage"]),)
+        labels = (("model", record["model"]), ("stage", record["stage"]))
+        with self._lock:
+            if record["cache_hit"]:
+                self._inc("tutor_cache_hits_total", stage)
+                return
+            self._inc("tutor_llm_calls_total", labels + (("status", record["status"]),))
+            self._inc("tutor_llm_retries_total", labels, record["retries"])
+            if record.get("priority") is not None:
+                self._observe("tutor_scheduler_wait_seconds", (("priority", record["priority"]),), record["queue_wait_s"])
+            if record["status"] != "ok":
+                return
+            self._inc("tutor_llm_tokens_total", labels + (("kind", "prompt"),), record["prompt_tokens"])
+            self._inc("tutor_llm_tokens_total", labels + (("kind", "completion"),), record["completion_tokens"])
+            self._inc("tutor_llm_cost_usd_total", labels, record["cost_usd"])
+            self._observe("tutor_llm_wall_time_seconds", labels, record["wall_time_s"])
+            if record["time_to_first_token_s"] is not None:
+                self._observe("tutor_llm_time_to_first_token_seconds", labels, record["time_to_first_token_s"])
+
+    def observe_rerun(self, view: str, wall_time_s: float) -> None:
+        """Record how long a Streamlit rerun of a view took.
+
+        Args:
+            view (str): The view that reran: "app" for the whole script, or a fragment.
+            wall_time_s (float): Seconds the rerun took on the server.
+        """
+        with self._lock:
+            self._observe("tutor_ui_rerun_seconds", (("view", view),), wall_time_s)
+
+    def observe_queue_depth(self, priority: str, depth: int) -> None:
+        """Record how many calls of a priority class are waiting for the scheduler.
+
+        Args:
+            priority (str): The priority class.
+            depth (int): The calls waiting now.
+        """
+        with self._lock:
+            self._gauges[("tutor_scheduler_queue_depth", (("priority", priority),))] = float(depth)
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._gauges}):
+                lines.append(f"# TYPE {name} gauge")
+                for (metric, labels), value in sorted(self._gauges.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), values in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    counts, total, count = values[:-2], values[-2], values[-1]
+                    for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                        lines.append(f"{name}_bucket{self._labels(labels + (('le', str(bound)),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                    lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve /metrics from a background thread.
+
+        Args:
+            port (int): The port to listen on.
+            host (str): The interface to bind.
+
+        Returns:
+            ThreadingHTTPServer: The running server.
+        """
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-exporter").start()
+        return self._server
+
+    def _inc(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float = 1.0) -> None:
+        """Increment a counter. Must be called with the lock held."""
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def _observe(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float) -> None:
+        """Record a histogram observation. Must be called with the lock held."""
+        key = (name, labels)
+        values = self._histograms.setdefault(key, [0.0] * (len(LATENCY_BUCKETS) + 2))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                values[i] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def _labels(self, labels: Tuple[Tuple[str, str], ...]) -> str:
+        """Format a label set."""
+        escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in labels)
+        return "{" + ",".join(escaped) + "}"
+
+
+class Instrumentation:
+    """Builds call records and fans them out to sinks."""
+
+    def __init__(self, sinks: Optional[List] = None):
+        """Initialize the instrumentation.
+
+        Args:
+            sinks (Optional[List]): Objects with an emit(record) method.
+        """
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink) -> None:
+        """Add a sink.
+
+        Args:
+            sink: An object with an emit(record) method.
+        """
+        self.sinks.append(sink)
+
+    def record_call(
+        self,
+        session: str,
+        stage: str,
+        model: str,
+        wall_time_s: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        time_to_first_token_s: Optional[float] = None,
+        retries: int = 0,
+        cache_hit: bool = False,
+        error: Optional[str] = None,
+        route: Optional[str] = None,
+        priority: Optional[str] = None,
+        queue_wait_s: float = 0.0
+    ) -> Dict:
+        """Record one LLM call or cache hit.
+
+        Args:
+            session (str): The learner session making the call.
+            stage (str): The pipeline stage.
+            model (str): The model used.
+            wall_time_s (float): Seconds from request to last token.
+            prompt_tokens (int): Tokens in the prompt.
+            completion_tokens (int): Tokens in the completion.
+            time_to_first_token_s (Optional[float]): Seconds until the first streamed token.
+            retries (int): How many times the call was retried.
+            cache_hit (bool): Whether a cache served the stage instead of the model.
+            error (Optional[str]): The error, if the call failed; failed calls are not costed.
+            route (Optional[str]): The routing decision that picked the model, e.g. "auto:fast".
+            priority (Optional[str]): The scheduler priority class of the call, if it was scheduled.
+            queue_wait_s (float): Seconds the call waited for the scheduler before it was sent.
+
+        Returns:
+            Dict: The call record that was emitted.
+        """
+        record = {
+            "timestamp": time.time(),
+            "session": session,
+            "stage": stage,
+            "model": model,
+            "wall_time_s": wall_time_s,
+            "time_to_first_token_s": time_to_first_token_s,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": 0.0 if cache_hit or error is not None else estimate_cost(model, prompt_tokens, completion_tokens),
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "status": "ok" if error is None else "error",
+            "error": error,
+            "route": route,
+            "priority": priority,
+            "queue_wait_s": queue_wait_s
+        }
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception:
+                # A broken sink must never fail the request being measured
+                pass
+        return record
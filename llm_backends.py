@@ -0,0 +1,369 @@
+"""LLM backends for the Cross-Domain Learning Tutor pipeline.
+
+The tutor talks to its language model through the LLMBackend interface. OpenAIBackend
+wraps the OpenAI clients; FakeBackend is a local, deterministic stand-in with
+configurable latency, token rate, streaming and failure injection, so the pipeline can
+be load-tested and benchmarked without network access or API spend.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from context_window import count_message_tokens, count_tokens
+
+
+class TransientBackendError(Exception):
+    """A backend failure that is worth retrying, such as an injected outage."""
+
+
+class Completion:
+    """The result of a non-streaming chat completion."""
+
+    def __init__(self, content: str, model: str, prompt_tokens: int, completion_tokens: int, finish_reason: Optional[str] = None):
+        """Initialize the completion.
+
+        Args:
+            content (str): The generated text.
+            model (str): The model that produced it.
+            prompt_tokens (int): Tokens in the prompt.
+            completion_tokens (int): Tokens in the generated text.
+            finish_reason (Optional[str]): Why generation stopped: "stop", "length" if
+                max_tokens cut the text off, or None if unknown.
+        """
+        self.content = content
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.finish_reason = finish_reason
+
+
+class CallStats:
+    """Details of a call that its result does not carry, filled in by the backend.
+
+    A caller passes one as the "stats" option of a call and reads it afterwards; the
+    option is never sent upstream.
+
+    Attributes:
+        retries (int): How many times the backend retried the call itself.
+        finish_reason (Optional[str]): Why a stream stopped, like Completion.finish_reason;
+            set once the stream has ended.
+    """
+
+    def __init__(self):
+        self.retries = 0
+        self.finish_reason: Optional[str] = None
+
+
+class LLMBackend:
+    """Interface for chat completion backends."""
+
+    # Whether the backend retries transient failures itself, so callers should not
+    handles_retries = False
+
+    def complete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        """Run a chat completion.
+
+        Args:
+            model (str): The model to use.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            temperature (float): The sampling temperature.
+            **options: Extra completion options such as max_tokens, or stats (a CallStats
+                the backend fills in).
+
+        Returns:
+            Completion: The generated text and its token usage.
+        """
+        raise NotImplementedError
+
+    def stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Iterator[str]:
+        """Stream a chat completion.
+
+        Args:
+            model (str): The model to use.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            temperature (float): The sampling temperature.
+            **options: Extra completion options such as max_tokens, or stats (a CallStats
+                the backend fills in).
+
+        Yields:
+            str: Content fragments as they arrive.
+        """
+        raise NotImplementedError
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        """Run a chat completion asynchronously. See complete."""
+        raise NotImplementedError
+
+    async def astream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> AsyncIterator[str]:
+        """Stream a chat completion asynchronously. See stream."""
+        raise NotImplementedError
+        yield
+
+
+class OpenAIBackend(LLMBackend):
+    """A backend that calls the OpenAI chat completions API."""
+
+    def __init__(self, client=None, async_client=None):
+        """Initialize the backend.
+
+        Args:
+            client (Optional[OpenAI]): The client for synchronous calls.
+            async_client (Optional[AsyncOpenAI]): The client for asynchronous calls.
+        """
+        self.client = client
+        self.async_client = async_client
+
+    def complete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        options.pop("stats", None)
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **options
+        )
+        return self._to_completion(response, model, messages)
+
+    def stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Iterator[str]:
+        stats = options.pop("stats", None)
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            **options
+        )
+        for chunk in response:
+            self._note_finish(chunk, stats)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        options.pop("stats", None)
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **options
+        )
+        return self._to_completion(response, model, messages)
+
+    async def astream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> AsyncIterator[str]:
+        stats = options.pop("stats", None)
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            **options
+        )
+        async for chunk in response:
+            self._note_finish(chunk, stats)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _note_finish(self, chunk, stats: Optional[CallStats]) -> None:
+        """Copy the finish reason of a stream's last chunk to the call's stats."""
+        if stats is not None and chunk.choices and chunk.choices[0].finish_reason:
+            stats.finish_reason = chunk.choices[0].finish_reason
+
+    def _to_completion(self, response, model: str, messages: List[Dict[str, str]]) -> Completion:
+        """Convert an OpenAI response, counting tokens locally if usage is missing."""
+        content = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        return Completion(
+            content,
+            getattr(response, "model", None) or model,
+            usage.prompt_tokens if usage else count_message_tokens(messages),
+            usage.completion_tokens if usage else count_tokens(content),
+            response.choices[0].finish_reason
+        )
+
+
+def fake_test_payload(num_questions: int, difficulty_level: int, seed: int = 0) -> str:
+    """Build a valid test JSON payload with templated questions.
+
+    Args:
+        num_questions (int): The number of questions.
+        difficulty_level (int): The difficulty level (1-5).
+        seed (int): Varies the question texts and answers.
+
+    Returns:
+        str: The test as a JSON string.
+    """
+    rng = random.Random(seed)
+    questions = []
+    for i in range(num_questions):
+        topic = rng.randrange(1_000_000)
+        questions.append({
+            "question": f"Which statement about concept {topic} (question {i + 1}) is correct?",
+            "options": {key: f"Statement {key} about concept {topic}" for key in "ABCD"},
+            "correct_answer": rng.choice("ABCD"),
+            "explanation": f"The correct statement describes concept {topic} precisely.",
+            "source_field_connection": f"Concept {topic} mirrors a familiar pattern."
+        })
+    return json.dumps({
+        "questions": questions,
+        "difficulty_level": difficulty_level,
+        "total_questions": num_questions
+    }, indent=2)
+
+
+def fake_explanation(messages: List[Dict[str, str]], paragraphs: int = 4, words_per_paragraph: int = 60) -> str:
+    """Build a templated explanation that echoes the request.
+
+    Args:
+        messages (List[Dict[str, str]]): The chat messages being answered.
+        paragraphs (int): The number of paragraphs.
+        words_per_paragraph (int): The length of each paragraph.
+
+    Returns:
+        str: Markdown text with paragraphs and a code block.
+    """
+    topic = " ".join(messages[-1]["content"].split()[:12])
+    filler = ("This part walks through the idea step by step and relates it to what you already know. " * 20).split()
+    blocks = [
+        f"Paragraph {i + 1} about {topic}: " + " ".join(filler[:words_per_paragraph])
+        for i in range(paragraphs)
+    ]
+    blocks.insert(paragraphs // 2, "```\nexample = explain(topic)\n\nprint(example)\n```")
+    return "\n\n".join(blocks)
+
+
+class FakeBackend(LLMBackend):
+    """A local stand-in backend with configurable latency, token rate and failures.
+
+    Like the OpenAI client, a completion that would outlast its "timeout" option fails
+    with a retryable error once the timeout has passed.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        latency_jitter_ms: float = 100.0,
+        latency_distribution: str = "lognormal",
+        tokens_per_second: float = 80.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        responder: Optional[Callable[[str, List[Dict[str, str]]], str]] = None
+    ):
+        """Initialize the fake backend.
+
+        Args:
+            latency_ms (float): The mean time to first token in milliseconds.
+            latency_jitter_ms (float): The spread of the time to first token.
+            latency_distribution (str): "constant", "uniform" or "lognormal".
+            tokens_per_second (float): The generation speed after the first token; 0 for instant.
+            failure_rate (float): The probability that a call raises TransientBackendError.
+            seed (Optional[int]): Seed for latency, failures and generated content.
+            responder (Optional[Callable[[str, List[Dict[str, str]]], str]]): Produces the content
+                for a (model, messages) pair; defaults to templated explanations and tests.
+        """
+        if latency_distribution not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.responder = responder
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def complete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        delay, content, finish_reason = self._begin(model, messages, options)
+        duration, timed_out = self._duration(delay, content, options)
+        time.sleep(duration)
+        if timed_out:
+            raise TransientBackendError(f"Request timed out after {duration:.1f}s")
+        return Completion(content, model, count_message_tokens(messages), count_tokens(content), finish_reason)
+
+    def stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Iterator[str]:
+        delay, content, finish_reason = self._begin(model, messages, options)
+        time.sleep(delay)
+        for fragment, pause in self._fragments(content):
+            time.sleep(pause)
+            yield fragment
+        if options.get("stats") is not None:
+            options["stats"].finish_reason = finish_reason
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        delay, content, finish_reason = self._begin(model, messages, options)
+        duration, timed_out = self._duration(delay, content, options)
+        await asyncio.sleep(duration)
+        if timed_out:
+            raise TransientBackendError(f"Request timed out after {duration:.1f}s")
+        return Completion(content, model, count_message_tokens(messages), count_tokens(content), finish_reason)
+
+    async def astream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> AsyncIterator[str]:
+        delay, content, finish_reason = self._begin(model, messages, options)
+        await asyncio.sleep(delay)
+        for fragment, pause in self._fragments(content):
+            await asyncio.sleep(pause)
+            yield fragment
+        if options.get("stats") is not None:
+            options["stats"].finish_reason = finish_reason
+
+    def _begin(self, model: str, messages: List[Dict[str, str]], options: Dict) -> Tuple[float, str, str]:
+        """Draw the latency, inject a failure if due, and produce the content with its finish reason."""
+        with self._lock:
+            self.calls += 1
+            failed = self._rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+            if self.latency_distribution == "constant":
+                delay_ms = self.latency_ms
+            elif self.latency_distribution == "uniform":
+                delay_ms = self._rng.uniform(self.latency_ms - self.latency_jitter_ms, self.latency_ms + self.latency_jitter_ms)
+            else:
+                sigma = min(self.latency_jitter_ms / max(self.latency_ms, 1e-9), 2.0)
+                delay_ms = self._rng.lognormvariate(0.0, sigma) * self.latency_ms
+            seed = self._rng.randrange(1 << 30)
+        if failed:
+            raise TransientBackendError("Injected backend failure")
+        if self.responder is not None:
+            content = self.responder(model, messages)
+        else:
+            content = self._default_response(model, messages, seed)
+        finish_reason = "stop"
+        max_tokens = options.get("max_tokens")
+        if max_tokens and count_tokens(content) > max_tokens:
+            content = " ".join(content.split()[:max_tokens])
+            finish_reason = "length"
+        return max(delay_ms, 0.0) / 1000.0, content, finish_reason
+
+    def _duration(self, delay: float, content: str, options: Dict) -> Tuple[float, bool]:
+        """Get how long a completion runs, and whether it is cut off by its timeout."""
+        seconds = delay + self._generation_time(content)
+        timeout = options.get("timeout")
+        if timeout is not None and seconds > timeout:
+            return timeout, True
+        return seconds, False
+
+    def _generation_time(self, content: str) -> float:
+        """Seconds needed to generate a text at the configured token rate."""
+        return count_tokens(content) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _fragments(self, content: str) -> Iterator[Tuple[str, float]]:
+        """Split a text into stream fragments with the pause before each."""
+        pieces = re.findall(r"\S+\s*|\s+", content)
+        pause = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for piece in pieces:
+            yield piece, pause * max(count_tokens(piece), 1)
+
+    def _default_response(self, model: str, messages: List[Dict[str, str]], seed: int = 0) -> str:
+        """Produce templated content that fits the prompt."""
+        system = messages[0]["content"] if messages else ""
+        if "multiple-choice questions" in system or '"questions"' in system:
+            match = re.search(r"(\d+)\s+(?:more\s+)?MCQs?", messages[-1]["content"])
+            level = re.search(r"difficulty level (\d)", system)
+            return fake_test_payload(int(match.group(1)) if match else 5, int(level.group(1)) if level else 1, seed)
+        if "running summary" in system:
+            return "- Asked about earlier topics and received adapted explanations."
+        return fake_explanation(messages)
@@ -0,0 +1,254 @@
+"""Query-complexity model routing for the Cross-Domain Learning Tutor.
+
+Sending every stage of every query to the strongest model makes latency and cost
+uniformly high, although most definitional questions are answered just as well by a
+fast model. The router scores each query locally (length, code, reasoning cues,
+difficulty level and how much conversation it builds on) and picks a fast or a strong
+model per pipeline stage according to a policy:
+
+- "strong" and "fast" always use that model.
+- "auto" uses the strong model when the complexity score reaches the threshold.
+- "cascade" drafts with the fast model and escalates to the strong one only when the
+  draft fails validation (an invalid or incomplete test, an empty or cut-off
+  explanation). Streamed stages cannot take back what they sent, so they fall back to
+  "auto".
+
+Policies are set per stage and can be overridden per field pair. Every decision is
+returned as a dict, which the tutor keeps in the run record next to the stage metrics.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Models behind the "fast" and "strong" tiers
+FAST_MODEL = "gpt-3.5-turbo"
+STRONG_MODEL = "gpt-4"
+
+# Routing policies of a stage
+ROUTING_POLICIES = ("strong", "fast", "auto", "cascade")
+
+# Policy of each routed stage unless configured otherwise
+DEFAULT_POLICIES = {
+    "expert": "auto",
+    "adapter": "auto",
+    "fused": "auto",
+    "test_generator": "cascade"
+}
+
+# Complexity score at or above which "auto" picks the strong model
+COMPLEXITY_THRESHOLD = 0.25
+
+# A cascade draft explanation shorter than this is escalated
+MIN_DRAFT_CHARS = 120
+
+# Phrasings that call for reasoning rather than recall
+REASONING_CUES = (
+    "why", "how does", "how would", "compare", "difference", "versus", " vs",
+    "trade-off", "tradeoff", "prove", "derive", "design", "implement", "optimiz",
+    "optimis", "debug", "step by step", "in depth"
+)
+
+# Openings of definitional questions
+DEFINITION_CUES = ("what is", "what are", "what's", "whats", "define", "meaning of", "what does")
+
+# Code-like fragments: calls, operators and statement keywords
+CODE_PATTERN = re.compile(r"```|\w+\([^)]*\)|[{};]|=>|->|::|\b(?:def|fn|class|import|return|let|const)\b")
+
+# Context window (prompt plus completion tokens) per model name prefix
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-3.5-turbo": 16385
+}
+
+# Context window assumed for models not listed above
+DEFAULT_CONTEXT_TOKENS = 8192
+
+
+def context_limit(model: str) -> int:
+    """Get the context window of a model, matched by the longest known name prefix.
+
+    Args:
+        model (str): The model name.
+
+    Returns:
+        int: The tokens the prompt and completion may take together.
+    """
+    matches = [name for name in MODEL_CONTEXT_TOKENS if model.startswith(name)]
+    return MODEL_CONTEXT_TOKENS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_TOKENS
+
+
+def query_complexity(query: str, difficulty_level: int = 1, recent_context: Sequence[Dict[str, str]] = ()) -> float:
+    """Score how much reasoning a query needs, without calling a model.
+
+    Args:
+        query (str): The user's question; empty for stages without one.
+        difficulty_level (int): The learner's difficulty level (1-5).
+        recent_context (Sequence[Dict[str, str]]): The messages included as prompt context.
+
+    Returns:
+        float: A score from 0 (trivial) to 1 (complex).
+    """
+    lowered = query.lower().strip()
+    score = min(len(lowered.split()) / 60, 1.0) * 0.35
+    if CODE_PATTERN.search(query):
+        score += 0.3
+    if any(cue in lowered for cue in REASONING_CUES):
+        score += 0.2
+    elif lowered.startswith(DEFINITION_CUES):
+        score -= 0.15
+    score += (min(max(difficulty_level, 1), 5) - 1) / 4 * 0.25
+    # Follow-ups have to be tied into the conversation so far
+    earlier_questions = sum(message["role"] == "user" for message in recent_context)
+    score += min(earlier_questions, 5) / 5 * 0.1
+    return max(0.0, min(score, 1.0))
+
+
+def validate_draft(content: str) -> bool:
+    """Check a cascade draft explanation before accepting it.
+
+    Args:
+        content (str): The fast model's explanation.
+
+    Returns:
+        bool: False if the draft is empty, too short or ends in an unclosed code block.
+    """
+    content = content.strip()
+    return len(content) >= MIN_DRAFT_CHARS and content.count("```") % 2 == 0
+
+
+class ModelRouter:
+    """Picks the model of each pipeline stage from per-stage and per field pair policies."""
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, str]] = None,
+        field_policies: Optional[Dict[Tuple[str, str], Dict[str, str]]] = None,
+        fast_model: str = FAST_MODEL,
+        strong_model: str = STRONG_MODEL,
+        threshold: float = COMPLEXITY_THRESHOLD
+    ):
+        """Initialize the router.
+
+        Args:
+            policies (Optional[Dict[str, str]]): Policy per stage, on top of DEFAULT_POLICIES.
+            field_policies (Optional[Dict[Tuple[str, str], Dict[str, str]]]): Policies per stage
+                for specific (source field, target field) pairs.
+            fast_model (str): The model of the fast tier.
+            strong_model (str): The model of the strong tier.
+            threshold (float): The complexity score at which "auto" picks the strong model.
+
+        Raises:
+            ValueError: If a policy is not one of ROUTING_POLICIES.
+        """
+        self.policies = {**DEFAULT_POLICIES, **(policies or {})}
+        self.field_policies = {
+            self._pair(source_field, target_field): stage_policies
+            for (source_field, target_field), stage_policies in (field_policies or {}).items()
+        }
+        for stage_policies in [self.policies, *self.field_policies.values()]:
+            for stage, policy in stage_policies.items():
+                if policy not in ROUTING_POLICIES:
+                    raise ValueError(f"Unknown routing policy for {stage}: {policy}")
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.threshold = threshold
+
+    def policy(self, stage: str, source_field: str, target_field: str) -> str:
+        """Get the policy of a stage for a field pair.
+
+        Args:
+            stage (str): The pipeline stage.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+
+        Returns:
+            str: One of ROUTING_POLICIES; stages without a policy use the strong model.
+        """
+        overrides = self.field_policies.get(self._pair(source_field, target_field), {})
+        return overrides.get(stage, self.policies.get(stage, "strong"))
+
+    def route(
+        self,
+        stage: str,
+        source_field: str,
+        target_field: str,
+        query: str = "",
+        difficulty_level: int = 1,
+        recent_context: Sequence[Dict[str, str]] = (),
+        streaming: bool = False
+    ) -> Dict:
+        """Decide which model a stage should call.
+
+        Args:
+            stage (str): The pipeline stage.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            query (str): The user's question, if the stage answers one.
+            difficulty_level (int): The learner's difficulty level (1-5).
+            recent_context (Sequence[Dict[str, str]]): The messages included as prompt context.
+            streaming (bool): Whether the stage streams its output, which rules out a cascade.
+
+        Returns:
+            Dict: The decision: "stage", "policy", "complexity", "tier", "model" and "escalated".
+        """
+        policy = self.policy(stage, source_field, target_field)
+        if policy == "cascade" and streaming:
+            policy = "auto"
+        complexity = query_complexity(query, difficulty_level, recent_context)
+        if policy == "auto":
+            tier = "strong" if complexity >= self.threshold else "fast"
+        elif policy == "cascade":
+            tier = "fast"
+        else:
+            tier = policy
+        return {
+            "stage": stage,
+            "policy": policy,
+            "complexity": round(complexity, 3),
+            "tier": tier,
+            "model": self.strong_model if tier == "strong" else self.fast_model,
+            "escalated": False
+        }
+
+    def escalate(self, decision: Dict) -> Dict:
+        """Move a decision to the strong model after its draft failed validation.
+
+        Args:
+            decision (Dict): The output of route.
+
+        Returns:
+            Dict: A copy of the decision using the strong model.
+        """
+        return {**decision, "tier": "strong", "model": self.strong_model, "escalated": True}
+
+    def _pair(self, source_field: str, target_field: str) -> Tuple[str, str]:
+        """Normalize a field pair for policy lookups."""
+        return source_field.strip().lower(), target_field.strip().lower()
+
+
+def load_router(path: str) -> ModelRouter:
+    """Load a router from a JSON configuration file.
+
+    The file may set "fast_model", "strong_model", "threshold", "policies" (per stage)
+    and "field_pairs", a list of {"source_field", "target_field", "policies"} objects.
+
+    Args:
+        path (str): The configuration file.
+
+    Returns:
+        ModelRouter: The configured router.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    field_pairs: List[Dict] = config.get("field_pairs", [])
+    return ModelRouter(
+        policies=config.get("policies"),
+        field_policies={(pair["source_field"], pair["target_field"]): pair["policies"] for pair in field_pairs},
+        fast_model=config.get("fast_model", FAST_MODEL),
+        strong_model=config.get("strong_model", STRONG_MODEL),
+        threshold=float(config.get("threshold", COMPLEXITY_THRESHOLD))
+    )
@@ -0,0 +1,348 @@
+"""Offline curriculum prefill for the Cross-Domain Learning Tutor.
+
+Runs a curriculum of core topics per field pair through the two-stage pipeline ahead of
+time, so the live app answers them from the PrefillStore without calling a model. The
+job is:
+
+- Resumable: every topic is stored as soon as it is done, which is also the
+  checkpoint, so an interrupted run picks up where it stopped.
+- Incremental: topics already generated under the current prompt version are skipped,
+  and an expert explanation still current for a target field is reused. Source fields
+  asking the same topic of a target field at the same time share one expert call. The
+  prompt presets are read from TUTOR_PROMPT_PRESETS, like the app's, so the versions match.
+- Bounded: at most --concurrency topics are in flight at once, and calls run as
+  background work within the process's rate limits (TUTOR_REQUESTS_PER_MINUTE,
+  TUTOR_TOKENS_PER_MINUTE).
+
+Every request the job makes is also appended to a JSONL file in the provider's batch
+request format, before it is sent, so a run can be audited or replayed through the
+batch API. Each custom_id appears once, across resumed runs too.
+
+Curriculum file (JSON):
+    {"pairs": [{"source_field": "Python", "target_field": "Rust", "topics": ["What is ownership?", ...]}]}
+
+Example:
+    python prefill.py curriculum.json --concurrency 8
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from async_tutor import AsyncCrossDomainTutor
+from explanation_cache import ADAPTED_TIER, TARGET_TIER, adapted_key, normalize_query, target_key
+from instrumentation import Instrumentation
+from llm_backends import FakeBackend, LLMBackend, OpenAIBackend
+from model_router import STRONG_MODEL
+from prefill_store import PrefillStore, prompt_version
+from prompts.registry import parse_presets
+from resilience import ResilientBackend
+from scheduler import RequestScheduler, request_priority
+from single_flight import SingleFlight
+from tutor_registry import create_shared_async_client
+
+# Endpoint named in every batch request line
+BATCH_URL = "/v1/chat/completions"
+
+# Sampling temperature of prefilled explanations, matching the live pipeline
+PREFILL_TEMPERATURE = 0.7
+
+# Topics between two progress lines
+PROGRESS_EVERY = 25
+
+
+def load_curriculum(path: str) -> List[Tuple[str, str, List[str]]]:
+    """Load a curriculum file.
+
+    Args:
+        path (str): A JSON file with a "pairs" list of {"source_field", "target_field", "topics"}.
+
+    Returns:
+        List[Tuple[str, str, List[str]]]: (source field, target field, topics) per pair, with
+            topics that normalize to the same question dropped.
+
+    Raises:
+        ValueError: If the file does not have that shape.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    pairs = config.get("pairs") if isinstance(config, dict) else None
+    if not isinstance(pairs, list):
+        raise ValueError("The curriculum must be a JSON object with a \"pairs\" list")
+    curriculum = []
+    for pair in pairs:
+        if not isinstance(pair, dict) or not pair.get("source_field") or not pair.get("target_field"):
+            raise ValueError("Every curriculum pair needs a source_field and a target_field")
+        topics = pair.get("topics", [])
+        if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+            raise ValueError(f"The topics of {pair['source_field']} -> {pair['target_field']} must be a list of strings")
+        unique: Dict[str, str] = {}
+        for topic in topics:
+            if topic.strip():
+                unique.setdefault(normalize_query(topic), topic.strip())
+        curriculum.append((pair["source_field"], pair["target_field"], list(unique.values())))
+    return curriculum
+
+
+class BatchRequestLog:
+    """Appends requests to a JSONL file in the provider's batch request format, once per custom_id."""
+
+    def __init__(self, path: str):
+        """Open the log for appending.
+
+        Args:
+            path (str): The JSONL file; an existing file is extended, so resumed runs add to it.
+        """
+        self.path = path
+        self._ids = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._ids.add(json.loads(line)["custom_id"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(
+        self,
+        custom_id: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int] = None
+    ) -> bool:
+        """Append one request, unless a request with the same custom_id was already logged.
+
+        Args:
+            custom_id (str): Identifies the request; unique per topic, tier and prompt version.
+            model (str): The model the request was sent to.
+            messages (List[Dict[str, str]]): The chat messages sent.
+            temperature (float): The sampling temperature.
+            max_tokens (Optional[int]): The completion limit the request was sent with.
+
+        Returns:
+            bool: True if the request was appended.
+        """
+        body = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens is not None:
+            body["max_tokens"] = max_tokens
+        line = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_URL,
+            "body": body
+        }
+        with self._lock:
+            if custom_id in self._ids:
+                return False
+            self._ids.add(custom_id)
+            self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._file.flush()
+        return True
+
+    def close(self) -> None:
+        """Close the file."""
+        with self._lock:
+            self._file.close()
+
+
+def _custom_id(tier: str, version: str, key: str) -> str:
+    """Build the batch request id of a topic's stage."""
+    return f"{tier}-{version}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+async def _generate(tutor: AsyncCrossDomainTutor, stage: str, messages: List[Dict[str, str]], model: str, topic: str) -> str:
+    """Run one stage of a topic, refusing an empty answer or one cut off at max_tokens."""
+    run: Dict = {"stages": [], "truncated": []}
+    explanation = (await tutor._complete(stage, messages, run, model=model, temperature=PREFILL_TEMPERATURE)).strip()
+    if not explanation:
+        raise ValueError(f"Empty {stage} explanation for {topic!r}")
+    if run["truncated"]:
+        raise ValueError(f"The {stage} explanation for {topic!r} was cut off at max_tokens")
+    return explanation
+
+
+async def prefill_topic(
+    tutor: AsyncCrossDomainTutor,
+    topic: str,
+    store: PrefillStore,
+    batch_log: Optional[BatchRequestLog] = None,
+    model: str = STRONG_MODEL,
+    single_flight: Optional[SingleFlight] = None
+) -> str:
+    """Generate and store the explanations of one topic, unless they are current.
+
+    Args:
+        tutor (AsyncCrossDomainTutor): The tutor of the topic's field pair; its history is not touched.
+        topic (str): The curriculum question.
+        store (PrefillStore): Receives the expert and adapted explanations.
+        batch_log (Optional[BatchRequestLog]): Receives every request made.
+        model (str): The model both stages use.
+        single_flight (Optional[SingleFlight]): Shared by the topics of a run, so that topics
+            needing the same expert explanation at the same time make one expert call.
+
+    Returns:
+        str: "skipped" if the adapted explanation was already current, else "generated".
+
+    Raises:
+        ValueError: If a stage returned an empty explanation or one cut off at max_tokens.
+    """
+    source_field, target_field = tutor.source_field, tutor.target_field
+    adapted_version = prompt_version(ADAPTED_TIER, source_field, target_field, tutor.prompt_presets, tutor.prompts)
+    adapted_cache_key = adapted_key(source_field, target_field, topic, [])
+    if store.get(ADAPTED_TIER, adapted_cache_key, adapted_version) is not None:
+        return "skipped"
+
+    # Step 1: The expert explanation is shared by every source field of the target field
+    target_version = prompt_version(TARGET_TIER, source_field, target_field, tutor.prompt_presets, tutor.prompts)
+    target_cache_key = target_key(target_field, topic, [])
+    target_explanation = store.get(TARGET_TIER, target_cache_key, target_version)
+    if target_explanation is None:
+        async def generate_target() -> str:
+            messages = tutor._target_messages(topic, [])
+            if batch_log is not None:
+                batch_log.write(
+                    _custom_id(TARGET_TIER, target_version, target_cache_key),
+                    model,
+                    messages,
+                    PREFILL_TEMPERATURE,
+                    tutor._budget("expert", model, messages, {})[1]["max_tokens"]
+                )
+            explanation = await _generate(tutor, "expert", messages, model, topic)
+            store.put(TARGET_TIER, target_cache_key, target_version, explanation, model)
+            return explanation
+
+        if single_flight is None:
+            target_explanation = await generate_target()
+        else:
+            # Join another source field's topic that is already generating this explanation
+            target_explanation, _ = await single_flight.do(
+                _custom_id(TARGET_TIER, target_version, target_cache_key),
+                generate_target
+            )
+
+    # Step 2: Adapt it for the source field
+    messages = tutor._adapter_messages(target_explanation, [])
+    if batch_log is not None:
+        batch_log.write(
+            _custom_id(ADAPTED_TIER, adapted_version, adapted_cache_key),
+            model,
+            messages,
+            PREFILL_TEMPERATURE,
+            tutor._budget("adapter", model, messages, {})[1]["max_tokens"]
+        )
+    adapted_explanation = await _generate(tutor, "adapter", messages, model, topic)
+    store.put(ADAPTED_TIER, adapted_cache_key, adapted_version, adapted_explanation, model)
+    return "generated"
+
+
+async def prefill(
+    curriculum: List[Tuple[str, str, List[str]]],
+    store: PrefillStore,
+    backend: LLMBackend,
+    batch_log: Optional[BatchRequestLog] = None,
+    concurrency: int = 8,
+    model: str = STRONG_MODEL,
+    instrumentation: Optional[Instrumentation] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    prompt_presets: Optional[Dict[str, str]] = None
+) -> Dict[str, int]:
+    """Prefill every topic of a curriculum.
+
+    A failed topic is reported and left for the next run; the others carry on.
+
+    Args:
+        curriculum (List[Tuple[str, str, List[str]]]): The output of load_curriculum.
+        store (PrefillStore): Receives the explanations and serves as the checkpoint.
+        backend (LLMBackend): The LLM backend.
+        batch_log (Optional[BatchRequestLog]): Receives every request made.
+        concurrency (int): The maximum number of topics in flight.
+        model (str): The model both stages use.
+        instrumentation (Optional[Instrumentation]): Receives a call record for every LLM call.
+        scheduler (Optional[RequestScheduler]): Admits the calls as background work.
+        prompt_presets (Optional[Dict[str, str]]): The prompt preset per role, matching the live app's.
+
+    Returns:
+        Dict[str, int]: The number of topics, and of those "generated", "skipped" and "failed".
+    """
+    work: "asyncio.Queue[Tuple[AsyncCrossDomainTutor, str]]" = asyncio.Queue()
+    for source_field, target_field, topics in curriculum:
+        tutor = AsyncCrossDomainTutor(
+            source_field,
+            target_field,
+            backend=backend,
+            instrumentation=instrumentation,
+            max_concurrency=concurrency,
+            learner_id="prefill",
+            scheduler=scheduler,
+            prompt_presets=prompt_presets
+        )
+        for topic in topics:
+            work.put_nowait((tutor, topic))
+    counts = {"topics": work.qsize(), "generated": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+    single_flight = SingleFlight()
+
+    async def worker() -> None:
+        while not work.empty():
+            tutor, topic = work.get_nowait()
+            try:
+                counts[await prefill_topic(tutor, topic, store, batch_log, model, single_flight)] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Failed {tutor.source_field} -> {tutor.target_field}: {topic!r}: {e}", file=sys.stderr)
+            done = counts["generated"] + counts["skipped"] + counts["failed"]
+            if done % PROGRESS_EVERY == 0:
+                print(f"{done}/{counts['topics']} topics in {time.perf_counter() - started:.0f}s", file=sys.stderr)
+
+    # The workers inherit the priority class when gather wraps them in tasks
+    with request_priority("background"):
+        await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, counts["topics"])))])
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Generate curriculum explanations offline for the live tutor to serve.")
+    parser.add_argument("curriculum", help="JSON file of topics per field pair")
+    parser.add_argument("--store", help="Prefill database (default: TUTOR_PREFILL_DB or tutor_prefill.db)")
+    parser.add_argument("--batch-file", default="prefill_batch.jsonl", help="JSONL file receiving every request in batch format")
+    parser.add_argument("--concurrency", type=int, default=8, help="Topics in flight at once")
+    parser.add_argument("--model", default=STRONG_MODEL, help="Model of both stages")
+    parser.add_argument("--backend", choices=("openai", "fake"), default="openai", help="fake serves canned content for dry runs")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.backend == "openai" and not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+    curriculum = load_curriculum(args.curriculum)
+    prompt_presets = parse_presets(os.getenv("TUTOR_PROMPT_PRESETS", ""))
+    inner: LLMBackend = FakeBackend() if args.backend == "fake" else OpenAIBackend(async_client=create_shared_async_client(max_retries=0))
+    # Retry transient failures but never hedge: nobody is waiting on an offline job
+    backend = ResilientBackend(inner, max_retries=int(os.getenv("TUTOR_MAX_RETRIES", "3")), hedge_ratio=0.0)
+    scheduler = RequestScheduler(
+        requests_per_minute=float(os.getenv("TUTOR_REQUESTS_PER_MINUTE", "500")),
+        tokens_per_minute=float(os.getenv("TUTOR_TOKENS_PER_MINUTE", "150000"))
+    )
+    store = PrefillStore(args.store or os.getenv("TUTOR_PREFILL_DB", "tutor_prefill.db"))
+    batch_log = BatchRequestLog(args.batch_file)
+    try:
+        counts = asyncio.run(prefill(curriculum, store, backend, batch_log, args.concurrency, args.model, scheduler=scheduler, prompt_presets=prompt_presets))
+    finally:
+        batch_log.close()
+        store.close()
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Store of curriculum explanations generated offline for the Cross-Domain Learning Tutor.
+
+Most learners on a field pair ask the same few hundred core questions. The prefill job
+(prefill.py) answers a curriculum of such topics ahead of time and writes the results
+here. The live pipeline looks a question up in this store before anything else. Unlike
+the explanation cache, entries never expire or get evicted. Each entry records the
+version of the prompts that produced it, so a prompt change makes its entries stale
+and the next prefill run regenerates just those.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from explanation_cache import ADAPTED_TIER, TARGET_TIER
+from prompts.registry import PromptRegistry, default_registry, fingerprint
+
+
+def prompt_version(
+    tier: str,
+    source_field: str,
+    target_field: str,
+    presets: Optional[Dict[str, str]] = None,
+    registry: Optional[PromptRegistry] = None
+) -> str:
+    """Fingerprint the prompts that produce an entry of a tier.
+
+    Args:
+        tier (str): TARGET_TIER (expert prompt only) or ADAPTED_TIER (expert, adapter and
+            fused prompts, since fused answers are cached in the same tier).
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+        presets (Optional[Dict[str, str]]): The prompt preset per role, if not the defaults.
+        registry (Optional[PromptRegistry]): The registry the tutor renders its prompts with;
+            defaults to the shared one.
+
+    Returns:
+        str: A short hex digest that changes whenever one of the prompts does.
+    """
+    registry = registry if registry is not None else default_registry()
+    presets = registry.presets(presets)
+    roles = ("expert",) if tier == TARGET_TIER else ("expert", "adapter", "fused")
+    return fingerprint(*(registry.render_selected(role, source_field, target_field, presets).text for role in roles))
+
+
+class PrefillStore:
+    """A SQLite-backed store of prefilled expert and adapted explanations."""
+
+    def __init__(self, path: str = ":memory:"):
+        """Initialize the store.
+
+        Args:
+            path (str): The SQLite database file, or ":memory:" for a process-local store.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL lets the app's workers read while the prefill job writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS prefill_results (
+                tier TEXT NOT NULL,
+                key TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                value TEXT NOT NULL,
+                model TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (tier, key)
+            )"""
+        )
+
+    def get(self, tier: str, key: str, version: str) -> Optional[str]:
+        """Look up an explanation produced by the current prompts.
+
+        Args:
+            tier (str): TARGET_TIER or ADAPTED_TIER.
+            key (str): The explanation cache key of the topic, built without conversation context.
+            version (str): The current prompt version of the tier (see prompt_version).
+
+        Returns:
+            Optional[str]: The explanation, or None if it is missing or stale.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM prefill_results WHERE tier = ? AND key = ? AND prompt_version = ?",
+                (tier, key, version)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, tier: str, key: str, version: str, value: str, model: str) -> None:
+        """Store an explanation, replacing any earlier version of it.
+
+        Args:
+            tier (str): TARGET_TIER or ADAPTED_TIER.
+            key (str): The explanation cache key of the topic, built without conversation context.
+            version (str): The prompt version that produced the explanation.
+            value (str): The explanation.
+            model (str): The model that wrote it.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prefill_results (tier, key, prompt_version, value, model, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tier, key, version, value, model, time.time())
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of stored explanations per tier."""
+        with self._lock:
+            sizes = dict(self._conn.execute("SELECT tier, COUNT(*) FROM prefill_results GROUP BY tier").fetchall())
+        return {tier: sizes.get(tier, 0) for tier in (TARGET_TIER, ADAPTED_TIER)}
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
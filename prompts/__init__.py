@@ -3,15 +3,35 @@
 This package contains system prompts for different components of the tutor:
 - Expert tutor prompts for generating detailed explanations
 - Field adapter prompts for translating between different areas of expertise
+- Fused tutor prompts for explaining and adapting in a single call
 - Test generator prompts for creating adaptive assessments
+- Summarizer prompts for folding old conversation turns into a running summary
+- A registry that renders every role's prompt presets once and counts their tokens
+
+Submodules are imported on first use, so importing the package stays cheap.
 """
 
-from .expert_tutor import get_expert_prompt
-from .field_adapter import get_adapter_prompt
-from .test_generator import get_test_generator_prompt
+import importlib
+
+# Submodule of every name the package exports
+_EXPORTS = {
+    'get_expert_prompt': 'expert_tutor',
+    'get_adapter_prompt': 'field_adapter',
+    'get_fused_prompt': 'fused_tutor',
+    'get_test_generator_prompt': 'test_generator',
+    'get_summary_prompt': 'summarizer',
+    'PromptRegistry': 'registry',
+    'RenderedPrompt': 'registry',
+    'default_registry': 'registry',
+    'parse_presets': 'registry'
+}
+
+__all__ = list(_EXPORTS)
+
 
-__all__ = [
-    'get_expert_prompt',
-    'get_adapter_prompt',
-    'get_test_generator_prompt'
-] 
\ No newline at end of file
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,29 @@
+"""System prompts for the fused (single-call) tutor component."""
+
+from typing import Optional
+
+from .expert_tutor import get_expert_prompt
+from .field_adapter import get_adapter_prompt
+
+def get_fused_prompt(source_field: str, target_field: str, expert: Optional[str] = None, adapter: Optional[str] = None) -> str:
+    """Generate a prompt that explains and adapts in a single call.
+    
+    Combines the expert tutor and field adapter prompts, so one completion does the
+    work of the two-stage pipeline.
+    
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+        expert (Optional[str]): The expert prompt to combine; defaults to the field expert prompt.
+        adapter (Optional[str]): The adapter prompt to combine; defaults to the field adapter prompt.
+        
+    Returns:
+        str: A system prompt for the fused tutor.
+    """
+    return f"""{expert if expert is not None else get_expert_prompt(target_field)}
+
+{adapter if adapter is not None else get_adapter_prompt(source_field, target_field)}
+
+Work in two steps internally: first work out an accurate, expert-level answer about
+{target_field}, then present it to the {source_field} professional as described above.
+Only output the final adapted explanation."""
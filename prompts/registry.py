@@ -0,0 +1,251 @@
+"""Registry of the tutor's system prompts.
+
+The prompt functions rebuild long f-strings on every call, and nothing knew how many
+tokens the results cost. The registry renders each prompt once per role, preset,
+field pair and parameters (such as the difficulty level), and keeps the text with its
+token count and a version hash:
+
+- The pipeline reads prompt sizes from the registry to set max_tokens and check the
+  model's context window, instead of tokenizing the system prompt on every call.
+- Caches keyed by the version hash miss as soon as a prompt's wording changes.
+- Every prompt module is a preset of a role, including the alternatives that used to
+  be unreachable (language_adapter, rust_tutor, python_adapter). Preset modules are
+  only imported when a prompt of theirs is first rendered.
+- The fused prompt is composed of the expert and adapter prompts in their selected
+  presets, so picking another adapter also changes the fused pipeline.
+"""
+
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+# Roles of the pipeline that take a system prompt
+PROMPT_ROLES = ("expert", "adapter", "fused", "test_generator", "summarizer")
+
+# Module and attribute of every preset per role: a prompt function, or a fixed prompt
+PROMPT_PRESETS = {
+    "expert": {
+        "field": ("expert_tutor", "get_expert_prompt"),
+        "rust": ("rust_tutor", "RUST_TUTOR_PROMPT")
+    },
+    "adapter": {
+        "field": ("field_adapter", "get_adapter_prompt"),
+        "language": ("language_adapter", "get_adapter_prompt"),
+        "python": ("python_adapter", "PYTHON_ADAPTER_PROMPT")
+    },
+    "fused": {
+        "field": ("fused_tutor", "get_fused_prompt")
+    },
+    "test_generator": {
+        "field": ("test_generator", "get_test_generator_prompt")
+    },
+    "summarizer": {
+        "field": ("summarizer", "get_summary_prompt")
+    }
+}
+
+# Preset of each role unless a tutor picks another
+DEFAULT_PRESETS = {role: "field" for role in PROMPT_ROLES}
+
+# Roles whose prompt combines the prompts of other roles, with the presets of those parts
+# passed as parameters named after them
+COMPOSED_ROLES = {"fused": ("expert", "adapter")}
+
+# Rendered prompts kept in memory; field pairs are free text, so the memo is bounded
+MAX_RENDERED_PROMPTS = 4096
+
+
+def fingerprint(*texts: str) -> str:
+    """Fingerprint one or more prompt texts.
+
+    Args:
+        *texts (str): The prompt texts, in a fixed order.
+
+    Returns:
+        str: A short hex digest that changes whenever one of the texts does.
+    """
+    return hashlib.sha256("\x1e".join(texts).encode("utf-8")).hexdigest()[:16]
+
+
+def parse_presets(spec: str) -> Dict[str, str]:
+    """Parse a preset selection such as "expert=rust,adapter=python".
+
+    Args:
+        spec (str): Comma-separated role=preset pairs; empty for the defaults.
+
+    Returns:
+        Dict[str, str]: The preset per role named in the selection.
+
+    Raises:
+        ValueError: If a pair is malformed or names an unknown role or preset.
+    """
+    presets = {}
+    for pair in filter(None, (part.strip() for part in spec.split(","))):
+        role, separator, preset = (part.strip() for part in pair.partition("="))
+        if not separator:
+            raise ValueError(f"Expected role=preset, got {pair!r}")
+        presets[role] = preset
+    _check_presets(presets)
+    return presets
+
+
+def _check_presets(presets: Dict[str, str]) -> None:
+    """Raise ValueError if a selection names an unknown role or preset."""
+    for role, preset in presets.items():
+        if role not in PROMPT_PRESETS:
+            raise ValueError(f"Unknown prompt role: {role}")
+        if preset not in PROMPT_PRESETS[role]:
+            raise ValueError(f"Unknown {role} prompt preset: {preset} (choose from {', '.join(PROMPT_PRESETS[role])})")
+
+
+class RenderedPrompt:
+    """A rendered system prompt with its token count and version hash."""
+
+    def __init__(self, role: str, preset: str, text: str, tokens: int):
+        self.role = role
+        self.preset = preset
+        self.text = text
+        self.tokens = tokens
+        self.version = fingerprint(text)
+
+
+class PromptRegistry:
+    """Renders, memoizes and counts the system prompts of every role and preset."""
+
+    def __init__(self, token_counter: Optional[Callable[[str], int]] = None, max_entries: int = MAX_RENDERED_PROMPTS):
+        """Initialize the registry.
+
+        Args:
+            token_counter (Optional[Callable[[str], int]]): Counts the tokens of a text;
+                defaults to context_window.count_tokens, imported on first use.
+            max_entries (int): The most rendered prompts kept; the least recently used go first.
+        """
+        self.max_entries = max_entries
+        self._token_counter = token_counter
+        self._templates: Dict[Tuple[str, str], object] = {}
+        self._rendered: "OrderedDict[Tuple, RenderedPrompt]" = OrderedDict()
+        self._tokens_by_text: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def presets(self, overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Get the preset of every role.
+
+        Args:
+            overrides (Optional[Dict[str, str]]): Presets per role, on top of DEFAULT_PRESETS.
+
+        Returns:
+            Dict[str, str]: The preset of each role.
+
+        Raises:
+            ValueError: If an override names an unknown role or preset.
+        """
+        _check_presets(overrides or {})
+        return {**DEFAULT_PRESETS, **(overrides or {})}
+
+    def render(self, role: str, source_field: str, target_field: str, preset: str = "field", **params) -> RenderedPrompt:
+        """Get a rendered prompt, rendering and counting it on first use.
+
+        Args:
+            role (str): One of PROMPT_ROLES.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            preset (str): One of the role's presets in PROMPT_PRESETS.
+            **params: The role's further parameters, e.g. difficulty_level and
+                num_questions for the test generator, max_words for the summarizer or
+                the expert and adapter presets of the fused prompt (see COMPOSED_ROLES).
+
+        Returns:
+            RenderedPrompt: The prompt text with its token count and version.
+
+        Raises:
+            ValueError: If the role or preset is unknown.
+        """
+        key = (role, preset, source_field, target_field, tuple(sorted(params.items())))
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+                return rendered
+        _check_presets({role: preset})
+        template = self._template(role, preset)
+        if isinstance(template, str):
+            text = template
+        elif role == "expert":
+            text = template(target_field)
+        elif role in COMPOSED_ROLES:
+            parts = {
+                part: self.render(part, source_field, target_field, params.get(part, DEFAULT_PRESETS[part])).text
+                for part in COMPOSED_ROLES[role]
+            }
+            text = template(source_field, target_field, **parts)
+        else:
+            text = template(source_field, target_field, **params)
+        rendered = RenderedPrompt(role, preset, text, self._count(text))
+        with self._lock:
+            self._rendered[key] = rendered
+            self._tokens_by_text[text] = rendered.tokens
+            while len(self._rendered) > self.max_entries:
+                evicted = self._rendered.popitem(last=False)[1]
+                self._tokens_by_text.pop(evicted.text, None)
+        return rendered
+
+    def render_selected(self, role: str, source_field: str, target_field: str, presets: Dict[str, str], **params) -> RenderedPrompt:
+        """Render a role in a preset selection, composing it from the selected presets of its parts.
+
+        Args:
+            role (str): One of PROMPT_ROLES.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            presets (Dict[str, str]): The preset of every role (see presets).
+            **params: The role's further parameters, as for render.
+
+        Returns:
+            RenderedPrompt: The prompt text with its token count and version.
+        """
+        parts = {part: presets[part] for part in COMPOSED_ROLES.get(role, ())}
+        return self.render(role, source_field, target_field, presets[role], **parts, **params)
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text, reusing the count of a rendered prompt.
+
+        Args:
+            text (str): The text to count.
+
+        Returns:
+            int: The (estimated) number of tokens.
+        """
+        with self._lock:
+            tokens = self._tokens_by_text.get(text)
+        return tokens if tokens is not None else self._count(text)
+
+    def _template(self, role: str, preset: str) -> object:
+        """Import a preset's prompt function or fixed prompt on first use."""
+        key = (role, preset)
+        template = self._templates.get(key)
+        if template is None:
+            module_name, attribute = PROMPT_PRESETS[role][preset]
+            module = importlib.import_module(f"{__package__}.{module_name}")
+            template = self._templates[key] = getattr(module, attribute)
+        return template
+
+    def _count(self, text: str) -> int:
+        """Count tokens with the configured counter."""
+        if self._token_counter is None:
+            from context_window import count_tokens
+            self._token_counter = count_tokens
+        return self._token_counter(text)
+
+
+_default_registry: Optional[PromptRegistry] = None
+_default_lock = threading.Lock()
+
+
+def default_registry() -> PromptRegistry:
+    """Get the registry shared by every tutor in the process."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = PromptRegistry()
+        return _default_registry
@@ -0,0 +1,22 @@
+"""System prompts for the conversation summarizer component."""
+
+def get_summary_prompt(source_field: str, target_field: str, max_words: int) -> str:
+    """Generate a prompt for folding old conversation turns into a running summary.
+    
+    Args:
+        source_field (str): The field the user is proficient in.
+        target_field (str): The field the user wants to learn about.
+        max_words (int): The maximum length of the summary in words.
+        
+    Returns:
+        str: A system prompt for the conversation summarizer.
+    """
+    return f"""You maintain a running summary of a tutoring conversation in which a {source_field}
+professional is learning {target_field}. You will be given the current summary and the next
+part of the conversation. Return an updated summary that:
+
+1. Lists the {target_field} concepts the learner has asked about and what was explained
+2. Notes the {source_field} analogies that were used, so they can be reused consistently
+3. Records any misunderstandings or open questions the learner still has
+
+Write compact bullet points, no more than {max_words} words in total. Return only the summary."""
@@ -1,12 +1,13 @@
 """System prompts for the test generator component."""
 
-def get_test_generator_prompt(source_field: str, target_field: str, difficulty_level: int) -> str:
+def get_test_generator_prompt(source_field: str, target_field: str, difficulty_level: int, num_questions: int = 5) -> str:
     """Generate a test generator prompt for creating adaptive tests.
     
     Args:
         source_field (str): The field the user is proficient in.
         target_field (str): The field the user wants to learn about.
         difficulty_level (int): The current difficulty level (1-5).
+        num_questions (int): The number of questions to create.
         
     Returns:
         str: A system prompt for the test generator.
@@ -20,7 +21,7 @@ def get_test_generator_prompt(source_field: str, target_field: str, difficulty_l
     }
     
     return f"""You are an expert test generator specializing in creating adaptive assessments
-for {source_field} professionals learning {target_field}. Your task is to create a set of 5
+for {source_field} professionals learning {target_field}. Your task is to create a set of {num_questions}
 multiple-choice questions that test understanding of {target_field} at difficulty level {difficulty_level},
 focusing on {difficulty_descriptions[difficulty_level]}.
 
@@ -56,7 +57,7 @@ Format your response as a JSON object with the following structure:
         ...
     ],
     "difficulty_level": {difficulty_level},
-    "total_questions": 5
+    "total_questions": {num_questions}
 }}
 
 Ensure questions are challenging but fair for the specified difficulty level,
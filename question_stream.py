@@ -0,0 +1,103 @@
+"""Incremental parsing of streamed test payloads for the Cross-Domain Learning Tutor.
+
+A generated test is one JSON object whose "questions" array arrives token by token.
+QuestionStreamParser scans the stream as it grows and hands out each question object
+as soon as its closing brace arrives, so the first question can be shown while the rest
+are still being written. Because questions are parsed one at a time, a malformed tail
+(a truncated last question, a stray closing sentence, a markdown fence) only costs the
+questions it touches instead of the whole test.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+from test_bank import validate_test
+
+# Start of the questions array in a test payload
+QUESTIONS_ARRAY = re.compile(r'"questions"\s*:\s*\[')
+
+
+class QuestionStreamParser:
+    """Extracts complete, valid question objects from a streamed test payload."""
+
+    def __init__(self):
+        self.questions: List[Dict] = []
+        self._buffer = ""
+        self._position = -1
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._done = False
+
+    def feed(self, fragment: str) -> List[Dict]:
+        """Add the next piece of the stream.
+
+        Args:
+            fragment (str): Text that arrived since the last call.
+
+        Returns:
+            List[Dict]: The questions completed by this fragment, in order.
+        """
+        self._buffer += fragment
+        if self._done:
+            return []
+        if self._position < 0:
+            match = QUESTIONS_ARRAY.search(self._buffer)
+            if match is None:
+                return []
+            self._position = match.end()
+
+        completed: List[Dict] = []
+        buffer = self._buffer
+        while self._position < len(buffer) and not self._done:
+            char = buffer[self._position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = self._position
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    question = self._parse_question(buffer[self._start:self._position + 1])
+                    if question is not None:
+                        self.questions.append(question)
+                        completed.append(question)
+            elif char == "]" and self._depth == 0:
+                self._done = True
+            self._position += 1
+        return completed
+
+    def _parse_question(self, text: str) -> Optional[Dict]:
+        """Parse one question object, or return None if it is malformed or incomplete."""
+        try:
+            question = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        if not validate_test({"questions": [question]}):
+            return None
+        return question
+
+
+def parse_questions(content: str) -> List[Dict]:
+    """Salvage every valid question from a complete, possibly malformed test payload.
+
+    Args:
+        content (str): The raw model output.
+
+    Returns:
+        List[Dict]: The valid questions, in order.
+    """
+    parser = QuestionStreamParser()
+    parser.feed(content)
+    return parser.questions
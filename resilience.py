@@ -0,0 +1,725 @@
+"""Resilience layer for the LLM calls of the Cross-Domain Learning Tutor.
+
+Tail latency dominates the learner's experience: one slow upstream response used to
+stall a request for over a minute and then surface as a generic error. This module
+bounds and trims that tail:
+
+- LatencyBudget splits an end-to-end budget into per-stage deadlines, which the tutor
+  passes to the backend as each call's timeout.
+- ResilientBackend wraps any LLMBackend. It retries transient failures with jittered
+  exponential backoff inside the deadline, hedges a call that is slower than the recent
+  p95 with one duplicate request and cancels whichever loses, and stops calling a model
+  while its CircuitBreaker is open. Hedges are capped at a small share of calls, so
+  they trim the p99 without multiplying spend. Retries are reported through the
+  call's CallStats. With a scheduler ticket, every retry and hedge is admitted and
+  charged by the scheduler like the first attempt.
+
+For streams the timeout bounds the wait for the first fragment and every stall between
+fragments, and hedging races the time to the first fragment. Synchronous completions
+are not hedged: a thread blocked in a call cannot be cancelled, so the losing
+duplicate would keep running, and billing, until its own timeout.
+"""
+
+import asyncio
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from llm_backends import CallStats, Completion, LLMBackend, TransientBackendError
+
+# Errors worth retrying after a backoff
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError, TransientBackendError)
+
+# Default end-to-end budget of one explanation, in seconds
+END_TO_END_BUDGET_S = 60.0
+
+# Share of the end-to-end budget each stage may use; the two stages of an explanation add up to all of it
+STAGE_BUDGET_SHARES = {
+    "expert": 0.5,
+    "adapter": 0.5,
+    "fused": 1.0,
+    "test_generator": 1.0,
+    "summarizer": 0.25
+}
+
+# Recent latencies kept per model to estimate the hedging delay
+LATENCY_WINDOW = 200
+
+# Latencies needed before a model's calls are hedged
+HEDGE_MIN_SAMPLES = 20
+
+# Largest share of calls that may send a hedged duplicate; hedging past the p95 uses about half of it,
+# the rest is headroom for bursts of slow calls
+MAX_HEDGE_RATIO = 0.1
+
+
+class DeadlineExceeded(TimeoutError):
+    """An LLM call or pipeline stage ran out of its time budget."""
+
+
+class CircuitOpenError(Exception):
+    """Calls to a model are paused after repeated failures."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Calls to {model} are paused after repeated failures; retrying in {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class LatencyBudget:
+    """Splits an end-to-end latency budget into per-stage deadlines."""
+
+    def __init__(self, total_s: float = END_TO_END_BUDGET_S, shares: Optional[Dict[str, float]] = None):
+        """Initialize the budget.
+
+        Args:
+            total_s (float): The end-to-end budget of one run, in seconds.
+            shares (Optional[Dict[str, float]]): Share of the budget per stage, on top of STAGE_BUDGET_SHARES.
+        """
+        self.total_s = total_s
+        self.shares = {**STAGE_BUDGET_SHARES, **(shares or {})}
+
+    def start(self) -> float:
+        """Get the deadline of a run starting now, on the time.monotonic clock."""
+        return time.monotonic() + self.total_s
+
+    def stage_timeout(self, stage: str, deadline: Optional[float] = None) -> float:
+        """Get the time a stage may take.
+
+        Args:
+            stage (str): The pipeline stage.
+            deadline (Optional[float]): The deadline of the run the stage belongs to, if any.
+
+        Returns:
+            float: Seconds: the stage's share of the budget, capped by what is left of the run.
+
+        Raises:
+            DeadlineExceeded: If the run has no time left.
+        """
+        timeout = self.total_s * self.shares.get(stage, 1.0)
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise DeadlineExceeded(f"The {stage} stage ran out of time ({self.total_s:.0f}s budget)")
+        return timeout
+
+
+class CircuitBreaker:
+    """Fails calls to a model fast after repeated failures, probing it again after a pause."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        """Initialize the breaker.
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout_s (float): Seconds before an open circuit lets one trial call through.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._trials: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        """Check that a call may go out.
+
+        Args:
+            key (str): The model being called.
+
+        Returns:
+            bool: True if the call is the trial of a half-open circuit. Its caller must
+                record its outcome, or call release_trial if it has none.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with its trial call in flight.
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return False
+            waited = time.monotonic() - opened_at
+            if waited < self.reset_timeout_s or self._trials.get(key):
+                raise CircuitOpenError(key, max(self.reset_timeout_s - waited, 1.0))
+            self._trials[key] = True
+            return True
+
+    def release_trial(self, key: str) -> None:
+        """End a trial call that proved nothing about the model, so the next call may try again.
+
+        Used when the trial failed with an error that is not the model's fault or was
+        cancelled; after record_success or record_failure it does nothing.
+        """
+        with self._lock:
+            self._trials.pop(key, None)
+
+    def record_success(self, key: str) -> None:
+        """Close the circuit of a model after a successful call."""
+        with self._lock:
+            self._failures.pop(key, None)
+            self._opened_at.pop(key, None)
+            self._trials.pop(key, None)
+
+    def record_failure(self, key: str) -> None:
+        """Count a failed call, opening the circuit at the threshold or after a failed trial."""
+        with self._lock:
+            self._failures[key] = self._failures.get(key, 0) + 1
+            if self._trials.pop(key, False) or self._failures[key] >= self.failure_threshold:
+                self._opened_at[key] = time.monotonic()
+
+    def state(self, key: str) -> str:
+        """Get the state of a model's circuit: "closed", "open" or "half_open"."""
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - opened_at < self.reset_timeout_s else "half_open"
+
+
+class LatencyTracker:
+    """Keeps recent latencies per key and estimates their p95."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES):
+        """Initialize the tracker.
+
+        Args:
+            window (int): Latencies kept per key.
+            min_samples (int): Latencies needed before a p95 is reported.
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: Tuple[str, str], seconds: float) -> None:
+        """Add a latency."""
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, key: Tuple[str, str]) -> Optional[float]:
+        """Get the p95 latency of a key, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+
+class ResilientBackend(LLMBackend):
+    """Adds deadlines, jittered retries, hedged requests and circuit breaking to a backend.
+
+    A call's deadline comes from its "timeout" option, which is also passed on to the
+    wrapped backend. Its "ticket" option is the scheduler.Ticket it was admitted with,
+    if any: each retry waits for the ticket's scheduler to admit it within the deadline,
+    and a hedge is skipped unless the scheduler can admit it at once. Those attempts keep
+    the whole token estimate of the call, since their usage is not reported.
+    """
+
+    handles_retries = True
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_retries: int = 3,
+        backoff_base_s: float = 0.5,
+        backoff_cap_s: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_ratio: float = MAX_HEDGE_RATIO,
+        min_hedge_delay_s: float = 0.5
+    ):
+        """Initialize the backend.
+
+        Args:
+            backend (LLMBackend): The backend making the actual calls.
+            max_retries (int): How many times a transient failure is retried.
+            backoff_base_s (float): The backoff before the first retry, doubled per retry.
+            backoff_cap_s (float): The longest backoff between retries.
+            breaker (Optional[CircuitBreaker]): The circuit breaker; a default one is created if omitted.
+            hedge_ratio (float): The largest share of calls that may send a hedged duplicate; 0 disables hedging.
+            min_hedge_delay_s (float): The shortest wait before hedging a call.
+        """
+        self.backend = backend
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_cap_s = backoff_cap_s
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.hedge_ratio = hedge_ratio
+        self.min_hedge_delay_s = min_hedge_delay_s
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def complete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        stats, ticket = options.pop("stats", None), options.pop("ticket", None)
+        deadline = self._deadline(options)
+        return self._retry(model, deadline, lambda: self._timed_complete(model, messages, temperature, options, deadline), stats, ticket)
+
+    def stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Iterator[str]:
+        stats, ticket = options.pop("stats", None), options.pop("ticket", None)
+        stall_s = options.get("timeout")
+        yield from self._retry(
+            model,
+            self._deadline(options),
+            lambda: self._race_stream(model, messages, temperature, options, stall_s, ticket, stats),
+            stats,
+            ticket
+        )
+
+    async def acomplete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> Completion:
+        stats, ticket = options.pop("stats", None), options.pop("ticket", None)
+        deadline = self._deadline(options)
+        return await self._aretry(
+            model,
+            deadline,
+            lambda: self._ahedged_complete(model, messages, temperature, options, deadline, ticket),
+            stats,
+            ticket
+        )
+
+    async def astream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, **options) -> AsyncIterator[str]:
+        stats, ticket = options.pop("stats", None), options.pop("ticket", None)
+        stall_s = options.get("timeout")
+        fragments = await self._aretry(
+            model,
+            self._deadline(options),
+            lambda: self._arace_stream(model, messages, temperature, options, stall_s, ticket, stats),
+            stats,
+            ticket
+        )
+        async for fragment in fragments:
+            yield fragment
+
+    def _deadline(self, options: Dict) -> Optional[float]:
+        """Turn a call's timeout option into a deadline on the time.monotonic clock."""
+        timeout = options.get("timeout")
+        return time.monotonic() + timeout if timeout is not None else None
+
+    def _retry(
+        self,
+        model: str,
+        deadline: Optional[float],
+        attempt: Callable[[], Any],
+        stats: Optional[CallStats] = None,
+        ticket: Any = None
+    ) -> Any:
+        """Run attempts behind the circuit breaker, backing off between transient failures."""
+        for number in range(self.max_retries + 1):
+            if number > 0:
+                self._admit_retry(ticket, deadline)
+            trial = self._start_attempt(model)
+            try:
+                try:
+                    result = attempt()
+                except Exception as e:
+                    delay = self._after_failure(model, number, e, deadline, stats)
+                    if delay is None:
+                        raise
+                else:
+                    self.breaker.record_success(model)
+                    return result
+            finally:
+                if trial:
+                    # A non-retryable error or a cancellation says nothing about the model
+                    self.breaker.release_trial(model)
+            time.sleep(delay)
+
+    async def _aretry(
+        self,
+        model: str,
+        deadline: Optional[float],
+        attempt: Callable[[], Awaitable[Any]],
+        stats: Optional[CallStats] = None,
+        ticket: Any = None
+    ) -> Any:
+        """Run attempts behind the circuit breaker, backing off between transient failures."""
+        for number in range(self.max_retries + 1):
+            if number > 0:
+                await self._aadmit_retry(ticket, deadline)
+            trial = self._start_attempt(model)
+            try:
+                try:
+                    result = await attempt()
+                except Exception as e:
+                    delay = self._after_failure(model, number, e, deadline, stats)
+                    if delay is None:
+                        raise
+                else:
+                    self.breaker.record_success(model)
+                    return result
+            finally:
+                if trial:
+                    # A non-retryable error or a cancellation says nothing about the model
+                    self.breaker.release_trial(model)
+            await asyncio.sleep(delay)
+
+    def _admit_retry(self, ticket: Any, deadline: Optional[float]) -> None:
+        """Wait for the scheduler of a call's ticket to admit a retry of the call.
+
+        Raises:
+            DeadlineExceeded: If the retry was not admitted before the deadline.
+            SchedulerOverloaded: If too many calls of its priority class are waiting.
+        """
+        if ticket is None or ticket.scheduler is None:
+            return
+        timeout = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+        retry = ticket.scheduler.acquire(ticket.priority, ticket.tenant, ticket.tokens, timeout)
+        ticket.scheduler.release(retry, retry.tokens)
+
+    async def _aadmit_retry(self, ticket: Any, deadline: Optional[float]) -> None:
+        """Wait without blocking the event loop for the scheduler to admit a retry. See _admit_retry."""
+        if ticket is None or ticket.scheduler is None:
+            return
+        timeout = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+        retry = await ticket.scheduler.aacquire(ticket.priority, ticket.tenant, ticket.tokens, timeout)
+        ticket.scheduler.release(retry, retry.tokens)
+
+    def _start_attempt(self, model: str) -> bool:
+        """Check the circuit breaker and count the attempt.
+
+        Returns:
+            bool: True if the attempt is the trial of a half-open circuit.
+        """
+        trial = self.breaker.allow(model)
+        with self._lock:
+            self.calls += 1
+        return trial
+
+    def _after_failure(
+        self,
+        model: str,
+        number: int,
+        error: Exception,
+        deadline: Optional[float],
+        stats: Optional[CallStats] = None
+    ) -> Optional[float]:
+        """Record a failed attempt and decide whether to retry it.
+
+        Returns:
+            Optional[float]: The backoff before the next attempt, or None to give up.
+        """
+        if isinstance(error, RETRYABLE_ERRORS + (DeadlineExceeded,)):
+            self.breaker.record_failure(model)
+        if not isinstance(error, RETRYABLE_ERRORS) or number >= self.max_retries:
+            return None
+        # Full jitter spreads out the retries of many callers failing at once
+        delay = random.uniform(0, min(self.backoff_cap_s, self.backoff_base_s * 2 ** number))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        with self._lock:
+            self.retries += 1
+        if stats is not None:
+            stats.retries += 1
+        return delay
+
+    def _hedge_delay(self, key: Tuple[str, str]) -> Optional[float]:
+        """Get how long to wait before hedging a call, or None to never hedge it."""
+        if self.hedge_ratio <= 0:
+            return None
+        p95 = self.latency.p95(key)
+        return max(p95, self.min_hedge_delay_s) if p95 is not None else None
+
+    def _take_hedge(self, ticket: Any = None) -> bool:
+        """Spend a hedge if hedges are still below their share of calls and the scheduler admits it at once."""
+        with self._lock:
+            if self.hedges >= self.hedge_ratio * self.calls:
+                return False
+        if ticket is not None and ticket.scheduler is not None:
+            hedge = ticket.scheduler.try_acquire(ticket.priority, ticket.tenant, ticket.tokens)
+            if hedge is None:
+                return False
+            ticket.scheduler.release(hedge, hedge.tokens)
+        with self._lock:
+            self.hedges += 1
+        return True
+
+    def _wait_time(self, started: float, hedge_delay: Optional[float], deadline: Optional[float]) -> Optional[float]:
+        """Get how long to wait for the next event: until the hedge is due or the deadline passes."""
+        limits = []
+        if hedge_delay is not None:
+            limits.append(started + hedge_delay)
+        if deadline is not None:
+            limits.append(deadline)
+        return max(min(limits) - time.monotonic(), 0.0) if limits else None
+
+    def _timed_complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        options: Dict,
+        deadline: Optional[float]
+    ) -> Completion:
+        """Run one attempt of a completion in the calling thread, within what is left of the deadline.
+
+        Not hedged (see the module docstring); the wrapped backend enforces the timeout.
+        """
+        started = time.monotonic()
+        if deadline is not None:
+            if deadline <= started:
+                raise DeadlineExceeded(f"{model} ran out of time before the call")
+            options = {**options, "timeout": deadline - started}
+        try:
+            completion = self.backend.complete(model, messages, temperature, **options)
+        except RETRYABLE_ERRORS as e:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded(f"{model} did not answer within {deadline - started:.1f}s") from e
+            raise
+        self._observe_winner((model, "complete"), started, False)
+        return completion
+
+    async def _ahedged_complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        options: Dict,
+        deadline: Optional[float],
+        ticket: Any = None
+    ) -> Completion:
+        """Run one attempt of a completion, hedging it once if it runs past the p95."""
+        key = (model, "complete")
+        started = time.monotonic()
+        hedge_delay = self._hedge_delay(key)
+        primary = asyncio.ensure_future(self.backend.acomplete(model, messages, temperature, **options))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self._wait_time(started, hedge_delay, deadline), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._observe_winner(key, started, task is not primary)
+                        return task.result()
+                    error = task.exception()
+                if done:
+                    continue
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded(f"{model} did not answer within {deadline - started:.1f}s")
+                if hedge_delay is not None:
+                    hedge_delay = None
+                    if self._take_hedge(ticket):
+                        pending.add(asyncio.ensure_future(self.backend.acomplete(model, messages, temperature, **options)))
+            raise error
+        finally:
+            # Cancel the loser, closing its connection
+            for task in pending:
+                task.cancel()
+
+    def _race_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        options: Dict,
+        stall_s: Optional[float],
+        ticket: Any = None,
+        stats: Optional[CallStats] = None
+    ) -> Iterator[str]:
+        """Start a stream, hedging it once if its first fragment is later than the p95.
+
+        Returns once a stream has produced its first fragment, with an iterator over the
+        winner's fragments; the loser is stopped. The winner's finish reason is copied to
+        the call's stats when it ends.
+        """
+        key = (model, "first_token")
+        started = time.monotonic()
+        hedge_delay = self._hedge_delay(key)
+        first_deadline = started + stall_s if stall_s is not None else None
+        events: "queue.Queue[Tuple[int, str, Any]]" = queue.Queue()
+        stops: List[threading.Event] = []
+
+        def launch() -> None:
+            index, stop = len(stops), threading.Event()
+            stops.append(stop)
+
+            def pump() -> None:
+                attempt_stats = CallStats()
+                fragments = self.backend.stream(model, messages, temperature, **{**options, "stats": attempt_stats})
+                try:
+                    for fragment in fragments:
+                        if stop.is_set():
+                            return
+                        events.put((index, "fragment", fragment))
+                    events.put((index, "end", attempt_stats.finish_reason))
+                except Exception as e:
+                    events.put((index, "error", e))
+                finally:
+                    close = getattr(fragments, "close", None)
+                    if close is not None:
+                        close()
+
+            threading.Thread(target=pump, daemon=True).start()
+
+        launch()
+        failed = 0
+        while True:
+            try:
+                index, kind, value = events.get(timeout=self._wait_time(started, hedge_delay, first_deadline))
+            except queue.Empty:
+                if first_deadline is not None and time.monotonic() >= first_deadline:
+                    for stop in stops:
+                        stop.set()
+                    raise DeadlineExceeded(f"{model} sent nothing within {stall_s:.1f}s")
+                hedge_delay = None
+                if self._take_hedge(ticket):
+                    launch()
+                continue
+            if kind == "error":
+                failed += 1
+                if failed == len(stops):
+                    raise value
+                continue
+            break
+
+        for other, stop in enumerate(stops):
+            if other != index:
+                stop.set()
+        self._observe_winner(key, started, index > 0)
+        return self._follow_stream(events, index, kind, value, stops[index], model, stall_s, stats)
+
+    def _follow_stream(
+        self,
+        events: "queue.Queue[Tuple[int, str, Any]]",
+        winner: int,
+        kind: str,
+        value: Any,
+        stop: threading.Event,
+        model: str,
+        stall_s: Optional[float],
+        stats: Optional[CallStats] = None
+    ) -> Iterator[str]:
+        """Yield the winning stream's fragments, failing if it stalls."""
+        try:
+            while kind != "end":
+                if kind == "error":
+                    raise value
+                if kind == "fragment":
+                    yield value
+                try:
+                    index, kind, value = events.get(timeout=stall_s)
+                except queue.Empty:
+                    raise DeadlineExceeded(f"{model} stalled for over {stall_s:.1f}s")
+                if index != winner:
+                    kind = "skip"
+            if stats is not None:
+                stats.finish_reason = value
+        finally:
+            stop.set()
+
+    async def _arace_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        options: Dict,
+        stall_s: Optional[float],
+        ticket: Any = None,
+        stats: Optional[CallStats] = None
+    ) -> AsyncIterator[str]:
+        """Start a stream, hedging it once if its first fragment is later than the p95.
+
+        Returns once a stream has produced its first fragment, with an iterator over the
+        winner's fragments; the loser is cancelled. The winner's finish reason is copied
+        to the call's stats when it ends.
+        """
+        key = (model, "first_token")
+        started = time.monotonic()
+        hedge_delay = self._hedge_delay(key)
+        first_deadline = started + stall_s if stall_s is not None else None
+        events: "asyncio.Queue[Tuple[int, str, Any]]" = asyncio.Queue()
+        pumps: List[asyncio.Task] = []
+
+        def launch() -> None:
+            index = len(pumps)
+
+            async def pump() -> None:
+                attempt_stats = CallStats()
+                try:
+                    async for fragment in self.backend.astream(model, messages, temperature, **{**options, "stats": attempt_stats}):
+                        await events.put((index, "fragment", fragment))
+                    await events.put((index, "end", attempt_stats.finish_reason))
+                except Exception as e:
+                    await events.put((index, "error", e))
+
+            pumps.append(asyncio.ensure_future(pump()))
+
+        launch()
+        failed = 0
+        try:
+            while True:
+                try:
+                    index, kind, value = await asyncio.wait_for(events.get(), self._wait_time(started, hedge_delay, first_deadline))
+                except asyncio.TimeoutError:
+                    if first_deadline is not None and time.monotonic() >= first_deadline:
+                        raise DeadlineExceeded(f"{model} sent nothing within {stall_s:.1f}s")
+                    hedge_delay = None
+                    if self._take_hedge(ticket):
+                        launch()
+                    continue
+                if kind == "error":
+                    failed += 1
+                    if failed == len(pumps):
+                        raise value
+                    continue
+                break
+        except BaseException:
+            for task in pumps:
+                task.cancel()
+            raise
+
+        for other, task in enumerate(pumps):
+            if other != index:
+                task.cancel()
+        self._observe_winner(key, started, index > 0)
+        return self._afollow_stream(events, index, kind, value, pumps[index], model, stall_s, stats)
+
+    async def _afollow_stream(
+        self,
+        events: "asyncio.Queue[Tuple[int, str, Any]]",
+        winner: int,
+        kind: str,
+        value: Any,
+        pump: asyncio.Task,
+        model: str,
+        stall_s: Optional[float],
+        stats: Optional[CallStats] = None
+    ) -> AsyncIterator[str]:
+        """Yield the winning stream's fragments, failing if it stalls."""
+        try:
+            while kind != "end":
+                if kind == "error":
+                    raise value
+                if kind == "fragment":
+                    yield value
+                try:
+                    index, kind, value = await asyncio.wait_for(events.get(), stall_s)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"{model} stalled for over {stall_s:.1f}s")
+                if index != winner:
+                    kind = "skip"
+            if stats is not None:
+                stats.finish_reason = value
+        finally:
+            pump.cancel()
+
+    def _observe_winner(self, key: Tuple[str, str], started: float, hedge_won: bool) -> None:
+        """Record the latency of a successful attempt."""
+        self.latency.observe(key, time.monotonic() - started)
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
@@ -0,0 +1,501 @@
+"""Priority-aware admission of LLM calls for the Cross-Domain Learning Tutor.
+
+Every session used to call the API as soon as it had a prompt, so a teacher generating
+tests for a whole class could use up the provider's rate limits and starve interactive
+chat, and the resulting rate-limit errors then failed everyone. The RequestScheduler
+is shared by every tutor in a process. Before each call the tutor estimates its tokens
+locally (see estimate_call_tokens), then queues the call until two token buckets can
+cover it: requests per minute and tokens per minute.
+
+- Priority classes: interactive calls go first, then test generation, then background
+  work (test bank refills and the prefill job). A lower class may only use a bucket down
+  to its reserve (PRIORITY_RESERVES), which keeps headroom for interactive calls even
+  while batch work is waiting.
+- Fairness: within a class, tenants (learners) are served round-robin, so one tenant's
+  burst cannot delay everyone else's calls.
+- Accounting: the tokens a call actually used are settled when it finishes, and the
+  estimate for its completion is refunded. A backend that retries or hedges a call
+  charges every further upstream attempt through the call's ticket: a retry waits for
+  admission like a new call, and a hedge is only sent if it can be admitted at once.
+
+A call that waits longer than its timeout raises DeadlineExceeded. A call arriving at a
+full queue raises SchedulerOverloaded at once.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import PrometheusSink
+from resilience import DeadlineExceeded
+
+# Priority classes, most urgent first
+PRIORITY_CLASSES = ("interactive", "test_generation", "background")
+
+# Priority class of each pipeline stage, unless a request_priority block says otherwise
+STAGE_PRIORITIES = {
+    "expert": "interactive",
+    "adapter": "interactive",
+    "fused": "interactive",
+    "summarizer": "interactive",
+    "test_generator": "test_generation"
+}
+
+# Share of each bucket that a class leaves unused for the classes above it
+PRIORITY_RESERVES = {
+    "interactive": 0.0,
+    "test_generation": 0.2,
+    "background": 0.5
+}
+
+# Default rate limits of the process
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 150000
+
+# Completion tokens reserved for a call without max_tokens; the unused part is refunded
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# Calls that may wait in one priority class before new ones are turned away
+MAX_QUEUE_DEPTH = 1000
+
+_priority: ContextVar[Optional[str]] = ContextVar("request_priority", default=None)
+
+
+@contextmanager
+def request_priority(priority: str) -> Iterator[None]:
+    """Run the calls made in a block under a priority class, regardless of their stage.
+
+    Tasks and copied contexts started inside the block inherit the class.
+
+    Args:
+        priority (str): One of PRIORITY_CLASSES.
+
+    Raises:
+        ValueError: If the priority class is unknown.
+    """
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class: {priority}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority(stage: str) -> str:
+    """Get the priority class of a call made by a pipeline stage.
+
+    Args:
+        stage (str): The pipeline stage.
+
+    Returns:
+        str: The class of the enclosing request_priority block, else the stage's class.
+    """
+    return _priority.get() or STAGE_PRIORITIES.get(stage, "interactive")
+
+
+def estimate_call_tokens(prompt_tokens: int, max_tokens: Optional[int] = None) -> int:
+    """Estimate the tokens a call will use, without calling the API.
+
+    Args:
+        prompt_tokens (int): The tokens of the call's messages, counted locally.
+        max_tokens (Optional[int]): The call's completion limit, if it sets one.
+
+    Returns:
+        int: The prompt tokens plus the completion tokens reserved for the call.
+    """
+    return prompt_tokens + (max_tokens if max_tokens is not None else DEFAULT_COMPLETION_TOKENS)
+
+
+class SchedulerOverloaded(Exception):
+    """A priority class already has as many calls waiting as it may queue."""
+
+    def __init__(self, priority: str, retry_after: float):
+        super().__init__(f"Too many {priority} requests are waiting; retry in {retry_after:.0f}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """A bucket refilling at a steady rate per minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        """Initialize a full bucket.
+
+        Args:
+            per_minute (float): The refill rate, and the capacity.
+
+        Raises:
+            ValueError: If the rate is not positive.
+        """
+        if per_minute <= 0:
+            raise ValueError("A token bucket needs a positive rate")
+        self.capacity = float(per_minute)
+        self.rate_per_s = per_minute / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add what has been earned since the last refill."""
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Get how long until an amount can be taken while leaving a reserve.
+
+        An amount larger than the usable part of the bucket only waits for a full bucket
+        and overdraws it; the debt delays the calls after it.
+
+        Args:
+            amount (float): The amount to take.
+            reserve (float): The share of the capacity that has to stay in the bucket.
+
+        Returns:
+            float: Seconds to wait; 0 if the amount can be taken now.
+        """
+        floor = reserve * self.capacity
+        needed = min(amount, self.capacity - floor) + floor - self.level
+        return max(0.0, needed / self.rate_per_s)
+
+    def adjust(self, amount: float) -> None:
+        """Take (negative) or give back (positive) an amount."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    """An admitted call, to be handed back to RequestScheduler.release when it finishes."""
+
+    def __init__(self, priority: str, tenant: str, tokens: int, wait_s: float, scheduler: Optional["RequestScheduler"] = None):
+        self.priority = priority
+        self.tenant = tenant
+        self.tokens = tokens
+        self.wait_s = wait_s
+        # The scheduler that admitted the call, for admitting its retries and hedges
+        self.scheduler = scheduler
+        self.released = False
+
+
+class _Waiter:
+    """A queued call, woken through a threading.Event or a future of its event loop."""
+
+    def __init__(self, priority: str, tenant: str, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.tenant = tenant
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self) -> None:
+        """Wake the waiting thread or task."""
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RequestScheduler:
+    """Admits LLM calls by priority class and tenant within requests and tokens per minute.
+
+    One scheduler serves both threads (acquire) and event loops (aacquire).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: Optional[float] = DEFAULT_TOKENS_PER_MINUTE,
+        reserves: Optional[Dict[str, float]] = None,
+        max_queue_depth: int = MAX_QUEUE_DEPTH,
+        metrics: Optional[PrometheusSink] = None
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            requests_per_minute (Optional[float]): The request rate limit; None or 0 for no limit.
+            tokens_per_minute (Optional[float]): The token rate limit; None or 0 for no limit.
+            reserves (Optional[Dict[str, float]]): Reserve per class, on top of PRIORITY_RESERVES.
+            max_queue_depth (int): The most calls that may wait in one class.
+            metrics (Optional[PrometheusSink]): Receives the queue depth of every class.
+
+        Raises:
+            ValueError: If a reserve is not in [0, 1).
+        """
+        self.reserves = {**PRIORITY_RESERVES, **(reserves or {})}
+        for priority, reserve in self.reserves.items():
+            if not 0 <= reserve < 1:
+                raise ValueError(f"The reserve of {priority} must be in [0, 1)")
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_queue_depth = max_queue_depth
+        self.metrics = metrics
+        # Waiting calls per class, in round-robin order of their tenants
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {priority: OrderedDict() for priority in PRIORITY_CLASSES}
+        self._depths = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._admitted = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._rejected = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._waited_s = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: str, tenant: str, tokens: int, timeout: Optional[float] = None) -> Ticket:
+        """Block until a call may be sent.
+
+        Args:
+            priority (str): One of PRIORITY_CLASSES.
+            tenant (str): Who the call is made for; tenants of a class take turns.
+            tokens (int): The estimated tokens of the call (see estimate_call_tokens).
+            timeout (Optional[float]): The longest wait in seconds; no limit if None.
+
+        Returns:
+            Ticket: The admission, to be released when the call finishes.
+
+        Raises:
+            SchedulerOverloaded: If the class's queue is full.
+            DeadlineExceeded: If the call was not admitted within the timeout.
+        """
+        waiter = self._enqueue(_Waiter(priority, tenant, tokens))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            delay = self._poll(waiter, deadline)
+            if delay is None:
+                return self._ticket(waiter)
+            waiter.event.wait(delay)
+            waiter.event.clear()
+
+    async def aacquire(self, priority: str, tenant: str, tokens: int, timeout: Optional[float] = None) -> Ticket:
+        """Wait without blocking the event loop until a call may be sent.
+
+        Args:
+            priority (str): One of PRIORITY_CLASSES.
+            tenant (str): Who the call is made for; tenants of a class take turns.
+            tokens (int): The estimated tokens of the call (see estimate_call_tokens).
+            timeout (Optional[float]): The longest wait in seconds; no limit if None.
+
+        Returns:
+            Ticket: The admission, to be released when the call finishes.
+
+        Raises:
+            SchedulerOverloaded: If the class's queue is full.
+            DeadlineExceeded: If the call was not admitted within the timeout.
+        """
+        waiter = self._enqueue(_Waiter(priority, tenant, tokens, asyncio.get_running_loop()))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                delay = self._poll(waiter, deadline)
+                if delay is None:
+                    return self._ticket(waiter)
+                await asyncio.wait({waiter.future}, timeout=delay)
+                if waiter.future.done():
+                    waiter.future = waiter.loop.create_future()
+        except asyncio.CancelledError:
+            # Give back a slot granted to a task that no longer wants it
+            with self._lock:
+                if waiter.granted:
+                    self._settle(waiter.tokens, 0)
+                else:
+                    self._remove(waiter)
+                woken = self._dispatch()[1]
+            for other in woken:
+                other.wake()
+            raise
+
+    def try_acquire(self, priority: str, tenant: str, tokens: int) -> Optional[Ticket]:
+        """Admit a call only if it can be sent at once, for optional calls such as hedges.
+
+        Args:
+            priority (str): One of PRIORITY_CLASSES.
+            tenant (str): Who the call is made for.
+            tokens (int): The estimated tokens of the call (see estimate_call_tokens).
+
+        Returns:
+            Optional[Ticket]: The admission, or None if the call would have to wait, including
+                behind calls already queued in its class or a more urgent one.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        waiter = _Waiter(priority, tenant, tokens)
+        with self._lock:
+            woken = self._dispatch()[1]
+            ahead = any(self._queues[other] for other in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+            if not ahead and self._wait_time(waiter) <= 0:
+                self._settle(0, tokens, requests=1)
+                waiter.granted = True
+                self._admitted[priority] += 1
+        for other in woken:
+            other.wake()
+        return self._ticket(waiter) if waiter.granted else None
+
+    def release(self, ticket: Ticket, used_tokens: int) -> None:
+        """Settle a finished call's tokens.
+
+        Args:
+            ticket (Ticket): The call's admission.
+            used_tokens (int): The prompt and completion tokens the call actually used.
+        """
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._settle(ticket.tokens, used_tokens)
+            woken = self._dispatch()[1]
+        for waiter in woken:
+            waiter.wake()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the queue counters of every priority class.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Per class, "queued" (waiting now), "admitted",
+                "rejected" (queue full or timed out) and "mean_wait_s" of admitted calls.
+        """
+        with self._lock:
+            return {
+                priority: {
+                    "queued": self._depths[priority],
+                    "admitted": self._admitted[priority],
+                    "rejected": self._rejected[priority],
+                    "mean_wait_s": self._waited_s[priority] / self._admitted[priority] if self._admitted[priority] else 0.0
+                }
+                for priority in PRIORITY_CLASSES
+            }
+
+    def _enqueue(self, waiter: _Waiter) -> _Waiter:
+        """Queue a call and admit whatever fits now."""
+        if waiter.priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {waiter.priority}")
+        with self._lock:
+            if self._depths[waiter.priority] >= self.max_queue_depth:
+                self._rejected[waiter.priority] += 1
+                raise SchedulerOverloaded(waiter.priority, max(1.0, self._wait_time(waiter)))
+            self._queues[waiter.priority].setdefault(waiter.tenant, deque()).append(waiter)
+            self._depths[waiter.priority] += 1
+            self._publish_depth(waiter.priority)
+            woken = self._dispatch()[1]
+        for other in woken:
+            if other is not waiter:
+                other.wake()
+        return waiter
+
+    def _poll(self, waiter: _Waiter, deadline: Optional[float]) -> Optional[float]:
+        """Admit what fits and decide how long a waiter sleeps before checking again.
+
+        Returns:
+            Optional[float]: None once the waiter is admitted, else seconds to sleep.
+
+        Raises:
+            DeadlineExceeded: If the deadline passed before the waiter was admitted.
+        """
+        with self._lock:
+            delay, woken = self._dispatch()
+            if not waiter.granted and deadline is not None and time.monotonic() >= deadline:
+                self._remove(waiter)
+                self._rejected[waiter.priority] += 1
+                waited = time.monotonic() - waiter.enqueued_at
+                woken += self._dispatch()[1]
+            else:
+                waited = None
+        for other in woken:
+            if other is not waiter:
+                other.wake()
+        if waited is not None:
+            raise DeadlineExceeded(f"Waited {waited:.1f}s for {waiter.priority} rate limit capacity")
+        if waiter.granted:
+            return None
+        if deadline is not None:
+            # Wake up at the deadline to give up, if the call is not admitted before
+            delay = min(delay, max(deadline - time.monotonic(), 0.0))
+        return delay
+
+    def _dispatch(self) -> Tuple[Optional[float], List[_Waiter]]:
+        """Admit queued calls in priority and tenant order while the buckets cover them.
+
+        Must be called with the lock held. A class waits while a more urgent class has a
+        call that does not fit yet.
+
+        Returns:
+            Tuple[Optional[float], List[_Waiter]]: Seconds until the next queued call fits
+                (None if nothing is queued), and the waiters admitted now.
+        """
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.refill(now)
+        admitted: List[_Waiter] = []
+        while True:
+            head = self._head()
+            if head is None:
+                return None, admitted
+            delay = self._wait_time(head)
+            if delay > 0:
+                return delay, admitted
+            self._pop(head)
+            self._settle(0, head.tokens, requests=1)
+            head.granted = True
+            self._admitted[head.priority] += 1
+            self._waited_s[head.priority] += now - head.enqueued_at
+            admitted.append(head)
+
+    def _head(self) -> Optional[_Waiter]:
+        """Get the next call to admit: the first tenant's oldest call in the most urgent class."""
+        for priority in PRIORITY_CLASSES:
+            tenants = self._queues[priority]
+            if tenants:
+                return next(iter(tenants.values()))[0]
+        return None
+
+    def _pop(self, waiter: _Waiter) -> None:
+        """Take the head call off its queue and move its tenant to the back of the turn order."""
+        tenants = self._queues[waiter.priority]
+        calls = tenants.pop(waiter.tenant)
+        calls.popleft()
+        if calls:
+            tenants[waiter.tenant] = calls
+        self._depths[waiter.priority] -= 1
+        self._publish_depth(waiter.priority)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Take a call that gave up off its queue."""
+        calls = self._queues[waiter.priority].get(waiter.tenant)
+        if calls is None or waiter not in calls:
+            return
+        calls.remove(waiter)
+        if not calls:
+            del self._queues[waiter.priority][waiter.tenant]
+        self._depths[waiter.priority] -= 1
+        self._publish_depth(waiter.priority)
+
+    def _wait_time(self, waiter: _Waiter) -> float:
+        """Get how long until both buckets cover a call while leaving its class's reserve."""
+        reserve = self.reserves[waiter.priority]
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.wait_time(1, reserve))
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(waiter.tokens, reserve))
+        return max(waits)
+
+    def _settle(self, reserved_tokens: int, used_tokens: int, requests: int = 0) -> None:
+        """Charge the buckets the difference between the tokens used and reserved."""
+        if self.requests is not None and requests:
+            self.requests.adjust(-requests)
+        if self.tokens is not None:
+            self.tokens.adjust(reserved_tokens - used_tokens)
+
+    def _ticket(self, waiter: _Waiter) -> Ticket:
+        """Turn an admitted waiter into its ticket."""
+        return Ticket(waiter.priority, waiter.tenant, waiter.tokens, time.monotonic() - waiter.enqueued_at, self)
+
+    def _publish_depth(self, priority: str) -> None:
+        """Report a class's queue depth to the metrics sink. Must be called with the lock held."""
+        if self.metrics is not None:
+            self.metrics.observe_queue_depth(priority, self._depths[priority])
@@ -0,0 +1,499 @@
+"""Semantic near-duplicate cache for the Cross-Domain Learning Tutor.
+
+Learners phrase the same question in many ways, so exact-match caching misses most
+repeats. This module embeds queries locally with a hashed character n-gram vectorizer
+and searches a per field pair matrix index for a stored explanation that is close
+enough to reuse. Character n-grams barely notice a negation or an antonym ("mutable"
+vs "immutable"), so a close match must also agree with the question on negations and
+share most of its content words.
+
+Entries are scoped per field pair and prompt version, so answers written under an old
+prompt are never served once it changes. Each scope's entries can be kept in an
+append-only JSONL log. Every process keeps its own index in memory: it loads the log
+when it opens the scope and then reads whatever other workers appended since, so
+inserts cost one appended line and workers never overwrite each other's slots. Each
+record carries its query's sparse vector and content words, so a cold start loads the
+index without embedding anything again. The log is compacted once it holds many more
+records than the index has slots. Appends and compaction take the log's file lock, so
+no worker's records are lost.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: logs are never compacted, since other workers cannot be locked out
+    fcntl = None
+
+import numpy as np
+
+from explanation_cache import normalize_query
+
+# Filler words that carry no meaning for matching questions against each other
+QUESTION_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "can", "could", "do", "does", "explain", "for", "how",
+    "i", "in", "is", "me", "of", "please", "tell", "the", "to", "what", "whats",
+    "why", "would", "you"
+})
+
+# Default cosine similarity from which a stored question may be reused
+DEFAULT_THRESHOLD = 0.85
+
+# Words that negate a question; a match must contain the same ones
+NEGATIONS = frozenset({"cannot", "never", "no", "non", "nor", "not", "without"})
+
+# Prefixes that turn a word into its opposite, e.g. mutable and immutable, sync and async
+NEGATING_PREFIXES = frozenset({"a", "an", "anti", "de", "dis", "il", "im", "in", "ir", "non", "un"})
+
+# Shortest common prefix for two words to count as forms of the same word (borrow, borrowing)
+MIN_STEM_CHARS = 5
+
+# Share of the content words two questions must have in common to match
+MIN_TERM_OVERLAP = 0.5
+
+# Closest stored questions checked for content-word agreement before a lookup misses
+MATCH_CANDIDATES = 5
+
+# A log holding this many times more records than its index has slots is compacted
+COMPACT_FACTOR = 2
+
+# Decimal places kept of the vector components stored in a log
+VECTOR_DECIMALS = 6
+
+
+def question_terms(text: str, ignore: Tuple[str, ...] = ()) -> FrozenSet[str]:
+    """Get the content words of a question, with contracted negations spelled out.
+
+    Args:
+        text (str): The question.
+        ignore (Tuple[str, ...]): Extra words to drop, such as the field names.
+
+    Returns:
+        FrozenSet[str]: The words that are neither stopwords nor ignored.
+    """
+    text = re.sub(r"\bcan['’]t\b", "can not", normalize_query(text))
+    text = re.sub(r"\bwon['’]t\b", "will not", text)
+    text = re.sub(r"n['’]t\b", " not", text)
+    ignored = QUESTION_STOPWORDS.union(word.lower() for word in ignore)
+    return frozenset(word for word in re.findall(r"\w+", text) if word not in ignored)
+
+
+def _same_word(a: str, b: str) -> bool:
+    """Check whether two words are the same or forms of the same word."""
+    stem = min(len(a), len(b), MIN_STEM_CHARS)
+    return a == b or (stem == MIN_STEM_CHARS and a[:stem] == b[:stem])
+
+
+def _opposites(a: str, b: str) -> bool:
+    """Check whether one word is the other with a negating prefix."""
+    longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+    return longer.endswith(shorter) and longer[:-len(shorter)] in NEGATING_PREFIXES
+
+
+def terms_agree(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    """Check whether two questions can share an answer, judging by their content words.
+
+    They must contain the same negations, must not differ by a word and its opposite,
+    and must have at least MIN_TERM_OVERLAP of their words in common.
+
+    Args:
+        a (FrozenSet[str]): The content words of one question (see question_terms).
+        b (FrozenSet[str]): The content words of the other.
+
+    Returns:
+        bool: True if the questions agree.
+    """
+    if a & NEGATIONS != b & NEGATIONS:
+        return False
+    if any(_opposites(x, y) for x in a - b for y in b - a):
+        return False
+    if not a or not b:
+        return a == b
+    shared = sum(any(_same_word(x, y) for y in b) for x in a) + sum(any(_same_word(y, x) for x in a) for y in b)
+    return shared / (len(a) + len(b)) >= MIN_TERM_OVERLAP
+
+
+class HashedNgramEmbedder:
+    """Embed text as a signed, hashed bag of character n-grams and words."""
+
+    def __init__(self, dim: int = 1024, ngram_range: Tuple[int, int] = (3, 5)):
+        """Initialize the embedder.
+
+        Args:
+            dim (int): The embedding dimension (number of hash buckets).
+            ngram_range (Tuple[int, int]): The smallest and largest character n-gram sizes.
+        """
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def features(self, text: str, ignore: Tuple[str, ...] = ()) -> List[str]:
+        """Extract the word and character n-gram features of a text.
+
+        Args:
+            text (str): The text to featurize.
+            ignore (Tuple[str, ...]): Extra words to drop, such as the field names.
+
+        Returns:
+            List[str]: The extracted features.
+        """
+        ignored = QUESTION_STOPWORDS.union(word.lower() for word in ignore)
+        words = [word for word in re.findall(r"\w+", normalize_query(text)) if word not in ignored]
+        features = [f"w:{word}" for word in words]
+        low, high = self.ngram_range
+        for word in words:
+            padded = f" {word} "
+            for size in range(low, high + 1):
+                features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+        return features
+
+    def embed(self, text: str, ignore: Tuple[str, ...] = ()) -> np.ndarray:
+        """Embed a text as a unit-length vector.
+
+        Args:
+            text (str): The text to embed.
+            ignore (Tuple[str, ...]): Extra words to drop, such as the field names.
+
+        Returns:
+            np.ndarray: A float32 vector of length dim (all zeros for an empty text).
+        """
+        features = self.features(text, ignore)
+        if not features:
+            return np.zeros(self.dim, dtype=np.float32)
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+def encode_vector(vector: np.ndarray) -> Dict:
+    """Encode the non-zero components of a vector for a log record.
+
+    Args:
+        vector (np.ndarray): The vector, e.g. an output of HashedNgramEmbedder.embed.
+
+    Returns:
+        Dict: Its dimension with the indices and values of its non-zero components.
+    """
+    indices = np.flatnonzero(vector)
+    return {"dim": len(vector), "indices": indices.tolist(), "values": [round(float(value), VECTOR_DECIMALS) for value in vector[indices]]}
+
+
+def decode_vector(data: Optional[Dict], dim: int) -> Optional[np.ndarray]:
+    """Decode a vector written by encode_vector.
+
+    Args:
+        data (Optional[Dict]): The encoded vector.
+        dim (int): The dimension the index expects.
+
+    Returns:
+        Optional[np.ndarray]: The float32 vector, or None if it is missing or of another dimension.
+    """
+    if not isinstance(data, dict) or data.get("dim") != dim:
+        return None
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[np.asarray(data["indices"], dtype=np.int64)] = data["values"]
+    return vector
+
+
+def put_record(entry: Dict, vector: np.ndarray) -> Dict:
+    """Build the log record of a stored entry.
+
+    Args:
+        entry (Dict): The entry, with its query, response, content words and last use.
+        vector (np.ndarray): The query's vector.
+
+    Returns:
+        Dict: The record, with the vector and content words so loading it embeds nothing.
+    """
+    return {
+        "op": "put",
+        "query": entry["query"],
+        "response": entry["response"],
+        "at": entry["last_used"],
+        "terms": sorted(entry["terms"]),
+        "vector": encode_vector(vector)
+    }
+
+
+class _ScopeIndex:
+    """The vector index and stored explanations for one field pair and prompt version."""
+
+    def __init__(
+        self,
+        capacity: int,
+        dim: int,
+        log_path: Optional[str] = None,
+        embed: Optional[Callable[[str], Tuple[np.ndarray, FrozenSet[str]]]] = None
+    ):
+        """Initialize an empty index.
+
+        Args:
+            capacity (int): The number of slots.
+            dim (int): The vector dimension.
+            log_path (Optional[str]): The JSONL log shared by workers, or None.
+            embed (Optional[Callable[[str], Tuple[np.ndarray, FrozenSet[str]]]]): Embeds a query
+                and gets its content words, for log records written without them.
+        """
+        self.log_path = log_path
+        self.embed = embed
+        self.entries: List[Optional[Dict]] = [None] * capacity
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        # The log as last read, kept open so a compacted log can never reuse its inode
+        self._file: Optional[BinaryIO] = None
+        self._offset = 0
+        self._records = 0
+
+    def search(self, vector: np.ndarray, limit: int = 1) -> List[Tuple[int, float]]:
+        """Find the most similar stored queries.
+
+        Returns:
+            List[Tuple[int, float]]: Up to limit (slot index, cosine similarity) pairs, best first.
+        """
+        occupied = np.fromiter((entry is not None for entry in self.entries), dtype=bool, count=len(self.entries))
+        if not occupied.any():
+            return []
+        scores = self.vectors @ vector
+        scores[~occupied] = -np.inf
+        slots = np.argsort(-scores)[:min(limit, int(occupied.sum()))]
+        return [(int(slot), float(scores[slot])) for slot in slots]
+
+    def put(self, vector: np.ndarray, entry: Dict) -> None:
+        """Store an entry, replacing the same query or the least recently used one."""
+        best = self.search(vector)
+        if best and best[0][1] >= 0.999:
+            slot = best[0][0]
+        else:
+            slot = self.free_slot()
+        self.vectors[slot] = vector
+        self.entries[slot] = entry
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self.entries = [None] * len(self.entries)
+        self.vectors[:] = 0
+
+    def free_slot(self) -> int:
+        """Get an empty slot, evicting the least recently used entry if the index is full."""
+        for slot, entry in enumerate(self.entries):
+            if entry is None:
+                return slot
+        return min(range(len(self.entries)), key=lambda slot: self.entries[slot]["last_used"])
+
+    def sync(self) -> None:
+        """Apply the records other processes appended to the log since the last sync."""
+        if self.log_path is None:
+            return
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if self._file is None or os.fstat(self._file.fileno()).st_ino != stat.st_ino:
+            # First read, or the log was compacted: rebuild from the start
+            self._reopen()
+            self.clear()
+            self._offset, self._records = 0, 0
+        if os.fstat(self._file.fileno()).st_size > self._offset:
+            self._file.seek(self._offset)
+            for line in self._file:
+                if not line.endswith(b"\n"):
+                    # A line still being written is read on the next sync
+                    break
+                self._offset += len(line)
+                self._records += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("op") == "clear":
+                    self.clear()
+                elif record.get("op") == "put":
+                    vector = decode_vector(record.get("vector"), self.vectors.shape[1])
+                    if vector is None or "terms" not in record:
+                        vector, terms = self.embed(record["query"])
+                    else:
+                        terms = frozenset(record["terms"])
+                    self.put(vector, {"query": record["query"], "response": record["response"], "terms": terms, "last_used": record["at"]})
+
+    def append(self, record: Dict) -> None:
+        """Append a record to the log, compacting the log once it has grown too long."""
+        if self.log_path is None:
+            return
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._locked(), open(self.log_path, "ab") as f:
+            # One write per record, so appends never interleave even without the lock
+            f.write(line)
+            end = f.tell()
+            same_log = self._file is not None and os.fstat(f.fileno()).st_ino == os.fstat(self._file.fileno()).st_ino
+        if fcntl is not None and same_log and end == self._offset + len(line):
+            # Nobody else appended in between: skip our own record on the next sync
+            self._offset, self._records = end, self._records + 1
+        if self._records > COMPACT_FACTOR * len(self.entries):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the log with one record per stored entry.
+
+        Other workers' appends wait for the lock, and whatever they appended before it
+        is synced first, so no record is lost.
+        """
+        if fcntl is None:
+            return
+        with self._locked():
+            self.sync()
+            temp_path = f"{self.log_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                for slot, entry in enumerate(self.entries):
+                    if entry is not None:
+                        f.write((json.dumps(put_record(entry, self.vectors[slot]), ensure_ascii=False) + "\n").encode("utf-8"))
+                size = f.tell()
+            os.replace(temp_path, self.log_path)
+            self._reopen()
+            self._offset, self._records = size, sum(entry is not None for entry in self.entries)
+
+    def _reopen(self) -> None:
+        """Open the current log for reading, closing the one read so far."""
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.log_path, "rb")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the log's lock file, so the offset of an append is known and compaction sees every append."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.log_path}.lock", "ab") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SemanticCache:
+    """A near-duplicate query cache scoped per (source_field, target_field, version)."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_entries: int = 2000,
+        directory: Optional[str] = None,
+        embedder: Optional[HashedNgramEmbedder] = None
+    ):
+        """Initialize the semantic cache.
+
+        Args:
+            threshold (float): The minimum cosine similarity for a query to count as a match.
+            max_entries (int): The maximum number of stored queries per field pair.
+            directory (Optional[str]): Where to keep the entry logs shared by workers, or None to stay in memory.
+            embedder (Optional[HashedNgramEmbedder]): The query embedder.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.directory = directory
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.hits = 0
+        self.misses = 0
+        self._scopes: Dict[Tuple[str, str, str], _ScopeIndex] = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def lookup(self, source_field: str, target_field: str, query: str, version: str = "") -> Optional[str]:
+        """Find a stored explanation for a sufficiently similar query.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            query (str): The user's question.
+            version (str): The version of the prompts that produce the explanations.
+
+        Returns:
+            Optional[str]: The stored adapted explanation, or None if nothing is close enough.
+        """
+        vector, terms = self._embed(source_field, target_field, query)
+        with self._lock:
+            index = self._scope(source_field, target_field, version)
+            index.sync()
+            for slot, score in index.search(vector, MATCH_CANDIDATES):
+                if score < self.threshold:
+                    break
+                if terms_agree(terms, index.entries[slot]["terms"]):
+                    index.entries[slot]["last_used"] = time.time()
+                    self.hits += 1
+                    return index.entries[slot]["response"]
+            self.misses += 1
+            return None
+
+    def insert(self, source_field: str, target_field: str, query: str, response: str, version: str = "") -> None:
+        """Store an adapted explanation for a query.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            query (str): The user's question.
+            response (str): The adapted explanation.
+            version (str): The version of the prompts that produced it.
+        """
+        vector, terms = self._embed(source_field, target_field, query)
+        if not vector.any():
+            return
+        with self._lock:
+            index = self._scope(source_field, target_field, version)
+            index.sync()
+            entry = {"query": query, "response": response, "terms": terms, "last_used": time.time()}
+            index.put(vector, entry)
+            index.append(put_record(entry, vector))
+
+    def evict(self, source_field: str, target_field: str, version: str = "") -> None:
+        """Drop every stored explanation for a field pair and prompt version.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            version (str): The version of the prompts that produced the explanations.
+        """
+        with self._lock:
+            index = self._scope(source_field, target_field, version)
+            index.clear()
+            index.append({"op": "clear"})
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit, miss and size counters.
+
+        Returns:
+            Dict[str, int]: The counters for this process.
+        """
+        with self._lock:
+            size = sum(entry is not None for index in self._scopes.values() for entry in index.entries)
+            return {"hits": self.hits, "misses": self.misses, "size": size, "scopes": len(self._scopes)}
+
+    def _embed(self, source_field: str, target_field: str, query: str) -> Tuple[np.ndarray, FrozenSet[str]]:
+        """Embed a query of a field pair and get its content words."""
+        ignore = (source_field, target_field)
+        return self.embedder.embed(query, ignore=ignore), question_terms(query, ignore)
+
+    def _scope(self, source_field: str, target_field: str, version: str) -> _ScopeIndex:
+        """Get or open the index for a field pair and prompt version. Must be called with the lock held."""
+        scope = (source_field.strip().lower(), target_field.strip().lower(), version)
+        if scope not in self._scopes:
+            log_path = None
+            if self.directory:
+                name = hashlib.sha1("\x1f".join(scope).encode("utf-8")).hexdigest()[:16]
+                log_path = os.path.join(self.directory, f"{name}.jsonl")
+            self._scopes[scope] = _ScopeIndex(
+                self.max_entries,
+                self.embedder.dim,
+                log_path,
+                lambda stored: self._embed(source_field, target_field, stored)
+            )
+        return self._scopes[scope]
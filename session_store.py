@@ -0,0 +1,352 @@
+"""Durable session store for the Cross-Domain Learning Tutor.
+
+Conversation and test histories used to live in Python lists on each tutor (and again
+in the Streamlit session state), growing without bound and vanishing on restart or
+when a request reached another worker. The session store keeps them in SQLite instead:
+each learner's field pair has a small state row (difficulty level, rolling summary and
+the size of the live context window), an append-only turn log and a log of tests
+stored as compressed compact JSON. Tutors load only the recent window they need, and
+retention is bounded per session and by idle age: the app and the API server call
+start_purging, which removes idle sessions at startup and then every hour.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Seconds between two purges of idle sessions
+PURGE_INTERVAL_S = 3600.0
+
+
+def encode_test(test_data: Dict) -> bytes:
+    """Encode a test compactly for storage.
+
+    Args:
+        test_data (Dict): The test data.
+
+    Returns:
+        bytes: zlib-compressed JSON without insignificant whitespace.
+    """
+    return zlib.compress(json.dumps(test_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_test(payload: bytes) -> Dict:
+    """Decode a stored test.
+
+    Args:
+        payload (bytes): The output of encode_test.
+
+    Returns:
+        Dict: The test data.
+    """
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class SessionStore:
+    """SQLite-backed per-learner conversation, test and difficulty state."""
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_turns: int = 200,
+        max_tests: int = 50,
+        ttl_seconds: Optional[float] = 90 * 24 * 3600
+    ):
+        """Initialize the store.
+
+        Args:
+            path (str): The SQLite database file, or ":memory:" for a process-local store.
+            max_turns (int): The maximum number of conversation turns kept per session.
+            max_tests (int): The maximum number of tests kept per session.
+            ttl_seconds (Optional[float]): How long an idle session is kept, or None to keep it forever.
+        """
+        self.path = path
+        self.max_turns = max_turns
+        self.max_tests = max_tests
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stop_purging = threading.Event()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL lets several worker processes read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                learner_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                current_difficulty INTEGER NOT NULL DEFAULT 1,
+                summary TEXT NOT NULL DEFAULT '',
+                window_turns INTEGER NOT NULL DEFAULT 0,
+                revision INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (learner_id, scope)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                learner_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_by_session ON turns (learner_id, scope, id)")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS tests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                learner_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                payload BLOB NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tests_by_session ON tests (learner_id, scope, id)")
+
+    def load(self, learner_id: str, source_field: str, target_field: str) -> Optional[Dict]:
+        """Load a session's state.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+
+        Returns:
+            Optional[Dict]: The "current_difficulty", "summary", "window_turns" and
+                "revision" of the session, or None if it is not stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT current_difficulty, summary, window_turns, revision FROM sessions WHERE learner_id = ? AND scope = ?",
+                (learner_id, self._scope(source_field, target_field))
+            ).fetchone()
+        if row is None:
+            return None
+        return {"current_difficulty": row[0], "summary": row[1], "window_turns": row[2], "revision": row[3]}
+
+    def save(self, learner_id: str, source_field: str, target_field: str, **state) -> int:
+        """Update fields of a session's state, creating the session if needed.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            **state: New values for "current_difficulty", "summary" or "window_turns".
+
+        Returns:
+            int: The session's new revision.
+        """
+        with self._transaction():
+            return self._save(learner_id, self._scope(source_field, target_field), state)
+
+    def append_turns(
+        self,
+        learner_id: str,
+        source_field: str,
+        target_field: str,
+        turns: List[Dict[str, str]],
+        **state
+    ) -> int:
+        """Append conversation turns and update the session state in one transaction.
+
+        Turns beyond the retention bound are deleted, oldest first.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            turns (List[Dict[str, str]]): The new turns, oldest first.
+            **state: New values for "current_difficulty", "summary" or "window_turns".
+
+        Returns:
+            int: The session's new revision.
+        """
+        scope = self._scope(source_field, target_field)
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT INTO turns (learner_id, scope, role, content) VALUES (?, ?, ?, ?)",
+                [(learner_id, scope, turn["role"], turn["content"]) for turn in turns]
+            )
+            self._trim("turns", learner_id, scope, self.max_turns)
+            return self._save(learner_id, scope, state)
+
+    def recent_turns(
+        self,
+        learner_id: str,
+        source_field: str,
+        target_field: str,
+        limit: int,
+        offset: int = 0
+    ) -> List[Dict[str, str]]:
+        """Load the most recent conversation turns.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            limit (int): The maximum number of turns.
+            offset (int): How many of the most recent turns to skip, for paging back.
+
+        Returns:
+            List[Dict[str, str]]: The turns, oldest first.
+        """
+        if limit <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM turns WHERE learner_id = ? AND scope = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (learner_id, self._scope(source_field, target_field), limit, max(offset, 0))
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def turn_count(self, learner_id: str, source_field: str, target_field: str) -> int:
+        """Count the stored conversation turns of a session.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+
+        Returns:
+            int: The number of turns.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM turns WHERE learner_id = ? AND scope = ?",
+                (learner_id, self._scope(source_field, target_field))
+            ).fetchone()[0]
+
+    def append_test(self, learner_id: str, source_field: str, target_field: str, test_data: Dict) -> int:
+        """Store a test taken by a learner.
+
+        Tests beyond the retention bound are deleted, oldest first.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            test_data (Dict): The test data.
+
+        Returns:
+            int: The session's new revision.
+        """
+        scope = self._scope(source_field, target_field)
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO tests (learner_id, scope, payload) VALUES (?, ?, ?)",
+                (learner_id, scope, encode_test(test_data))
+            )
+            self._trim("tests", learner_id, scope, self.max_tests)
+            return self._save(learner_id, scope, {})
+
+    def tests(self, learner_id: str, source_field: str, target_field: str, limit: Optional[int] = None) -> List[Dict]:
+        """Load a learner's stored tests.
+
+        Args:
+            learner_id (str): Identifies the learner.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            limit (Optional[int]): Only load this many of the most recent tests.
+
+        Returns:
+            List[Dict]: The tests, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM tests WHERE learner_id = ? AND scope = ? ORDER BY id DESC LIMIT ?",
+                (learner_id, self._scope(source_field, target_field), -1 if limit is None else limit)
+            ).fetchall()
+        return [decode_test(row[0]) for row in reversed(rows)]
+
+    def purge_expired(self) -> int:
+        """Remove every session that has been idle longer than the TTL.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._transaction():
+            expired = "SELECT learner_id, scope FROM sessions WHERE updated_at < ?"
+            for table in ("turns", "tests"):
+                self._conn.execute(f"DELETE FROM {table} WHERE (learner_id, scope) IN ({expired})", (cutoff,))
+            cursor = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+            return max(cursor.rowcount, 0)
+
+    def start_purging(self, interval_s: float = PURGE_INTERVAL_S) -> int:
+        """Purge idle sessions now, then keep purging them on a background thread.
+
+        Args:
+            interval_s (float): Seconds between two purges.
+
+        Returns:
+            int: The number of sessions removed now.
+        """
+        removed = self.purge_expired()
+
+        def purge_periodically() -> None:
+            while not self._stop_purging.wait(interval_s):
+                try:
+                    self.purge_expired()
+                except sqlite3.Error:
+                    # A busy or closed database is retried on the next round
+                    continue
+
+        if self.ttl_seconds is not None:
+            threading.Thread(target=purge_periodically, name="session-purge", daemon=True).start()
+        return removed
+
+    def close(self) -> None:
+        """Stop purging and close the database connection."""
+        self._stop_purging.set()
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the lock and a write transaction, rolling back on errors."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _scope(self, source_field: str, target_field: str) -> str:
+        """Build the key of a field pair."""
+        return json.dumps([source_field.strip().lower(), target_field.strip().lower()])
+
+    def _save(self, learner_id: str, scope: str, state: Dict) -> int:
+        """Upsert a session's state and bump its revision. Must be called in a transaction."""
+        columns = [column for column in ("current_difficulty", "summary", "window_turns") if column in state]
+        values: Tuple = tuple(state[column] for column in columns)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO sessions (learner_id, scope, updated_at) VALUES (?, ?, ?)",
+            (learner_id, scope, time.time())
+        )
+        assignments = "".join(f"{column} = ?, " for column in columns)
+        self._conn.execute(
+            f"UPDATE sessions SET {assignments}revision = revision + 1, updated_at = ? WHERE learner_id = ? AND scope = ?",
+            values + (time.time(), learner_id, scope)
+        )
+        return self._conn.execute(
+            "SELECT revision FROM sessions WHERE learner_id = ? AND scope = ?",
+            (learner_id, scope)
+        ).fetchone()[0]
+
+    def _trim(self, table: str, learner_id: str, scope: str, keep: int) -> None:
+        """Delete a session's oldest rows beyond a bound. Must be called in a transaction."""
+        self._conn.execute(
+            f"""DELETE FROM {table} WHERE learner_id = ? AND scope = ? AND id IN (
+                SELECT id FROM {table} WHERE learner_id = ? AND scope = ?
+                ORDER BY id DESC LIMIT -1 OFFSET ?
+            )""",
+            (learner_id, scope, learner_id, scope, keep)
+        )
@@ -0,0 +1,117 @@
+"""Single-flight coalescing of identical in-flight requests.
+
+When a burst of learners asks the same question with the same context, every request
+misses the explanation cache because none of them has finished yet, and each one pays
+for its own upstream calls. SingleFlight lets the first request (the leader) do the
+work while identical requests that arrive before it finishes join it: they replay the
+fragments produced so far and then follow the leader live. Results are broadcast as
+text fragments, so a streamed request and a plain one for the same key coalesce too.
+
+The leader's work runs in its own task, so a leader whose client disconnects does not
+fail the requests that joined it.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class _Broadcast:
+    """The fragments of one in-flight result, shared by everyone waiting for it."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def publish(self, part: str) -> None:
+        """Append a fragment and wake the followers."""
+        self.parts.append(part)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Mark the result complete, or failed, and wake the followers."""
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """Yield every fragment from the first, waiting for new ones until the result is complete."""
+        index = 0
+        while True:
+            changed = self.changed
+            while index < len(self.parts):
+                yield self.parts[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time and shares its text result."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._flights: Dict[str, _Broadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        """Get a result, joining an identical computation already in flight.
+
+        Args:
+            key (str): Identifies identical requests.
+            factory (Callable[[], Awaitable[str]]): Computes the result if nothing is in flight.
+
+        Returns:
+            Tuple[str, bool]: The result, and whether this call led the computation.
+        """
+
+        async def produce() -> AsyncIterator[str]:
+            yield await factory()
+
+        fragments, leader = self.stream(key, produce)
+        return "".join([fragment async for fragment in fragments]), leader
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """Stream a result, joining an identical computation already in flight.
+
+        Args:
+            key (str): Identifies identical requests.
+            factory (Callable[[], AsyncIterator[str]]): Streams the result if nothing is in flight.
+
+        Returns:
+            Tuple[AsyncIterator[str], bool]: The result's fragments from the first one, and
+                whether this call leads the computation.
+        """
+        broadcast = self._flights.get(key)
+        if broadcast is not None:
+            self.coalesced += 1
+            return broadcast.follow(), False
+        broadcast = _Broadcast()
+        self._flights[key] = broadcast
+        asyncio.ensure_future(self._run(key, broadcast, factory))
+        return broadcast.follow(), True
+
+    async def _run(self, key: str, broadcast: _Broadcast, factory: Callable[[], AsyncIterator[str]]) -> None:
+        """Pump the leader's fragments into the broadcast, then retire the key."""
+        try:
+            async for fragment in factory():
+                broadcast.publish(fragment)
+        except BaseException as e:
+            broadcast.finish(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            broadcast.finish()
+        finally:
+            if self._flights.get(key) is broadcast:
+                del self._flights[key]
@@ -0,0 +1,368 @@
+"""Pre-generated test bank for the Cross-Domain Learning Tutor.
+
+Generating a test is a slow LLM call, so this module keeps a pool of ready, validated
+tests per (source_field, target_field, difficulty, variant), where the variant names
+the settings the test was generated with (such as its question count and prompt). Tests are served from the pool
+instantly, each learner is only shown tests they have not seen before, and pools are
+refilled by a background worker when they drop below a low-water mark. The pools can
+be persisted to a JSON file so restarts begin warm; changes are batched and written in
+the background, never on the request path.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from semantic_cache import HashedNgramEmbedder
+
+# Answer choices every question must offer
+OPTION_KEYS = ("A", "B", "C", "D")
+
+# Fields every generated question must have
+QUESTION_FIELDS = ("question", "options", "correct_answer", "explanation", "source_field_connection")
+
+# Cosine similarity above which two questions count as the same question
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+# Seconds changes to the bank are batched for before it is written to disk
+SAVE_INTERVAL_S = 5.0
+
+_question_embedder = HashedNgramEmbedder()
+
+
+def validate_test(test_data: Dict) -> bool:
+    """Check that a generated test has the structure the app expects.
+
+    Args:
+        test_data (Dict): The test data to check.
+
+    Returns:
+        bool: True if every question is complete and its correct answer is one of its options.
+    """
+    questions = test_data.get("questions") if isinstance(test_data, dict) else None
+    if not isinstance(questions, list) or not questions:
+        return False
+    for question in questions:
+        if not isinstance(question, dict) or any(field not in question for field in QUESTION_FIELDS):
+            return False
+        options = question["options"]
+        if not isinstance(options, dict) or set(options) != set(OPTION_KEYS):
+            return False
+        if question["correct_answer"] not in options:
+            return False
+    return True
+
+
+def fingerprint_test(test_data: Dict) -> str:
+    """Compute a stable identifier for a test from its question texts.
+
+    Args:
+        test_data (Dict): The test data.
+
+    Returns:
+        str: A short hex digest.
+    """
+    text = "\x1f".join(question["question"].strip().lower() for question in test_data["questions"])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def drop_near_duplicates(
+    candidates: Iterable[Dict],
+    existing: Iterable[Dict] = (),
+    threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> List[Dict]:
+    """Keep the candidate questions that do not repeat an existing question or each other.
+
+    Questions are compared by the cosine similarity of locally embedded question texts
+    and correct answers, so rephrasings of the same question are caught.
+
+    Args:
+        candidates (Iterable[Dict]): The new questions, in order of preference.
+        existing (Iterable[Dict]): Questions already accepted.
+        threshold (float): The similarity above which a candidate is dropped.
+
+    Returns:
+        List[Dict]: The candidates to keep, in order.
+    """
+    def embed(question: Dict) -> np.ndarray:
+        answer = question["options"].get(question["correct_answer"], "")
+        return _question_embedder.embed(f"{question['question']} {answer}")
+
+    kept: List[Dict] = []
+    vectors = [embed(question) for question in existing]
+    for candidate in candidates:
+        vector = embed(candidate)
+        if vectors and float(np.max(np.stack(vectors) @ vector)) >= threshold:
+            continue
+        kept.append(candidate)
+        vectors.append(vector)
+    return kept
+
+
+class TestBank:
+    """A pool of ready tests per field pair and difficulty, refilled in the background."""
+
+    # Not a test case, despite the name
+    __test__ = False
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        target_size: int = 6,
+        low_water: int = 2,
+        max_serves: int = 3,
+        max_workers: int = 2,
+        max_seen: int = 500
+    ):
+        """Initialize the test bank.
+
+        Args:
+            path (Optional[str]): A JSON file to persist pools and seen tests to, or None.
+            target_size (int): How many tests a refill brings each pool up to.
+            low_water (int): Pool size below which a background refill is started.
+            max_serves (int): How many different learners a test is served to before it is retired.
+            max_workers (int): The number of background refill threads.
+            max_seen (int): How many seen tests are remembered per learner and pool.
+        """
+        self.path = path
+        self.target_size = target_size
+        self.low_water = low_water
+        self.max_serves = max_serves
+        self.max_seen = max_seen
+        self._pools: Dict[str, List[Dict]] = {}
+        self._seen: Dict[str, Dict[str, List[str]]] = {}
+        self._refilling: Set[str] = set()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="test-bank")
+        self.served_from_pool = 0
+        self.generated_on_demand = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def get_test(
+        self,
+        source_field: str,
+        target_field: str,
+        difficulty: int,
+        learner_id: str,
+        generate: Callable[[int], Dict],
+        variant: str = ""
+    ) -> Dict:
+        """Serve a test the learner has not seen yet.
+
+        Falls back to generating one synchronously when the pool has nothing new for the
+        learner, and starts a background refill when the pool runs low.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            difficulty (int): The difficulty level (1-5).
+            learner_id (str): Identifies the learner for seen-test tracking.
+            generate (Callable[[int], Dict]): Generates a new test at a difficulty level.
+            variant (str): Identifies the generation settings; tests of other variants are never served.
+
+        Returns:
+            Dict: The test data.
+        """
+        test_data = self.take_test(source_field, target_field, difficulty, learner_id, variant)
+        if test_data is None:
+            test_data = self._generate_valid(generate, difficulty)
+            self.add_test(source_field, target_field, difficulty, learner_id, test_data, variant)
+        self.request_refill(source_field, target_field, difficulty, generate, variant)
+        return test_data
+
+    def take_test(self, source_field: str, target_field: str, difficulty: int, learner_id: str, variant: str = "") -> Optional[Dict]:
+        """Serve a pooled test the learner has not seen, without generating one.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            difficulty (int): The difficulty level (1-5).
+            learner_id (str): Identifies the learner for seen-test tracking.
+            variant (str): Identifies the generation settings; tests of other variants are never served.
+
+        Returns:
+            Optional[Dict]: The test data, or None if the pool has nothing new for the learner.
+        """
+        key = self._key(source_field, target_field, difficulty, variant)
+        with self._lock:
+            test_data = self._take(key, learner_id)
+            if test_data is not None:
+                self.served_from_pool += 1
+        return test_data
+
+    def add_test(
+        self,
+        source_field: str,
+        target_field: str,
+        difficulty: int,
+        learner_id: str,
+        test_data: Dict,
+        variant: str = ""
+    ) -> None:
+        """Pool a test that was generated on demand for a learner.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            difficulty (int): The difficulty level (1-5).
+            learner_id (str): The learner the test was served to.
+            test_data (Dict): The test data.
+            variant (str): Identifies the settings the test was generated with.
+        """
+        key = self._key(source_field, target_field, difficulty, variant)
+        with self._lock:
+            self.generated_on_demand += 1
+            if self.max_serves > 1:
+                self._pools.setdefault(key, []).append({"test": test_data, "serves": 1})
+            self._mark_seen(key, learner_id, test_data)
+            self._schedule_save()
+
+    def request_refill(
+        self,
+        source_field: str,
+        target_field: str,
+        difficulty: int,
+        generate: Callable[[int], Dict],
+        variant: str = ""
+    ) -> bool:
+        """Start a background refill if the pool is below its low-water mark.
+
+        Args:
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+            difficulty (int): The difficulty level (1-5).
+            generate (Callable[[int], Dict]): Generates a new test at a difficulty level.
+            variant (str): Identifies the settings generate uses.
+
+        Returns:
+            bool: True if a refill was started.
+        """
+        key = self._key(source_field, target_field, difficulty, variant)
+        with self._lock:
+            if key in self._refilling or len(self._pools.get(key, [])) >= self.low_water:
+                return False
+            self._refilling.add(key)
+        self._executor.submit(self._refill, key, difficulty, generate)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Get pool and serving counters.
+
+        Returns:
+            Dict[str, int]: The counters for this process.
+        """
+        with self._lock:
+            return {
+                "pools": len(self._pools),
+                "pooled_tests": sum(len(pool) for pool in self._pools.values()),
+                "refilling": len(self._refilling),
+                "served_from_pool": self.served_from_pool,
+                "generated_on_demand": self.generated_on_demand
+            }
+
+    def close(self) -> None:
+        """Stop the background workers and persist the pools."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+        self._save()
+
+    def _key(self, source_field: str, target_field: str, difficulty: int, variant: str = "") -> str:
+        """Build the pool key for a field pair, difficulty and generation variant."""
+        return json.dumps([source_field.strip().lower(), target_field.strip().lower(), difficulty, variant])
+
+    def _take(self, key: str, learner_id: str) -> Optional[Dict]:
+        """Serve the oldest pooled test the learner has not seen. Must be called with the lock held."""
+        seen = set(self._seen.get(learner_id, {}).get(key, []))
+        pool = self._pools.get(key, [])
+        for i, entry in enumerate(pool):
+            if fingerprint_test(entry["test"]) in seen:
+                continue
+            entry["serves"] += 1
+            if entry["serves"] >= self.max_serves:
+                pool.pop(i)
+            self._mark_seen(key, learner_id, entry["test"])
+            self._schedule_save()
+            return entry["test"]
+        return None
+
+    def _mark_seen(self, key: str, learner_id: str, test_data: Dict) -> None:
+        """Remember that a learner was shown a test. Must be called with the lock held."""
+        seen = self._seen.setdefault(learner_id, {}).setdefault(key, [])
+        seen.append(fingerprint_test(test_data))
+        del seen[:-self.max_seen]
+
+    def _generate_valid(self, generate: Callable[[int], Dict], difficulty: int, attempts: int = 3) -> Dict:
+        """Generate a test, retrying when the output fails validation."""
+        for attempt in range(attempts):
+            try:
+                test_data = generate(difficulty)
+            except ValueError:
+                if attempt == attempts - 1:
+                    raise
+                continue
+            if validate_test(test_data):
+                return test_data
+        raise ValueError("Failed to generate a valid test format")
+
+    def _refill(self, key: str, difficulty: int, generate: Callable[[int], Dict]) -> None:
+        """Generate tests until the pool reaches its target size."""
+        try:
+            while True:
+                with self._lock:
+                    pooled = {fingerprint_test(entry["test"]) for entry in self._pools.get(key, [])}
+                    if len(pooled) >= self.target_size:
+                        return
+                try:
+                    test_data = self._generate_valid(generate, difficulty)
+                except Exception:
+                    # Leave the pool as it is; the next low-water check retries
+                    return
+                with self._lock:
+                    if fingerprint_test(test_data) not in pooled:
+                        self._pools.setdefault(key, []).append({"test": test_data, "serves": 0})
+                        self._schedule_save()
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def _load(self) -> None:
+        """Load persisted pools and seen tests."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self._pools = {key: [entry for entry in pool if validate_test(entry.get("test"))] for key, pool in state.get("pools", {}).items()}
+        self._seen = state.get("seen", {})
+
+    def _schedule_save(self) -> None:
+        """Save the bank shortly, batching the changes made meanwhile. Must be called with the lock held."""
+        if not self.path or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(SAVE_INTERVAL_S, self._save)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def _save(self) -> None:
+        """Persist pools and seen tests atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            self._save_timer = None
+            state = json.dumps({"pools": self._pools, "seen": self._seen})
+        with self._save_lock:
+            # A per-process temp file, so workers sharing the bank never write into each other's
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(state)
+            os.replace(temp_path, self.path)
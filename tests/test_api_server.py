@@ -0,0 +1,187 @@
+"""Tests for single-flight coalescing and the headless API server."""
+
+import asyncio
+import json
+
+import pytest
+
+from api_server import TutorAPI
+from async_tutor import AsyncCrossDomainTutor
+from llm_backends import FakeBackend
+from session_store import SessionStore
+from single_flight import SingleFlight
+from tutor_registry import TutorRegistry
+
+
+async def _collect(fragments):
+    return [fragment async for fragment in fragments]
+
+
+def test_identical_requests_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == [1]
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert sum(leader for _, leader in results) == 1
+    assert flight.coalesced == 4
+    assert len(flight) == 0
+
+
+def test_late_follower_replays_earlier_fragments():
+    flight = SingleFlight()
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def produce():
+            yield "first "
+            await gate.wait()
+            yield "second"
+
+        leader, _ = flight.stream("key", produce)
+        leader_task = asyncio.ensure_future(_collect(leader))
+        await asyncio.sleep(0.01)
+        follower, led = flight.stream("key", produce)
+        follower_task = asyncio.ensure_future(_collect(follower))
+        await asyncio.sleep(0.01)
+        gate.set()
+        return led, await leader_task, await follower_task
+
+    led, leader_parts, follower_parts = asyncio.run(run())
+    assert not led
+    assert leader_parts == follower_parts == ["first ", "second"]
+
+
+def test_failure_reaches_every_follower_and_retires_the_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def succeed():
+        return "answer"
+
+    async def run():
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        return results, await flight.do("key", succeed)
+
+    results, retry = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retry == ("answer", True)
+
+
+def test_disconnected_leader_does_not_fail_its_followers():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("answer", False)
+
+
+class _Client:
+    """Calls the ASGI application in process."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def call(self, method, path, body=None):
+        raw = body if isinstance(body, bytes) else json.dumps(body or {}).encode("utf-8")
+        messages = [{"type": "http.request", "body": raw, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app({"type": "http", "method": method, "path": path}, receive, send)
+        return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def _app(backend):
+    return TutorAPI(lambda metrics: TutorRegistry(
+        client_factory=lambda: None,
+        tutor_factory=AsyncCrossDomainTutor,
+        backend=backend,
+        single_flight=SingleFlight(),
+        session_store=SessionStore()
+    ))
+
+
+FIELDS = {"source_field": "Python", "target_field": "Rust"}
+
+
+def test_burst_of_identical_questions_makes_one_set_of_calls():
+    def burst(size):
+        backend = FakeBackend(latency_ms=20, latency_jitter_ms=0, latency_distribution="constant", tokens_per_second=0)
+        client = _Client(_app(backend))
+
+        async def run():
+            return await asyncio.gather(*(
+                client.call("POST", "/v1/explain", dict(FIELDS, learner_id=f"learner {i}", query="What is ownership?", stream=i % 2 == 0))
+                for i in range(size)
+            ))
+
+        return asyncio.run(run()), backend.calls
+
+    _, single_request_calls = burst(1)
+    responses, calls = burst(6)
+    assert [status for status, _ in responses] == [200] * 6
+    assert calls == single_request_calls
+    answer = json.loads(responses[1][1])["explanation"]
+    events = [json.loads(line) for line in responses[0][1].decode("utf-8").splitlines()]
+    assert "".join(event.get("delta", "") for event in events) == answer
+    assert events[-1]["done"]
+
+
+def test_only_tests_issued_to_the_learner_are_graded():
+    client = _Client(_app(FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)))
+
+    async def run():
+        _, body = await client.call("POST", "/v1/tests", dict(FIELDS, learner_id="ada"))
+        test_data = json.loads(body)
+        answers = {str(i): question["correct_answer"] for i, question in enumerate(test_data["questions"])}
+        graded = await client.call("POST", "/v1/tests/evaluate", dict(FIELDS, learner_id="ada", test_id=test_data["test_id"], answers=answers))
+        other_learner = await client.call("POST", "/v1/tests/evaluate", dict(FIELDS, learner_id="bob", test_id=test_data["test_id"], answers=answers))
+        forged = await client.call("POST", "/v1/tests/evaluate", dict(FIELDS, learner_id="ada", test_id="forged", answers=answers))
+        return graded, other_learner, forged
+
+    graded, other_learner, forged = asyncio.run(run())
+    assert graded[0] == 200
+    assert json.loads(graded[1]) == {"score": 100.0, "should_increase": True, "current_difficulty": 2}
+    assert other_learner[0] == forged[0] == 404
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("GET", "/health", None, 200),
+    ("GET", "/v1/unknown", None, 404),
+    ("GET", "/v1/explain", None, 405),
+    ("POST", "/v1/explain", b"not json", 400),
+    ("POST", "/v1/explain", {"learner_id": "ada"}, 400),
+    ("POST", "/v1/tests", dict(FIELDS, learner_id="ada", difficulty_level=9), 400)
+])
+def test_bad_requests_are_rejected(method, path, body, status):
+    client = _Client(_app(FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)))
+    assert asyncio.run(client.call(method, path, body))[0] == status
@@ -0,0 +1,100 @@
+"""Tests for the bounded concurrency, retries and background tests of AsyncCrossDomainTutor."""
+
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+import async_tutor
+from async_tutor import AsyncCrossDomainTutor
+from llm_backends import Completion, FakeBackend, LLMBackend, TransientBackendError
+from scheduler import RequestScheduler
+
+
+class SlowBackend(LLMBackend):
+    """Answers every call with its prompt after a short sleep, tracking the calls in flight."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def acomplete(self, model, messages, temperature=0.7, **options):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.errors:
+                raise self.errors.pop(0)
+            return Completion(f"answer to {messages[-1]['content'][-40:]}", model, 1, 1)
+        finally:
+            self.in_flight -= 1
+
+
+async def _no_backoff(attempt, error):
+    pass
+
+
+def test_batch_explain_bounds_concurrency_and_keeps_order():
+    backend = SlowBackend()
+    tutor = AsyncCrossDomainTutor("physics", "biology", backend=backend, max_concurrency=3)
+    queries = [f"What is organelle number {i}?" for i in range(8)]
+    answers = asyncio.run(tutor.batch_explain(queries))
+    assert len(answers) == 8
+    assert backend.peak == 3
+    assert [turn["content"] for turn in tutor.conversation_history if turn["role"] == "user"][-1] == queries[-1]
+
+
+def test_shared_semaphore_bounds_every_tutor():
+    backend = SlowBackend()
+
+    async def run():
+        semaphore = asyncio.Semaphore(2)
+        tutors = [AsyncCrossDomainTutor("physics", field, backend=backend, semaphore=semaphore) for field in ("biology", "chemistry")]
+        await asyncio.gather(*(tutor.batch_explain(["What is energy?", "What is mass?"]) for tutor in tutors))
+
+    asyncio.run(run())
+    assert backend.peak == 2
+
+
+def test_retries_wait_for_the_scheduler_again():
+    backend = SlowBackend([TransientBackendError("down"), TransientBackendError("down")])
+    scheduler = RequestScheduler(requests_per_minute=600, tokens_per_minute=None)
+    tutor = AsyncCrossDomainTutor("physics", "biology", backend=backend, pipeline_mode="fused", scheduler=scheduler, max_retries=3)
+    tutor._backoff = _no_backoff
+    asyncio.run(tutor.get_explanation("What is a cell?"))
+    assert tutor.last_run["stages"][0]["retries"] == 2
+    assert scheduler.stats()["interactive"]["admitted"] == 3
+
+
+def test_calls_fail_after_the_last_retry():
+    backend = SlowBackend([TransientBackendError("down")] * 3)
+    tutor = AsyncCrossDomainTutor("physics", "biology", backend=backend, pipeline_mode="fused", max_retries=2)
+    tutor._backoff = _no_backoff
+    with pytest.raises(TransientBackendError):
+        asyncio.run(tutor.get_explanation("What is a cell?"))
+
+
+def test_background_test_times_out_and_is_cancelled(monkeypatch):
+    monkeypatch.setattr(async_tutor, "BACKGROUND_TEST_TIMEOUT_S", 0.05)
+    tutor = AsyncCrossDomainTutor("physics", "biology", backend=FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0))
+    cancelled = threading.Event()
+
+    async def hang(level):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    tutor._create_background_test = hang
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        with pytest.raises(concurrent.futures.TimeoutError):
+            await asyncio.to_thread(tutor._generate_on_loop, loop, 1)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert cancelled.is_set()
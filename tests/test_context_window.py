@@ -0,0 +1,83 @@
+"""Tests for the token-budgeted context window and the rolling summary."""
+
+import threading
+
+from context_window import SUMMARY_HEADING, ContextWindow, clip_to_tokens, count_tokens, extractive_summary
+from llm_backends import FakeBackend
+from tutor_pipeline import CrossDomainTutor
+
+
+def _window_with_turns(count, token_budget=200, words=40):
+    window = ContextWindow(token_budget=token_budget, max_summary_tokens=50)
+    for i in range(count):
+        window.add("user", f"Question {i}?")
+        window.add("assistant", f"Answer {i}. " + "word " * words)
+    return window
+
+
+def test_overflow_keeps_the_latest_exchange_within_budget():
+    window = _window_with_turns(6)
+    assert window.over_budget()
+    overflow = window.take_overflow()
+    assert overflow[0]["content"] == "Question 0?"
+    assert window.turns[-1]["content"].startswith("Answer 5.")
+    assert window.token_count() <= window.token_budget - window.max_summary_tokens
+
+
+def test_oversized_latest_answer_is_clipped():
+    window = _window_with_turns(1, token_budget=100, words=500)
+    assert window.take_overflow() == []
+    assert len(window.turns) == 2
+    assert window.turns[-1]["content"].endswith(" ...")
+    assert not window.over_budget()
+
+
+def test_summary_is_sent_as_its_own_message():
+    window = _window_with_turns(1)
+    window.fold("The learner asked about cells.")
+    messages = window.messages()
+    assert messages[0] == {"role": "system", "content": f"{SUMMARY_HEADING}\nThe learner asked about cells."}
+    assert [msg["role"] for msg in messages[1:]] == ["user", "assistant"]
+
+
+def test_extractive_summary_keeps_questions_and_first_sentences_within_budget():
+    summary = extractive_summary("", [
+        {"role": "user", "content": "What is a cell?"},
+        {"role": "assistant", "content": "A cell is the unit of life. It has a membrane."}
+    ])
+    assert summary == "- Asked: What is a cell?\n  Answered: A cell is the unit of life."
+    long_turns = [{"role": "user", "content": f"Question {i} " + "word " * 20} for i in range(20)]
+    trimmed = extractive_summary("", long_turns, max_tokens=60)
+    assert "Question 19" in trimmed
+    assert "Question 0 " not in trimmed
+
+
+def test_clip_to_tokens_cuts_at_a_word_boundary():
+    assert clip_to_tokens("short text", 10) == "short text"
+    clipped = clip_to_tokens("alpha beta gamma delta " * 50, 20)
+    assert clipped.endswith(" ...")
+    assert count_tokens(clipped[:-len(" ...")]) <= 20
+    assert clipped.split()[-2] in ("alpha", "beta", "gamma", "delta")
+
+
+def test_tutor_folds_overflow_in_the_background():
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)
+    tutor = CrossDomainTutor("physics", "biology", backend=backend, context_token_budget=300)
+    release = threading.Event()
+    folded = []
+
+    def summarize(summary, turns):
+        release.wait(5)
+        folded.extend(turns)
+        return "The learner asked about cells."
+
+    tutor._summarize = summarize
+    for i in range(4):
+        tutor.get_explanation(f"What does organelle {i} do in a cell?")
+    assert tutor._compaction is not None
+    assert tutor.context.summary == ""
+
+    release.set()
+    tutor._compaction.result(timeout=5)
+    assert folded[0]["content"] == "What does organelle 0 do in a cell?"
+    assert tutor.context.messages()[0]["content"].endswith("The learner asked about cells.")
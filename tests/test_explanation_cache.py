@@ -0,0 +1,67 @@
+"""Tests for the two-tier explanation cache and its use by the tutor."""
+
+from explanation_cache import ADAPTED_TIER, TARGET_TIER, ExplanationCache, adapted_key, target_key
+from llm_backends import FakeBackend
+from tutor_pipeline import CrossDomainTutor
+
+
+def _fake_backend():
+    return FakeBackend(latency_ms=0, latency_jitter_ms=0, latency_distribution="constant", tokens_per_second=0)
+
+
+def _stages(tutor):
+    return [stage["stage"] for stage in tutor.last_run["stages"]]
+
+
+def test_trivially_different_phrasings_share_a_key():
+    assert target_key("Biology", "What is a cell?", []) == target_key("biology", "  what is   a CELL ", [])
+    assert target_key("biology", "What is a cell?", []) != target_key("biology", "What is a cell?", [{"role": "user", "content": "hi"}])
+    assert adapted_key("physics", "biology", "What is a cell?", []) != adapted_key("chemistry", "biology", "What is a cell?", [])
+
+
+def test_least_recently_used_entries_are_evicted_per_tier():
+    cache = ExplanationCache(max_entries=2)
+    cache.set(TARGET_TIER, "a", "1")
+    cache.set(TARGET_TIER, "b", "2")
+    cache.set(ADAPTED_TIER, "a", "adapted")
+    cache.get(TARGET_TIER, "a")
+    cache.set(TARGET_TIER, "c", "3")
+    assert cache.get(TARGET_TIER, "b") is None
+    assert cache.get(TARGET_TIER, "a") == "1"
+    assert cache.get(ADAPTED_TIER, "a") == "adapted"
+    assert cache.stats()[TARGET_TIER]["evictions"] == 1
+
+
+def test_expired_entries_miss():
+    cache = ExplanationCache(ttl_seconds=0.0)
+    cache.set(TARGET_TIER, "a", "1")
+    assert cache.get(TARGET_TIER, "a") is None
+    assert cache.purge_expired() == 0
+    assert cache.stats()[TARGET_TIER]["size"] == 0
+
+
+def test_entries_are_shared_through_the_database_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ExplanationCache(path).set(TARGET_TIER, "a", "1")
+    assert ExplanationCache(path).get(TARGET_TIER, "a") == "1"
+
+
+def test_expert_explanations_are_shared_between_source_fields():
+    cache = ExplanationCache()
+    physics = CrossDomainTutor("physics", "biology", backend=_fake_backend(), cache=cache)
+    chemistry = CrossDomainTutor("chemistry", "biology", backend=_fake_backend(), cache=cache)
+    physics.get_explanation("What is a cell?")
+    assert _stages(physics) == ["expert", "adapter"]
+
+    chemistry.get_explanation("What is a cell?")
+    assert _stages(chemistry) == ["adapter"]
+
+
+def test_repeated_question_is_answered_from_the_adapted_tier():
+    cache = ExplanationCache()
+    first = CrossDomainTutor("physics", "biology", backend=_fake_backend(), cache=cache)
+    answer = first.get_explanation("What is a cell?")
+    second = CrossDomainTutor("physics", "biology", backend=_fake_backend(), cache=cache)
+    assert second.get_explanation("what is a cell") == answer
+    assert _stages(second) == []
+    assert second.last_run["cache_hit"]
@@ -0,0 +1,74 @@
+"""Tests for the deterministic FakeBackend and the benchmark suite built on it."""
+
+import asyncio
+import json
+
+import pytest
+
+from benchmark import run_scenario, summarize_latencies
+from llm_backends import CallStats, FakeBackend, TransientBackendError, fake_test_payload
+from test_bank import validate_test
+from tutor_pipeline import CrossDomainTutor
+
+MESSAGES = [{"role": "system", "content": "You are an expert tutor."}, {"role": "user", "content": "What is a cell?"}]
+
+
+def _instant(**kwargs):
+    return FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0, **kwargs)
+
+
+def test_same_seed_gives_the_same_content():
+    messages = [{"role": "system", "content": 'Reply with {"questions": [...]}'}, {"role": "user", "content": "Generate a test with 3 MCQs."}]
+
+    def content(seed):
+        return FakeBackend(seed=seed, latency_ms=0, tokens_per_second=0).complete("gpt-4", messages).content
+
+    assert content(7) == content(7)
+    assert content(7) != content(8)
+
+
+def test_stream_yields_the_completion_content():
+    completion = FakeBackend(seed=3, latency_ms=0, tokens_per_second=0).complete("gpt-4", MESSAGES)
+    streamed = "".join(FakeBackend(seed=3, latency_ms=0, tokens_per_second=0).stream("gpt-4", MESSAGES))
+    assert streamed == completion.content
+    assert completion.finish_reason == "stop"
+    assert completion.prompt_tokens > 0 and completion.completion_tokens > 0
+
+
+def test_max_tokens_cuts_the_answer_off():
+    backend = _instant()
+    completion = backend.complete("gpt-4", MESSAGES, max_tokens=5)
+    assert completion.finish_reason == "length"
+    assert len(completion.content.split()) == 5
+
+    stats = CallStats()
+    asyncio.run(_drain(backend.astream("gpt-4", MESSAGES, max_tokens=5, stats=stats)))
+    assert stats.finish_reason == "length"
+
+
+async def _drain(stream):
+    return [fragment async for fragment in stream]
+
+
+def test_injected_failures_and_timeouts_are_transient():
+    with pytest.raises(TransientBackendError):
+        _instant(failure_rate=1.0).complete("gpt-4", MESSAGES)
+    slow = FakeBackend(latency_ms=200, latency_distribution="constant", tokens_per_second=0)
+    with pytest.raises(TransientBackendError):
+        slow.complete("gpt-4", MESSAGES, timeout=0.01)
+    with pytest.raises(ValueError):
+        FakeBackend(latency_distribution="bimodal")
+
+
+def test_test_prompts_get_valid_tests():
+    assert validate_test(json.loads(fake_test_payload(3, 2, seed=1)))
+    tutor = CrossDomainTutor("physics", "biology", backend=_instant(), test_questions=4)
+    assert tutor.generate_test(2)["total_questions"] == 4
+
+
+def test_benchmark_scenario_reports_percentiles():
+    summary = run_scenario("explain", lambda index: CrossDomainTutor("physics", "biology", backend=_instant()), 6, 3)
+    assert summary["operations"] == 6
+    assert summary["failures"] == 0
+    assert summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"]
+    assert summarize_latencies([0.1, 0.2], 1, 1.0)["throughput_per_s"] == 2.0
@@ -0,0 +1,74 @@
+"""Tests for vectorized grading, cohort reports and evaluate_test."""
+
+import json
+
+import numpy as np
+import pytest
+
+from grading import MAX_DIFFICULTY, CohortGrader, encode_answer_key, encode_submissions, grade_file, grade_submissions
+from llm_backends import FakeBackend
+from tutor_pipeline import CrossDomainTutor
+
+
+def _test(answers, difficulty_level=2):
+    return {
+        "questions": [{"question": f"Q{i}?", "correct_answer": answer} for i, answer in enumerate(answers)],
+        "difficulty_level": difficulty_level
+    }
+
+
+def test_missing_and_invalid_answers_score_zero():
+    key = encode_answer_key(_test("ABCD"))
+    answers = encode_submissions([{"0": "A", "1": "B", "2": "C", "3": "D"}, {"0": "A", "1": "b", "2": None}, {}], 4)
+    scores, promoted = grade_submissions(key, answers)
+    assert scores.tolist() == [100.0, 25.0, 0.0]
+    assert promoted.tolist() == [True, False, False]
+
+
+def test_a_missing_correct_answer_matches_no_submission():
+    key = encode_answer_key(_test(["A", "Z"]))
+    scores, _ = grade_submissions(key, encode_submissions([{"0": "A", "1": "Z"}], 2))
+    assert scores.tolist() == [50.0]
+
+
+def test_cohort_report_covers_items_and_next_difficulty():
+    grader = CohortGrader(_test("AB", difficulty_level=MAX_DIFFICULTY))
+    grader.add_submissions([{"0": "A", "1": "B"}, {"0": "C"}], ["ada", "bob"])
+    grader.add_submissions([{"0": "A", "1": "A"}])
+    report = grader.report()
+    assert report["learner_ids"] == ["ada", "bob", "2"]
+    assert report["scores"].tolist() == [100.0, 0.0, 50.0]
+    assert report["next_difficulty"].tolist() == [MAX_DIFFICULTY] * 3
+    assert report["p_values"] == pytest.approx([2 / 3, 1 / 3])
+    assert report["distractor_frequencies"]["C"][0] == pytest.approx(1 / 3)
+    assert report["omission_rates"] == pytest.approx([0.0, 1 / 3])
+
+
+def test_grade_file_reads_jsonl_and_csv_in_chunks(tmp_path):
+    jsonl = tmp_path / "answers.jsonl"
+    jsonl.write_text("\n".join(json.dumps({"learner_id": f"l{i}", "answers": {"0": "A", "1": "B" if i % 2 else "C"}}) for i in range(5)))
+    csv_file = tmp_path / "answers.csv"
+    csv_file.write_text("learner_id,q1,q2\n" + "".join(f"l{i},A,{'B' if i % 2 else 'C'}\n" for i in range(5)))
+    for path in (jsonl, csv_file):
+        report = grade_file(_test("AB"), str(path), chunk_size=2)
+        assert report["submissions"] == 5
+        assert report["mean_score"] == pytest.approx(70.0)
+
+
+def test_evaluate_test_promotes_on_a_high_score():
+    tutor = CrossDomainTutor("physics", "biology", backend=FakeBackend(latency_ms=0, tokens_per_second=0))
+    test_data = _test("ABCDA")
+    score, promoted = tutor.evaluate_test(test_data, {str(i): answer for i, answer in enumerate("ABCDB")})
+    assert (score, promoted) == (80.0, True)
+    assert tutor.current_difficulty == 2
+    assert tutor.evaluate_test(test_data, {}) == (0.0, False)
+    assert tutor.current_difficulty == 2
+
+
+def test_vectorized_scores_match_a_plain_loop():
+    rng = np.random.default_rng(0)
+    key_text = "".join(rng.choice(list("ABCD"), 12))
+    submissions = [{str(i): str(rng.choice(list("ABCDE"))) for i in range(12) if rng.random() > 0.1} for _ in range(200)]
+    scores, _ = grade_submissions(encode_answer_key(_test(key_text)), encode_submissions(submissions, 12))
+    expected = [sum(answers.get(str(i)) == key_text[i] for i in range(12)) / 12 * 100 for answers in submissions]
+    assert scores == pytest.approx(expected)
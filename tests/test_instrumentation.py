@@ -0,0 +1,83 @@
+"""Tests for call records, their sinks and the tutor's per-stage reporting."""
+
+import json
+
+import pytest
+
+from explanation_cache import ExplanationCache
+from instrumentation import Instrumentation, JsonlTraceSink, PrometheusSink, RingBufferSink, estimate_cost
+from llm_backends import FakeBackend
+from tutor_pipeline import CrossDomainTutor
+
+
+class BrokenSink:
+    def emit(self, record):
+        raise OSError("disk full")
+
+
+def test_cost_uses_the_longest_matching_model_prefix():
+    assert estimate_cost("gpt-4o-mini-2024", 1000, 1000) == pytest.approx(0.00015 + 0.0006)
+    assert estimate_cost("gpt-4-0613", 1000, 0) == pytest.approx(0.03)
+    assert estimate_cost("local-model", 1000, 1000) == 0.0
+
+
+def test_failed_calls_and_cache_hits_are_not_costed():
+    instrumentation = Instrumentation([BrokenSink()])
+    assert instrumentation.record_call("s", "expert", "gpt-4", 1.0, 100, 100, error="timeout")["cost_usd"] == 0.0
+    assert instrumentation.record_call("s", "expert", "gpt-4", 0.0, cache_hit=True)["cost_usd"] == 0.0
+    assert instrumentation.record_call("s", "expert", "gpt-4", 1.0, 100, 100)["status"] == "ok"
+
+
+def test_ring_buffer_summarizes_per_stage_and_session():
+    sink = RingBufferSink(capacity=3)
+    instrumentation = Instrumentation([sink])
+    instrumentation.record_call("old", "expert", "gpt-4", 9.0)
+    instrumentation.record_call("a", "expert", "gpt-4", 1.0, 10, 20)
+    instrumentation.record_call("a", "adapter", "gpt-4", 3.0, 10, 20, error="boom")
+    instrumentation.record_call("b", "expert", "gpt-4", 0.0, cache_hit=True)
+    assert len(sink.records()) == 3
+    summary = sink.summary("a")
+    assert summary["expert"]["calls"] == 1
+    assert summary["adapter"]["errors"] == 1
+    assert summary["all"]["completion_tokens"] == 40
+    assert sink.summary()["expert"]["cache_hits"] == 1
+
+
+def test_trace_and_prometheus_sinks(tmp_path):
+    trace = JsonlTraceSink(str(tmp_path / "trace.jsonl"))
+    metrics = PrometheusSink()
+    instrumentation = Instrumentation([trace, metrics])
+    instrumentation.record_call("a", "expert", "gpt-4", 0.3, 10, 20, time_to_first_token_s=0.1)
+    instrumentation.record_call("a", "expert", "gpt-4", 0.0, cache_hit=True)
+    trace.close()
+    with open(tmp_path / "trace.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["cache_hit"] for line in f] == [False, True]
+    text = metrics.render()
+    assert 'tutor_llm_calls_total{model="gpt-4",stage="expert",status="ok"} 1' in text
+    assert 'tutor_cache_hits_total{stage="expert"} 1' in text
+    assert "tutor_llm_wall_time_seconds_bucket" in text
+
+
+def test_tutor_reports_every_stage_and_cache_hit():
+    sink = RingBufferSink()
+    cache = ExplanationCache()
+
+    def tutor():
+        backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)
+        return CrossDomainTutor("physics", "biology", backend=backend, cache=cache, instrumentation=Instrumentation([sink]), learner_id="learner")
+
+    tutor().get_explanation("What is a cell?")
+    tutor().get_explanation("What is a cell?")
+    records = sink.records("learner")
+    assert [(record["stage"], record["cache_hit"]) for record in records] == [("expert", False), ("adapter", False), ("adapter", True)]
+    assert all(record["prompt_tokens"] > 0 for record in records[:2])
+
+
+def test_app_reruns_are_exported_per_view():
+    metrics = PrometheusSink()
+    metrics.observe_rerun("app", 0.2)
+    metrics.observe_rerun("history", 0.01)
+    metrics.observe_rerun("history", 0.03)
+    text = metrics.render()
+    assert 'tutor_ui_rerun_seconds_count{view="history"} 2' in text
+    assert 'tutor_ui_rerun_seconds_count{view="app"} 1' in text
@@ -0,0 +1,69 @@
+"""Tests for query complexity routing and the cascade."""
+
+import json
+
+import pytest
+
+from llm_backends import FakeBackend
+from model_router import FAST_MODEL, STRONG_MODEL, ModelRouter, context_limit, load_router, query_complexity, validate_draft
+from tutor_pipeline import CrossDomainTutor
+
+
+def test_complexity_rises_with_reasoning_code_difficulty_and_follow_ups():
+    definition = query_complexity("What is a closure?")
+    assert definition == 0.0
+    assert query_complexity("Why does my closure capture the loop variable?") > definition
+    assert query_complexity("What does fn add(a: i32) -> i32 { a } do?") > definition
+    baseline = query_complexity("Closures in Rust")
+    assert query_complexity("Closures in Rust", difficulty_level=5) == pytest.approx(baseline + 0.25)
+    follow_up = query_complexity("Closures in Rust", recent_context=[{"role": "user", "content": "hi"}] * 5)
+    assert follow_up == pytest.approx(baseline + 0.1)
+
+
+def test_auto_policy_sends_only_simple_questions_to_the_fast_model():
+    router = ModelRouter()
+    assert router.route("expert", "python", "rust", "What is a closure?")["model"] == FAST_MODEL
+    hard = router.route("expert", "python", "rust", "Why does the borrow checker reject this design?", difficulty_level=3)
+    assert (hard["tier"], hard["model"]) == ("strong", STRONG_MODEL)
+    assert router.route("summarizer", "python", "rust")["model"] == STRONG_MODEL
+
+
+def test_field_pair_policies_override_stage_policies(tmp_path):
+    path = tmp_path / "routing.json"
+    path.write_text(json.dumps({
+        "policies": {"expert": "fast"},
+        "field_pairs": [{"source_field": "Python", "target_field": "Rust", "policies": {"expert": "strong"}}],
+        "strong_model": "gpt-4o"
+    }))
+    router = load_router(str(path))
+    assert router.route("expert", " python", "RUST ", "What is a closure?")["model"] == "gpt-4o"
+    assert router.route("expert", "java", "rust", "Why is this slow?")["model"] == FAST_MODEL
+    with pytest.raises(ValueError):
+        ModelRouter(policies={"expert": "cheapest"})
+
+
+def test_streamed_stages_never_cascade():
+    router = ModelRouter(policies={"fused": "cascade"})
+    assert router.route("fused", "python", "rust", "What is a closure?")["policy"] == "cascade"
+    assert router.route("fused", "python", "rust", "What is a closure?", streaming=True)["policy"] == "auto"
+
+
+def test_drafts_must_be_long_enough_and_close_their_code_blocks():
+    assert validate_draft("x" * 200)
+    assert not validate_draft("Too short.")
+    assert not validate_draft("```rust\n" + "let x = 1;\n" * 30)
+    assert context_limit("gpt-4-turbo-preview") == 128000
+    assert context_limit("gpt-4-0613") == 8192
+
+
+def test_failed_cascade_draft_is_escalated_to_the_strong_model():
+    def respond(model, messages):
+        return "Too short." if model == FAST_MODEL else "A long and careful explanation. " * 10
+
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0, responder=respond)
+    router = ModelRouter(policies={"fused": "cascade"})
+    tutor = CrossDomainTutor("python", "rust", backend=backend, pipeline_mode="fused", router=router)
+    answer = tutor.get_explanation("What is a closure?")
+    assert answer.startswith("A long and careful explanation.")
+    assert [stage["model"] for stage in tutor.last_run["stages"]] == [FAST_MODEL, STRONG_MODEL]
+    assert tutor.last_run["routes"]["fused"]["escalated"]
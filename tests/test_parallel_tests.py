@@ -0,0 +1,80 @@
+"""Tests for parallel per-slice test generation and question deduplication."""
+
+import json
+import threading
+
+from llm_backends import Completion, LLMBackend, TransientBackendError
+from test_bank import drop_near_duplicates
+from tutor_pipeline import CrossDomainTutor
+
+
+def _question(text, answer="yes"):
+    return {
+        "question": text,
+        "options": {"A": answer, "B": "no", "C": "maybe", "D": "never"},
+        "correct_answer": "A",
+        "explanation": "Because.",
+        "source_field_connection": "Like physics."
+    }
+
+
+class SliceBackend(LLMBackend):
+    """Answers each call with the next scripted list of questions, or raises a scripted error."""
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, model, messages, temperature=0.7, **options):
+        with self._lock:
+            self.calls += 1
+            output = self.outputs.pop(0)
+        if isinstance(output, Exception):
+            raise output
+        return Completion(json.dumps({"questions": output}), model, 1, 1)
+
+
+def test_repeated_questions_are_dropped():
+    kept = drop_near_duplicates(
+        [_question("What does the Krebs cycle produce?"), _question("Where is DNA stored?", "nucleus"), _question("Where is DNA stored", "nucleus")],
+        [_question("what does the krebs cycle produce")]
+    )
+    assert [question["question"] for question in kept] == ["Where is DNA stored?"]
+
+
+def test_parallel_mode_splits_the_test_into_slices():
+    backend = SliceBackend([
+        [_question("Where is DNA stored?", "nucleus"), _question("What do ribosomes build?", "proteins")],
+        [_question("What does the Krebs cycle produce?", "ATP"), _question("Which organelle makes energy?", "mitochondria")],
+        [_question("What carries oxygen in blood?", "hemoglobin")]
+    ])
+    tutor = CrossDomainTutor("physics", "biology", backend=backend, test_generation_mode="parallel", test_questions=5)
+    test_data = tutor.generate_test(1)
+    assert backend.calls == 3
+    assert test_data["total_questions"] == 5
+    assert len({question["question"] for question in test_data["questions"]}) == 5
+
+
+def test_duplicates_across_slices_are_topped_up():
+    repeated = _question("What does the Krebs cycle produce?")
+    backend = SliceBackend([
+        [repeated, _question("Where is DNA stored?", "nucleus")],
+        [repeated, _question("What carries oxygen in blood?", "hemoglobin")],
+        [_question("What do ribosomes build?", "proteins")]
+    ])
+    tutor = CrossDomainTutor("physics", "biology", backend=backend, test_generation_mode="parallel", test_questions=4)
+    test_data = tutor.generate_test(1)
+    assert backend.calls == 3
+    assert test_data["total_questions"] == 4
+    assert [question["question"] for question in test_data["questions"]].count(repeated["question"]) == 1
+
+
+def test_failed_slice_is_regenerated():
+    backend = SliceBackend([
+        [_question("Where is DNA stored?", "nucleus"), _question("What do ribosomes build?", "proteins")],
+        TransientBackendError("down"),
+        [_question("What does the Krebs cycle produce?", "ATP"), _question("What carries oxygen in blood?", "hemoglobin")]
+    ])
+    tutor = CrossDomainTutor("physics", "biology", backend=backend, test_generation_mode="parallel", test_questions=4)
+    assert tutor.generate_test(1)["total_questions"] == 4
@@ -0,0 +1,57 @@
+"""Tests for the fused, two-stage and auto pipeline modes."""
+
+import pytest
+
+from explanation_cache import ExplanationCache
+from llm_backends import FakeBackend
+from tutor_pipeline import FUSED_MAX_QUERY_WORDS, CrossDomainTutor
+
+
+def _tutor(mode, **kwargs):
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)
+    return CrossDomainTutor("physics", "biology", backend=backend, pipeline_mode=mode, **kwargs)
+
+
+def _stages(tutor):
+    return [stage["stage"] for stage in tutor.last_run["stages"]]
+
+
+def test_two_stage_mode_explains_then_adapts():
+    tutor = _tutor("two_stage")
+    assert tutor.get_explanation("What is a cell?")
+    assert _stages(tutor) == ["expert", "adapter"]
+
+
+def test_fused_mode_makes_one_call():
+    tutor = _tutor("fused")
+    assert tutor.get_explanation("What is a cell?")
+    assert tutor.last_run["mode"] == "fused"
+    assert _stages(tutor) == ["fused"]
+
+
+def test_auto_mode_fuses_only_short_questions_without_code():
+    tutor = _tutor("auto")
+    tutor.get_explanation("What is a cell?")
+    assert tutor.last_run["mode"] == "fused"
+
+    tutor.get_explanation(" ".join(["word"] * (FUSED_MAX_QUERY_WORDS + 1)) + "?")
+    assert tutor.last_run["mode"] == "two_stage"
+
+    tutor.get_explanation("Why does ```x = 1``` work?")
+    assert _stages(tutor) == ["expert", "adapter"]
+
+
+def test_fused_stream_matches_its_cached_answer():
+    cache = ExplanationCache()
+    tutor = _tutor("fused", cache=cache)
+    streamed = "".join(tutor.stream_explanation("What is a cell?"))
+    assert _stages(tutor) == ["fused"]
+
+    again = _tutor("fused", cache=cache)
+    assert again.get_explanation("What is a cell?") == streamed
+    assert again.last_run["cache_hit"]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        _tutor("three_stage")
@@ -0,0 +1,91 @@
+"""Tests for the offline curriculum prefill and its store."""
+
+import asyncio
+import json
+
+import pytest
+
+import prefill
+from explanation_cache import ADAPTED_TIER, TARGET_TIER
+from llm_backends import FakeBackend
+from prefill_store import PrefillStore, prompt_version
+from tutor_pipeline import CrossDomainTutor
+
+CURRICULUM = [("Python", "Rust", ["What is ownership?", "What is borrowing?"]), ("Java", "Rust", ["What is ownership?"])]
+
+
+def _backend(**kwargs):
+    return FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0, **kwargs)
+
+
+def test_curriculum_drops_repeated_topics_and_rejects_bad_files(tmp_path):
+    path = tmp_path / "curriculum.json"
+    path.write_text(json.dumps({"pairs": [{"source_field": "Python", "target_field": "Rust", "topics": ["What is ownership?", " what is OWNERSHIP ", ""]}]}))
+    assert prefill.load_curriculum(str(path)) == [("Python", "Rust", ["What is ownership?"])]
+    path.write_text(json.dumps({"pairs": [{"source_field": "Python", "topics": []}]}))
+    with pytest.raises(ValueError):
+        prefill.load_curriculum(str(path))
+
+
+def test_expert_explanations_are_shared_and_a_rerun_skips_everything():
+    store = PrefillStore()
+    backend = _backend()
+    counts = asyncio.run(prefill.prefill(CURRICULUM, store, backend, concurrency=4))
+    assert counts == {"topics": 3, "generated": 3, "skipped": 0, "failed": 0}
+    # Two expert explanations for the Rust topics, one adapted explanation per topic
+    assert backend.calls == 5
+    assert store.stats() == {TARGET_TIER: 2, ADAPTED_TIER: 3}
+    rerun = asyncio.run(prefill.prefill(CURRICULUM, store, backend))
+    assert rerun["skipped"] == 3
+    assert backend.calls == 5
+
+
+def test_a_preset_change_makes_only_affected_tiers_stale():
+    default_target = prompt_version(TARGET_TIER, "Python", "Rust")
+    default_adapted = prompt_version(ADAPTED_TIER, "Python", "Rust")
+    assert prompt_version(TARGET_TIER, "Python", "Rust", {"adapter": "python"}) == default_target
+    assert prompt_version(ADAPTED_TIER, "Python", "Rust", {"adapter": "python"}) != default_adapted
+    assert prompt_version(TARGET_TIER, "Python", "Rust", {"expert": "rust"}) != default_target
+
+    store = PrefillStore()
+    asyncio.run(prefill.prefill(CURRICULUM[:1], store, _backend()))
+    backend = _backend()
+    counts = asyncio.run(prefill.prefill(CURRICULUM[:1], store, backend, prompt_presets={"adapter": "python"}))
+    assert counts["generated"] == 2
+    # The expert explanations are still current, so only the adapter runs again
+    assert backend.calls == 2
+
+
+def test_empty_or_truncated_answers_are_not_stored():
+    store = PrefillStore()
+    counts = asyncio.run(prefill.prefill(CURRICULUM[:1], store, _backend(responder=lambda model, messages: " ")))
+    assert counts["failed"] == 2
+    assert store.stats() == {TARGET_TIER: 0, ADAPTED_TIER: 0}
+    long_answer = _backend(responder=lambda model, messages: "word " * 20000)
+    assert asyncio.run(prefill.prefill(CURRICULUM[:1], store, long_answer))["failed"] == 2
+
+
+def test_live_tutor_serves_prefilled_topics_without_calls():
+    store = PrefillStore()
+    asyncio.run(prefill.prefill(CURRICULUM, store, _backend()))
+    backend = _backend()
+    tutor = CrossDomainTutor("Python", "Rust", backend=backend, prefill_store=store)
+    assert tutor.get_explanation("what is ownership") == store.get(ADAPTED_TIER, tutor._adapted_key("What is ownership?", []), tutor._prefill_version)
+    assert backend.calls == 0
+
+
+def test_dry_run_logs_each_request_once_across_resumed_runs(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(prefill, "FakeBackend", _backend)
+    curriculum = tmp_path / "curriculum.json"
+    curriculum.write_text(json.dumps({"pairs": [{"source_field": s, "target_field": t, "topics": topics} for s, t, topics in CURRICULUM]}))
+    batch_file = tmp_path / "batch.jsonl"
+    argv = [str(curriculum), "--store", str(tmp_path / "prefill.db"), "--batch-file", str(batch_file), "--backend", "fake"]
+    prefill.main(argv)
+    assert json.loads(capsys.readouterr().out)["generated"] == 3
+    prefill.main(argv)
+    assert json.loads(capsys.readouterr().out)["skipped"] == 3
+    with open(batch_file, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 5
+    assert len({line["custom_id"] for line in lines}) == 5
+    assert all(line["url"] == prefill.BATCH_URL for line in lines)
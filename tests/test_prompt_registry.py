@@ -0,0 +1,78 @@
+"""Tests for prompt rendering, presets and the prompt versions caches are keyed by."""
+
+import pytest
+
+from explanation_cache import ExplanationCache
+from llm_backends import FakeBackend
+from prompts.python_adapter import PYTHON_ADAPTER_PROMPT
+from prompts.registry import PromptRegistry, fingerprint, parse_presets
+from tutor_pipeline import CrossDomainTutor
+
+
+class CountingCounter:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return len(text.split())
+
+
+def test_prompts_are_rendered_and_counted_once():
+    counter = CountingCounter()
+    registry = PromptRegistry(token_counter=counter)
+    first = registry.render("test_generator", "physics", "biology", difficulty_level=2, num_questions=5)
+    assert registry.render("test_generator", "physics", "biology", num_questions=5, difficulty_level=2) is first
+    assert registry.render("test_generator", "physics", "biology", difficulty_level=3, num_questions=5) is not first
+    assert registry.count_tokens(first.text) == first.tokens == len(first.text.split())
+    assert len(counter.texts) == 2
+    assert first.version == fingerprint(first.text)
+
+
+def test_least_recently_used_prompts_are_evicted():
+    registry = PromptRegistry(token_counter=len, max_entries=2)
+    expert = registry.render("expert", "physics", "biology")
+    chemistry = registry.render("expert", "physics", "chemistry")
+    registry.render("expert", "physics", "biology")
+    registry.render("expert", "physics", "geology")
+    assert registry.render("expert", "physics", "biology") is expert
+    assert registry.render("expert", "physics", "chemistry") is not chemistry
+
+
+def test_presets_are_parsed_and_checked():
+    assert parse_presets(" expert=rust , adapter=python") == {"expert": "rust", "adapter": "python"}
+    assert parse_presets("") == {}
+    for spec in ("expert", "teacher=field", "adapter=french"):
+        with pytest.raises(ValueError):
+            parse_presets(spec)
+    registry = PromptRegistry(token_counter=len)
+    assert registry.presets({"adapter": "language"})["adapter"] == "language"
+    with pytest.raises(ValueError):
+        registry.render("expert", "python", "rust", preset="go")
+
+
+def test_fused_prompt_is_composed_of_the_selected_presets():
+    registry = PromptRegistry(token_counter=len)
+    presets = registry.presets({"expert": "rust", "adapter": "python"})
+    fused = registry.render_selected("fused", "Python", "Rust", presets).text
+    assert registry.render_selected("expert", "Python", "Rust", presets).text in fused
+    assert PYTHON_ADAPTER_PROMPT in fused
+    assert fused != registry.render_selected("fused", "Python", "Rust", registry.presets()).text
+
+
+def test_tutor_sends_the_selected_preset_and_keys_its_cache_by_prompt_version():
+    system_prompts = []
+
+    def respond(model, messages):
+        system_prompts.append(messages[0]["content"])
+        return "An explanation."
+
+    cache = ExplanationCache()
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0, responder=respond)
+    CrossDomainTutor("Python", "Rust", backend=backend, cache=cache).get_explanation("What is ownership?")
+    assert backend.calls == 2
+    tutor = CrossDomainTutor("Python", "Rust", backend=backend, cache=cache, prompt_presets={"adapter": "python"})
+    tutor.get_explanation("What is ownership?")
+    # The expert prompt is unchanged, so only the adapted explanation is stale
+    assert backend.calls == 3
+    assert system_prompts[-1] == PYTHON_ADAPTER_PROMPT
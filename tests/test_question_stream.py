@@ -0,0 +1,64 @@
+"""Tests for incremental parsing of streamed test payloads."""
+
+import json
+
+from llm_backends import FakeBackend
+from question_stream import QuestionStreamParser, parse_questions
+from tutor_pipeline import CrossDomainTutor
+
+
+def _question(text):
+    return {
+        "question": text,
+        "options": {"A": "{braces}", "B": "\"quoted\"", "C": "c", "D": "d"},
+        "correct_answer": "B",
+        "explanation": "Because ] ends nothing inside a string.",
+        "source_field_connection": "Like physics."
+    }
+
+
+def _payload(count):
+    return json.dumps({"questions": [_question(f"Question {i}?") for i in range(count)]})
+
+
+def test_each_question_is_handed_out_when_its_closing_brace_arrives():
+    payload = _payload(3)
+    parser = QuestionStreamParser()
+    completed_at = []
+    for i, char in enumerate(payload):
+        for question in parser.feed(char):
+            completed_at.append((i, question["question"]))
+    assert [text for _, text in completed_at] == ["Question 0?", "Question 1?", "Question 2?"]
+    first_end = payload.index("}", payload.index("source_field_connection"))
+    assert completed_at[0][0] == first_end
+    assert parser.questions == json.loads(payload)["questions"]
+
+
+def test_truncated_tail_only_costs_its_own_question():
+    payload = _payload(3)
+    truncated = payload[:payload.rindex("Question 2?") + 5]
+    assert [q["question"] for q in parse_questions(truncated)] == ["Question 0?", "Question 1?"]
+
+
+def test_fences_and_invalid_questions_are_skipped():
+    invalid = dict(_question("Broken?"), correct_answer="E")
+    content = "```json\n" + json.dumps({"questions": [invalid, _question("Fine?")]}) + "\n```\nHope this helps!"
+    assert [q["question"] for q in parse_questions(content)] == ["Fine?"]
+
+
+def test_nothing_after_the_questions_array_is_parsed():
+    content = json.dumps({"questions": [_question("Inside?")], "extra": [_question("Outside?")]})
+    assert [q["question"] for q in parse_questions(content)] == ["Inside?"]
+    assert parse_questions("I cannot write a test.") == []
+
+
+def test_stream_test_yields_questions_before_the_whole_test():
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)
+    tutor = CrossDomainTutor("physics", "biology", backend=backend, test_questions=3)
+    stream = tutor.stream_test(1)
+    first = next(stream)
+    assert tutor.test_history == []
+
+    questions = [first, *stream]
+    assert len(questions) == 3
+    assert tutor.test_history[-1]["questions"] == questions
@@ -0,0 +1,113 @@
+"""Tests for the circuit breaker and retries of ResilientBackend."""
+
+import asyncio
+
+import pytest
+
+from llm_backends import CallStats, Completion, FakeBackend, LLMBackend, TransientBackendError
+from resilience import CircuitBreaker, CircuitOpenError, ResilientBackend
+from scheduler import RequestScheduler
+
+
+class ScriptedBackend(LLMBackend):
+    """Raises the scripted errors in turn, then answers every call."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def complete(self, model, messages, temperature=0.7, **options):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return Completion("ok", model, 1, 1)
+
+    async def acomplete(self, model, messages, temperature=0.7, **options):
+        return self.complete(model, messages, temperature, **options)
+
+
+def _backend(errors, max_retries=0):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=0.0)
+    return ResilientBackend(ScriptedBackend(errors), max_retries=max_retries, breaker=breaker, hedge_ratio=0.0)
+
+
+def test_trial_with_non_retryable_error_releases_the_circuit():
+    backend = _backend([TransientBackendError("down"), ValueError("bad request")])
+    with pytest.raises(TransientBackendError):
+        backend.complete("gpt-4", [])
+    assert backend.breaker.state("gpt-4") == "half_open"
+
+    # The trial fails for a reason that is not the model's fault
+    with pytest.raises(ValueError):
+        backend.complete("gpt-4", [])
+
+    # The next call becomes the trial instead of failing fast forever
+    assert backend.complete("gpt-4", []).content == "ok"
+    assert backend.breaker.state("gpt-4") == "closed"
+
+
+def test_cancelled_async_trial_releases_the_circuit():
+    backend = _backend([TransientBackendError("down")])
+    with pytest.raises(TransientBackendError):
+        backend.complete("gpt-4", [])
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    async def run():
+        backend.backend.acomplete = hang
+        trial = asyncio.ensure_future(backend.acomplete("gpt-4", []))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(run())
+    del backend.backend.acomplete
+    assert backend.complete("gpt-4", []).content == "ok"
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=60.0)
+    backend = ResilientBackend(ScriptedBackend([TransientBackendError("down")]), max_retries=0, breaker=breaker, hedge_ratio=0.0)
+    with pytest.raises(TransientBackendError):
+        backend.complete("gpt-4", [])
+    with pytest.raises(CircuitOpenError):
+        backend.complete("gpt-4", [])
+
+
+def test_retries_are_reported_through_call_stats():
+    backend = _backend([TransientBackendError("down"), TransientBackendError("down")], max_retries=3)
+    backend.backoff_base_s = 0.0
+    backend.breaker.failure_threshold = 5
+    stats = CallStats()
+    assert backend.complete("gpt-4", [], stats=stats).content == "ok"
+    assert stats.retries == 2
+
+
+def test_retries_are_admitted_by_the_scheduler():
+    backend = _backend([TransientBackendError("down"), TransientBackendError("down")], max_retries=3)
+    backend.backoff_base_s = 0.0
+    backend.breaker.failure_threshold = 5
+    scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=None)
+    ticket = scheduler.acquire("interactive", "learner", 100)
+    assert backend.complete("gpt-4", [], ticket=ticket).content == "ok"
+    scheduler.release(ticket, 100)
+    assert scheduler.stats()["interactive"]["admitted"] == 3
+
+
+def test_hedge_is_skipped_when_the_scheduler_is_out_of_requests():
+    backend = _backend([])
+    backend.hedge_ratio = 1.0
+    backend.calls = 1
+    scheduler = RequestScheduler(requests_per_minute=1, tokens_per_minute=None)
+    ticket = scheduler.acquire("interactive", "learner", 100)
+    assert not backend._take_hedge(ticket)
+    assert backend.hedges == 0
+
+
+def test_stream_reports_the_finish_reason_of_the_winner():
+    backend = ResilientBackend(FakeBackend(latency_ms=1, latency_jitter_ms=0, tokens_per_second=0), hedge_ratio=0.0)
+    stats = CallStats()
+    assert "".join(backend.stream("gpt-4", [{"role": "user", "content": "hi"}], max_tokens=3, stats=stats))
+    assert stats.finish_reason == "length"
@@ -0,0 +1,106 @@
+"""Tests for priority classes, tenant fairness and token accounting in the scheduler."""
+
+import asyncio
+
+import pytest
+
+from llm_backends import FakeBackend
+from resilience import DeadlineExceeded
+from scheduler import RequestScheduler, SchedulerOverloaded, request_priority
+from tutor_pipeline import CrossDomainTutor
+
+# No reserves, so that only the queue order decides who goes first
+NO_RESERVES = {"test_generation": 0.0, "background": 0.0}
+
+
+def _admission_order(scheduler, calls):
+    """Queue (priority, tenant, name) calls in order on an empty request bucket and record who gets in."""
+    order = []
+
+    async def call(priority, tenant, name):
+        ticket = await scheduler.aacquire(priority, tenant, 1, timeout=5)
+        order.append(name)
+        scheduler.release(ticket, 1)
+
+    async def run():
+        scheduler.requests.level = 0.0
+        await asyncio.gather(*(call(*spec) for spec in calls))
+
+    asyncio.run(run())
+    return order
+
+
+def test_lower_classes_leave_their_reserve_unused():
+    scheduler = RequestScheduler(requests_per_minute=None, tokens_per_minute=1000)
+    assert scheduler.try_acquire("background", "ada", 400) is not None
+    assert scheduler.try_acquire("background", "ada", 200) is None
+    assert scheduler.try_acquire("test_generation", "ada", 500) is None
+    assert scheduler.try_acquire("interactive", "ada", 500) is not None
+    with pytest.raises(ValueError):
+        scheduler.try_acquire("urgent", "ada", 1)
+
+
+def test_release_refunds_the_unused_estimate():
+    scheduler = RequestScheduler(requests_per_minute=None, tokens_per_minute=1000)
+    ticket = scheduler.try_acquire("interactive", "ada", 900)
+    assert scheduler.try_acquire("interactive", "ada", 500) is None
+    scheduler.release(ticket, 100)
+    scheduler.release(ticket, 100)
+    assert scheduler.tokens.level == pytest.approx(900, abs=1)
+    assert scheduler.try_acquire("interactive", "ada", 500) is not None
+
+
+def test_more_urgent_classes_go_first():
+    scheduler = RequestScheduler(requests_per_minute=6000, tokens_per_minute=None, reserves=NO_RESERVES)
+    order = _admission_order(scheduler, [
+        ("background", "ada", "background"),
+        ("test_generation", "ada", "test"),
+        ("interactive", "ada", "chat")
+    ])
+    assert order == ["chat", "test", "background"]
+    assert scheduler.stats()["background"]["admitted"] == 1
+
+
+def test_tenants_of_a_class_take_turns():
+    scheduler = RequestScheduler(requests_per_minute=6000, tokens_per_minute=None)
+    order = _admission_order(scheduler, [
+        ("interactive", "ada", "ada 1"),
+        ("interactive", "ada", "ada 2"),
+        ("interactive", "ada", "ada 3"),
+        ("interactive", "bob", "bob 1")
+    ])
+    assert order == ["ada 1", "bob 1", "ada 2", "ada 3"]
+
+
+def test_full_queues_and_long_waits_are_rejected():
+    scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=None, max_queue_depth=1)
+    scheduler.requests.level = 0.0
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire("interactive", "ada", 1, timeout=0.01)
+
+    async def run():
+        waiting = asyncio.ensure_future(scheduler.aacquire("interactive", "ada", 1))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(SchedulerOverloaded):
+                await scheduler.aacquire("interactive", "bob", 1)
+        finally:
+            waiting.cancel()
+
+    asyncio.run(run())
+    stats = scheduler.stats()["interactive"]
+    assert (stats["queued"], stats["rejected"]) == (0, 2)
+
+
+def test_tutor_calls_are_admitted_in_their_stage_class():
+    scheduler = RequestScheduler()
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)
+    tutor = CrossDomainTutor("physics", "biology", backend=backend, scheduler=scheduler)
+    tutor.get_explanation("What is a cell?")
+    tutor.generate_test()
+    with request_priority("background"):
+        tutor.get_explanation("What is DNA?")
+    stats = scheduler.stats()
+    assert [stats[priority]["admitted"] for priority in ("interactive", "test_generation", "background")] == [2, 1, 2]
+    # Every estimate was settled against the tokens actually used
+    assert scheduler.tokens.level == pytest.approx(scheduler.tokens.capacity, rel=0.05)
@@ -0,0 +1,71 @@
+"""Tests for the semantic near-duplicate cache and its shared logs."""
+
+import os
+
+import semantic_cache
+from semantic_cache import SemanticCache, question_terms, terms_agree
+
+
+def _fill(cache):
+    cache.insert("python", "rust", "How does the borrow checker work?", "borrowing")
+    cache.insert("python", "rust", "Why are Rust variables immutable by default?", "immutability")
+
+
+def test_rephrased_question_is_served():
+    cache = SemanticCache()
+    _fill(cache)
+    assert cache.lookup("python", "rust", "how does the borrow checker work") == "borrowing"
+    assert cache.lookup("python", "rust", "How does the Rust borrow checker work?") == "borrowing"
+    assert cache.stats()["hits"] == 2
+
+
+def test_negated_or_opposite_question_is_not_served():
+    cache = SemanticCache()
+    _fill(cache)
+    assert cache.lookup("python", "rust", "Why are Rust variables mutable by default?") is None
+    assert cache.lookup("python", "rust", "Why are Rust variables not immutable by default?") is None
+    assert not terms_agree(question_terms("Can I borrow twice?"), question_terms("Can't I borrow twice?"))
+
+
+def test_entries_are_scoped_by_field_pair_and_prompt_version():
+    cache = SemanticCache()
+    cache.insert("python", "rust", "How does the borrow checker work?", "v1 answer", "v1")
+    assert cache.lookup("python", "rust", "How does the borrow checker work?", "v2") is None
+    assert cache.lookup("java", "rust", "How does the borrow checker work?", "v1") is None
+    assert cache.lookup("python", "rust", "How does the borrow checker work?", "v1") == "v1 answer"
+
+
+def test_cold_start_replays_the_log_without_embedding(tmp_path, monkeypatch):
+    _fill(SemanticCache(directory=str(tmp_path)))
+    cold = SemanticCache(directory=str(tmp_path))
+    stored_queries = []
+    embed = cold.embedder.embed
+    monkeypatch.setattr(cold.embedder, "embed", lambda text, ignore=(): stored_queries.append(text) or embed(text, ignore))
+    assert cold.lookup("python", "rust", "how does the borrow checker work") == "borrowing"
+    assert stored_queries == ["how does the borrow checker work"]
+
+
+def test_lookup_sees_inserts_and_evictions_of_other_workers(tmp_path):
+    reader = SemanticCache(directory=str(tmp_path))
+    writer = SemanticCache(directory=str(tmp_path))
+    assert reader.lookup("python", "rust", "How does the borrow checker work?") is None
+    _fill(writer)
+    assert reader.lookup("python", "rust", "How does the borrow checker work?") == "borrowing"
+    writer.evict("python", "rust")
+    assert reader.lookup("python", "rust", "How does the borrow checker work?") is None
+
+
+def test_compaction_keeps_records_appended_by_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "COMPACT_FACTOR", 1)
+    first = SemanticCache(max_entries=4, directory=str(tmp_path))
+    second = SemanticCache(max_entries=4, directory=str(tmp_path))
+    second.insert("python", "rust", "Why are Rust variables immutable by default?", "immutability")
+    for _ in range(6):
+        first.insert("python", "rust", "How does the borrow checker work?", "borrowing")
+    [log] = [name for name in os.listdir(tmp_path) if name.endswith(".jsonl")]
+    with open(tmp_path / log, encoding="utf-8") as f:
+        assert len(f.readlines()) < 7
+
+    fresh = SemanticCache(directory=str(tmp_path))
+    assert fresh.lookup("python", "rust", "Why are Rust variables immutable by default?") == "immutability"
+    assert fresh.lookup("python", "rust", "How does the borrow checker work?") == "borrowing"
@@ -0,0 +1,68 @@
+"""Tests for the durable session store and tutors that share it."""
+
+from llm_backends import FakeBackend
+from session_store import SessionStore, decode_test, encode_test
+from tutor_pipeline import CrossDomainTutor
+
+
+def _tutor(store, **kwargs):
+    backend = FakeBackend(latency_ms=0, latency_jitter_ms=0, tokens_per_second=0)
+    return CrossDomainTutor("physics", "biology", backend=backend, session_store=store, learner_id="ada", **kwargs)
+
+
+def test_every_write_advances_the_revision():
+    store = SessionStore()
+    assert store.load("ada", "physics", "biology") is None
+    assert store.save("ada", "physics", "biology", current_difficulty=2) == 1
+    assert store.append_turns("ada", "physics", "biology", [{"role": "user", "content": "hi"}], window_turns=1) == 2
+    assert store.append_test("ada", "Physics ", "biology", {"questions": []}) == 3
+    assert store.load("ada", "physics", "biology") == {"current_difficulty": 2, "summary": "", "window_turns": 1, "revision": 3}
+
+
+def test_turns_and_tests_are_trimmed_oldest_first():
+    store = SessionStore(max_turns=3, max_tests=2)
+    store.append_turns("ada", "physics", "biology", [{"role": "user", "content": str(i)} for i in range(5)])
+    for i in range(3):
+        store.append_test("ada", "physics", "biology", {"questions": [], "n": i})
+    assert [turn["content"] for turn in store.recent_turns("ada", "physics", "biology", 10)] == ["2", "3", "4"]
+    assert [turn["content"] for turn in store.recent_turns("ada", "physics", "biology", 1, offset=1)] == ["3"]
+    assert [test["n"] for test in store.tests("ada", "physics", "biology")] == [1, 2]
+    assert store.turn_count("ada", "physics", "biology") == 3
+
+
+def test_idle_sessions_are_purged():
+    store = SessionStore(ttl_seconds=0.0)
+    store.append_turns("ada", "physics", "biology", [{"role": "user", "content": "hi"}])
+    assert store.purge_expired() == 1
+    assert store.load("ada", "physics", "biology") is None
+    assert store.turn_count("ada", "physics", "biology") == 0
+
+
+def test_tests_are_stored_compactly():
+    test_data = {"questions": [{"question": "Qu'est-ce qu'une cellule ?", "options": {"A": " " * 50}}]}
+    payload = encode_test(test_data)
+    assert decode_test(payload) == test_data
+    assert len(payload) < len(str(test_data))
+
+
+def test_tutor_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    tutor = _tutor(SessionStore(path))
+    tutor.get_explanation("What is a cell?")
+    tutor.current_difficulty = 3
+    tutor.generate_test()
+
+    restarted = _tutor(SessionStore(path))
+    assert [turn["content"] for turn in restarted.conversation_history][0] == "What is a cell?"
+    assert restarted.current_difficulty == 3
+    assert len(restarted.test_history) == 1
+
+
+def test_tutor_reloads_turns_written_by_another_worker(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    first = _tutor(SessionStore(path))
+    second = _tutor(SessionStore(path))
+    first.get_explanation("What is a cell?")
+    assert len(second.conversation_history) == 2
+    second.get_explanation("What is DNA?")
+    assert [turn["content"] for turn in first.conversation_history if turn["role"] == "user"] == ["What is a cell?", "What is DNA?"]
@@ -0,0 +1,111 @@
+"""Tests for serving, retiring, refilling and persisting pooled tests."""
+
+import itertools
+import time
+
+import pytest
+
+import test_bank
+from test_bank import TestBank, fingerprint_test, validate_test
+
+_numbers = itertools.count()
+
+
+def _question(text):
+    return {
+        "question": text,
+        "options": {"A": "yes", "B": "no", "C": "maybe", "D": "never"},
+        "correct_answer": "A",
+        "explanation": "Because.",
+        "source_field_connection": "Like physics."
+    }
+
+
+def _generate(difficulty):
+    return {"questions": [_question(f"Question {next(_numbers)} at level {difficulty}?")]}
+
+
+def _fill(bank, count, variant=""):
+    for _ in range(count):
+        bank.add_test("physics", "biology", 1, "author", _generate(1), variant)
+
+
+def test_validate_test_rejects_incomplete_questions():
+    assert validate_test(_generate(1))
+    broken = _generate(1)
+    broken["questions"][0]["correct_answer"] = "E"
+    assert not validate_test(broken)
+    assert not validate_test({"questions": []})
+
+
+def test_learner_is_never_served_the_same_test_twice():
+    bank = TestBank(max_serves=10)
+    _fill(bank, 2)
+    first = bank.take_test("physics", "biology", 1, "learner")
+    second = bank.take_test("physics", "biology", 1, "learner")
+    assert fingerprint_test(first) != fingerprint_test(second)
+    assert bank.take_test("physics", "biology", 1, "learner") is None
+    assert bank.take_test("physics", "biology", 1, "other learner") is not None
+
+
+def test_tests_are_retired_after_max_serves():
+    bank = TestBank(max_serves=2)
+    _fill(bank, 1)
+    assert bank.take_test("physics", "biology", 1, "learner") is not None
+    assert bank.take_test("physics", "biology", 1, "other learner") is None
+    assert bank.stats()["pooled_tests"] == 0
+
+
+def test_tests_of_another_variant_are_never_served():
+    bank = TestBank()
+    _fill(bank, 1, variant="3 questions")
+    assert bank.take_test("physics", "biology", 1, "learner", variant="5 questions") is None
+    assert bank.take_test("physics", "biology", 1, "learner", variant="3 questions") is not None
+
+
+def test_low_pool_is_refilled_in_the_background():
+    bank = TestBank(target_size=4, low_water=2)
+    test_data = bank.get_test("physics", "biology", 1, "learner", _generate)
+    bank.close()
+    assert validate_test(test_data)
+    assert bank.stats()["generated_on_demand"] == 1
+    assert bank.stats()["pooled_tests"] == 4
+    assert not bank.request_refill("physics", "biology", 1, _generate)
+
+
+def test_invalid_output_is_regenerated_before_serving():
+    outputs = iter([{"questions": []}, _generate(1)])
+    bank = TestBank(low_water=0)
+    assert validate_test(bank.get_test("physics", "biology", 1, "learner", lambda level: next(outputs)))
+
+    bank = TestBank(low_water=0)
+    with pytest.raises(ValueError):
+        bank.get_test("physics", "biology", 1, "learner", lambda level: {"questions": []})
+
+
+def test_pools_and_seen_tests_survive_a_restart(tmp_path):
+    path = str(tmp_path / "bank.json")
+    bank = TestBank(path, max_serves=10)
+    _fill(bank, 2)
+    served = bank.take_test("physics", "biology", 1, "learner")
+    bank.close()
+    assert not list(tmp_path.glob("*.tmp"))
+
+    restarted = TestBank(path, max_serves=10)
+    assert restarted.stats()["pooled_tests"] == 2
+    next_test = restarted.take_test("physics", "biology", 1, "learner")
+    assert fingerprint_test(next_test) != fingerprint_test(served)
+
+
+def test_changes_are_saved_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(test_bank, "SAVE_INTERVAL_S", 0.2)
+    path = tmp_path / "bank.json"
+    bank = TestBank(str(path))
+    _fill(bank, 1)
+    bank.take_test("physics", "biology", 1, "learner")
+    assert not path.exists()
+
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert TestBank(str(path)).stats()["pooled_tests"] == 1
@@ -0,0 +1,59 @@
+"""Tests for session-scoped tutor reuse and the shared client."""
+
+from tutor_registry import TutorRegistry, create_shared_async_client, create_shared_client
+
+
+class StubTutor:
+    """Records how it was created instead of talking to a model."""
+
+    def __init__(self, source_field, target_field, client=None, learner_id="default", **kwargs):
+        self.fields = (source_field, target_field)
+        self.client = client
+        self.learner_id = learner_id
+        self.kwargs = kwargs
+
+
+def _registry(**kwargs):
+    clients = []
+    registry = TutorRegistry(client_factory=lambda: clients.append(object()) or clients[-1], tutor_factory=StubTutor, **kwargs)
+    return registry, clients
+
+
+def test_session_gets_the_same_tutor_back():
+    registry, _ = _registry(cache="shared cache")
+    tutor = registry.get("session", "physics", "biology")
+    assert registry.get("session", " physics ", "biology ") is tutor
+    assert registry.get("session", "physics", "chemistry") is not tutor
+    assert registry.get("other session", "physics", "biology") is not tutor
+    assert tutor.learner_id == "session"
+    assert tutor.kwargs == {"cache": "shared cache"}
+
+
+def test_every_tutor_shares_one_client():
+    registry, clients = _registry()
+    tutors = [registry.get(f"session {i}", "physics", "biology") for i in range(3)]
+    assert len(clients) == 1
+    assert all(tutor.client is clients[0] for tutor in tutors)
+
+
+def test_idle_tutors_are_evicted():
+    registry, _ = _registry(idle_timeout=0.0)
+    registry.get("session", "physics", "biology")
+    assert registry.evict_idle() == 1
+    assert len(registry) == 0
+
+
+def test_removing_a_session_drops_all_its_tutors():
+    registry, _ = _registry()
+    registry.get("session", "physics", "biology")
+    registry.get("session", "physics", "chemistry")
+    registry.get("other session", "physics", "biology")
+    registry.remove_session("session")
+    assert len(registry) == 1
+
+
+def test_clients_can_leave_retries_to_the_resilient_backend(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assert create_shared_client(max_retries=0).max_retries == 0
+    assert create_shared_async_client(max_retries=0).max_retries == 0
+    assert create_shared_client().max_retries == 2
@@ -4,85 +4,454 @@ This module implements a two-step pipeline for helping professionals learn new f
 through explanations adapted to their current area of expertise.
 """
 
-import json
-from typing import Dict, List, Optional, Tuple
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from openai import OpenAI
-from prompts import get_expert_prompt, get_adapter_prompt, get_test_generator_prompt
+from context_window import MESSAGE_OVERHEAD_TOKENS, ContextWindow, count_tokens, extractive_summary
+from llm_backends import CallStats, LLMBackend, OpenAIBackend
+from explanation_cache import ADAPTED_TIER, TARGET_TIER, ExplanationCache, adapted_key, target_key
+from grading import MAX_DIFFICULTY, encode_answer_key, encode_submissions, grade_submissions
+from instrumentation import Instrumentation, estimate_cost
+from model_router import STRONG_MODEL, ModelRouter, context_limit, validate_draft
+from prefill_store import PrefillStore, prompt_version
+from question_stream import QuestionStreamParser, parse_questions
+from resilience import LatencyBudget
+from scheduler import RequestScheduler, Ticket, current_priority, estimate_call_tokens, request_priority
+from semantic_cache import SemanticCache
+from session_store import SessionStore
+from test_bank import TestBank, drop_near_duplicates, fingerprint_test
+from prompts.registry import PromptRegistry, RenderedPrompt, default_registry
+
+# Default token budget for the conversation context spliced into each prompt
+CONTEXT_TOKEN_BUDGET = 1500
+
+# Pipeline modes: expert then adapter calls, one combined call, or chosen per query
+PIPELINE_MODES = ("two_stage", "fused", "auto")
+
+# In "auto" mode, queries of up to this many words without code use the fused pipeline
+FUSED_MAX_QUERY_WORDS = 15
+
+# Cheaper model used to fold old turns into the rolling conversation summary
+SUMMARY_MODEL = "gpt-3.5-turbo"
+
+# Threads that fold old turns into the summary, so a summarizer call never delays an answer
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="summarizer")
+
+# Minimum size of an expert section before it is handed to the adapter when streaming
+MIN_SECTION_CHARS = 200
+
+# Number of questions in a generated test
+TEST_QUESTION_COUNT = 5
+
+# Test generation modes: one call for the whole test, or concurrent calls for slices of it
+TEST_GENERATION_MODES = ("single", "parallel")
+
+# Questions requested by each call in the parallel test generation mode
+PARALLEL_SLICE_SIZE = 2
+
+# Maximum number of concurrent calls for one test in the parallel mode
+MAX_PARALLEL_TEST_REQUESTS = 10
+
+# Angles assigned to the slices of a parallel test so they cover different ground
+QUESTION_ANGLES = (
+    "core terminology",
+    "fundamental principles",
+    "practical scenarios",
+    "common mistakes and misconceptions",
+    "comparisons with familiar concepts",
+    "reading and reasoning about examples",
+    "design trade-offs",
+    "troubleshooting",
+    "edge cases",
+    "how the ideas combine"
+)
+
+# How many follow-up calls may top up a test whose output was partly malformed
+MAX_TEST_REPAIRS = 2
+
+# Completion tokens an explanation stage may generate
+STAGE_MAX_TOKENS = {"expert": 1500, "adapter": 1500, "fused": 2000}
+
+# Completion tokens the adapter may generate per token of the text it adapts, when that is above its stage limit
+ADAPTER_TOKENS_PER_INPUT_TOKEN = 1.5
+
+# Stages whose answer, if cut off at max_tokens, must not be cached in each tier
+TRUNCATION_SPOILS = {TARGET_TIER: ("expert",), ADAPTED_TIER: ("expert", "adapter", "fused")}
+
+# Completion tokens allowed per test question, plus a margin for the JSON around them
+TEST_TOKENS_PER_QUESTION = 300
+TEST_ENVELOPE_TOKENS = 100
+
+# Fewest completion tokens a prompt must leave room for in the model's context window
+MIN_COMPLETION_TOKENS = 256
+
+
+def _find_section_break(text: str, min_chars: int) -> int:
+    """Find the end of the first complete paragraph that is safe to adapt.
+    
+    A paragraph break inside a fenced code block is not a section boundary,
+    so code examples are always handed to the adapter whole.
+    
+    Args:
+        text (str): The streamed text received so far.
+        min_chars (int): The minimum section length before a break is accepted.
+        
+    Returns:
+        int: The index just past the paragraph break, or -1 if there is none yet.
+    """
+    start = min_chars
+    while True:
+        position = text.find("\n\n", start)
+        if position < 0:
+            return -1
+        if text.count("```", 0, position) % 2 == 0:
+            return position + 2
+        start = position + 2
+
+
+def _iter_sections(fragments: Iterable[str], min_chars: int = MIN_SECTION_CHARS) -> Iterator[str]:
+    """Group streamed text fragments into completed paragraphs.
+    
+    Args:
+        fragments (Iterable[str]): Text fragments in arrival order.
+        min_chars (int): The minimum size of a section.
+        
+    Yields:
+        str: Completed sections; the final one may be a partial paragraph.
+    """
+    buffer = ""
+    for fragment in fragments:
+        buffer += fragment
+        while True:
+            split_at = _find_section_break(buffer, min_chars)
+            if split_at < 0:
+                break
+            yield buffer[:split_at]
+            buffer = buffer[split_at:]
+    if buffer.strip():
+        yield buffer
+
 
 class CrossDomainTutor:
     """A tutor that helps professionals learn new fields through adapted explanations."""
     
-    def __init__(self, source_field: str, target_field: str):
+    def __init__(
+        self,
+        source_field: str,
+        target_field: str,
+        cache: Optional[ExplanationCache] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        client: Optional[OpenAI] = None,
+        test_bank: Optional[TestBank] = None,
+        learner_id: str = "default",
+        context_token_budget: int = CONTEXT_TOKEN_BUDGET,
+        pipeline_mode: str = "two_stage",
+        backend: Optional[LLMBackend] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        test_questions: int = TEST_QUESTION_COUNT,
+        test_generation_mode: str = "single",
+        session_store: Optional[SessionStore] = None,
+        router: Optional[ModelRouter] = None,
+        latency_budget: Optional[LatencyBudget] = None,
+        prefill_store: Optional[PrefillStore] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        prompt_registry: Optional[PromptRegistry] = None,
+        prompt_presets: Optional[Dict[str, str]] = None
+    ):
         """Initialize the tutor.
         
         Args:
             source_field (str): The field the user is proficient in.
             target_field (str): The field the user wants to learn about.
+            cache (Optional[ExplanationCache]): A shared cache for expert and adapted explanations.
+            semantic_cache (Optional[SemanticCache]): A shared cache matching near-duplicate questions.
+            client (Optional[OpenAI]): The OpenAI client for the default backend; a new one is created if omitted.
+            test_bank (Optional[TestBank]): A shared pool of pre-generated tests.
+            learner_id (str): Identifies the learner, so the test bank never repeats a test.
+            context_token_budget (int): The token budget for conversation context in prompts.
+            pipeline_mode (str): "two_stage", "fused" or "auto" (see PIPELINE_MODES).
+            backend (Optional[LLMBackend]): The LLM backend; defaults to OpenAI through the client.
+            instrumentation (Optional[Instrumentation]): Receives a call record for every LLM call and cache hit.
+            test_questions (int): The number of questions in a generated test.
+            test_generation_mode (str): "single" or "parallel" (see TEST_GENERATION_MODES).
+            session_store (Optional[SessionStore]): Keeps the conversation, tests and difficulty
+                level out of process memory and shares them between workers.
+            router (Optional[ModelRouter]): Picks a fast or strong model per stage and query;
+                every stage uses STRONG_MODEL if omitted.
+            latency_budget (Optional[LatencyBudget]): Gives each call a deadline from its stage's
+                share of the end-to-end budget; calls have no deadline if omitted.
+            prefill_store (Optional[PrefillStore]): Curriculum explanations generated offline,
+                checked before the caches.
+            scheduler (Optional[RequestScheduler]): The process-wide scheduler every call waits
+                for, by priority class and learner; calls are sent at once if omitted.
+            prompt_registry (Optional[PromptRegistry]): Renders and counts the system prompts;
+                defaults to the registry shared by the process.
+            prompt_presets (Optional[Dict[str, str]]): The prompt preset per role, e.g.
+                {"expert": "rust"}; other roles use their default (see prompts.registry.PROMPT_PRESETS).
+            
+        Raises:
+            ValueError: If the pipeline mode, test generation mode or a prompt preset is unknown.
         """
+        if pipeline_mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {pipeline_mode}")
+        if test_generation_mode not in TEST_GENERATION_MODES:
+            raise ValueError(f"Unknown test generation mode: {test_generation_mode}")
         self.source_field = source_field
         self.target_field = target_field
-        self.client = OpenAI()
-        self.conversation_history: List[Dict[str, str]] = []
-        self.test_history: List[Dict] = []
-        self.current_difficulty = 1
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.test_bank = test_bank
+        self.learner_id = learner_id
+        if backend is None:
+            backend = OpenAIBackend(client=client if client is not None else OpenAI())
+        self.backend = backend
+        self.instrumentation = instrumentation
+        self.context = ContextWindow(token_budget=context_token_budget)
+        self._compaction: Optional[Future] = None
+        self.session_store = session_store
+        self._test_history: List[Dict] = []
+        self._current_difficulty = 1
+        self._session_revision = -1
+        self.pipeline_mode = pipeline_mode
+        self.test_questions = test_questions
+        self.test_generation_mode = test_generation_mode
+        self.router = router
+        self.latency_budget = latency_budget
+        self.prefill_store = prefill_store
+        self.scheduler = scheduler
+        self.prompts = prompt_registry if prompt_registry is not None else default_registry()
+        self.prompt_presets = self.prompts.presets(prompt_presets)
+        # Exact-cache entries and prefilled answers are only valid for the prompts that wrote them
+        self._prompt_versions = {
+            tier: prompt_version(tier, source_field, target_field, self.prompt_presets, self.prompts)
+            for tier in (TARGET_TIER, ADAPTED_TIER)
+        }
+        self._prefill_version = self._prompt_versions[ADAPTED_TIER]
+        self.last_run: Dict = {}
         
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """The recent conversation turns kept within the context budget."""
+        self._sync_session()
+        return self.context.turns
+    
+    @property
+    def test_history(self) -> List[Dict]:
+        """The tests taken so far, oldest first (the retained ones, with a session store)."""
+        if self.session_store is not None:
+            return self.session_store.tests(self.learner_id, self.source_field, self.target_field)
+        return self._test_history
+    
+    @property
+    def current_difficulty(self) -> int:
+        """The difficulty level (1-5) of the next test."""
+        if self.session_store is not None:
+            state = self.session_store.load(self.learner_id, self.source_field, self.target_field)
+            if state is not None:
+                return state["current_difficulty"]
+        return self._current_difficulty
+    
+    @current_difficulty.setter
+    def current_difficulty(self, level: int) -> None:
+        self._current_difficulty = level
+        if self.session_store is not None:
+            self._advance_revision(
+                self.session_store.save(self.learner_id, self.source_field, self.target_field, current_difficulty=level)
+            )
+    
     def get_explanation(self, query: str) -> str:
         """Get an explanation adapted to the user's field of expertise.
         
+        Details of the run (pipeline mode, latency and token usage) are stored in last_run.
+        
         Args:
             query (str): The user's question about the target field.
             
         Returns:
             str: An explanation adapted to the user's field.
         """
-        # Step 1: Generate detailed explanation in target field
-        target_explanation = self._generate_target_explanation(query)
+        started = time.perf_counter()
+        recent_context = self._recent_context()
+        run = self._new_run(query, recent_context)
         
-        # Step 2: Adapt the explanation for the source field
-        adapted_explanation = self._adapt_for_source_field(target_explanation)
+        adapted_explanation = self._lookup_adapted(query, recent_context, run)
+        
+        if adapted_explanation is None and run["mode"] == "fused":
+            # Explain and adapt in a single call
+            adapted_explanation = self._complete("fused", self._fused_messages(query, recent_context), run)
+        elif adapted_explanation is None:
+            # Step 1: Generate detailed explanation in target field
+            target_explanation = self._cache_get(TARGET_TIER, self._target_key(query, recent_context))
+            if target_explanation is not None:
+                self._record_cache_hit(run, "expert", "exact")
+            else:
+                target_explanation = self._generate_target_explanation(query, run)
+                self._cache_set(TARGET_TIER, self._target_key(query, recent_context), target_explanation, run)
+            
+            # Step 2: Adapt the explanation for the source field
+            adapted_explanation = self._adapt_for_source_field(target_explanation, run)
+        
+        if not run["cache_hit"]:
+            self._cache_set(ADAPTED_TIER, self._adapted_key(query, recent_context), adapted_explanation, run)
+            self._semantic_insert(query, recent_context, adapted_explanation, run)
         
         # Update conversation history
-        self.conversation_history.append({
-            "role": "user",
-            "content": query
-        })
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": adapted_explanation
-        })
+        self._record_exchange(query, adapted_explanation)
+        self._finish_run(run, started)
         
         return adapted_explanation
     
-    def generate_test(self) -> Dict:
-        """Generate a test with 5 MCQs at the current difficulty level.
+    def stream_explanation(self, query: str) -> Iterator[str]:
+        """Stream an explanation adapted to the user's field of expertise.
         
+        In the two-stage mode the expert explanation is streamed on a background
+        thread. As soon as it has produced complete paragraphs, the adapter starts on
+        them, so adapted tokens reach the caller while the expert answer is still being
+        written. Details of the run are stored in last_run once the stream ends.
+        
+        Args:
+            query (str): The user's question about the target field.
+            
+        Yields:
+            str: Fragments of the adapted explanation as they arrive.
+        """
+        started = time.perf_counter()
+        recent_context = self._recent_context()
+        run = self._new_run(query, recent_context, streaming=True)
+        
+        cached = self._lookup_adapted(query, recent_context, run)
+        if cached is not None:
+            yield cached
+            self._record_exchange(query, cached)
+            self._finish_run(run, started)
+            return
+        
+        if run["mode"] == "fused":
+            fragments = self._stream_completion("fused", self._fused_messages(query, recent_context), run)
+        else:
+            fragments = self._stream_two_stage(query, recent_context, run)
+        
+        adapted_parts: List[str] = []
+        for fragment in fragments:
+            adapted_parts.append(fragment)
+            yield fragment
+        
+        # Update cache and conversation history
+        adapted_explanation = "".join(adapted_parts).strip()
+        self._cache_set(ADAPTED_TIER, self._adapted_key(query, recent_context), adapted_explanation, run)
+        self._semantic_insert(query, recent_context, adapted_explanation, run)
+        self._record_exchange(query, adapted_explanation)
+        self._finish_run(run, started)
+    
+    def generate_test(self, difficulty_level: Optional[int] = None) -> Dict:
+        """Generate a test with test_questions MCQs at the current difficulty level.
+        
+        Args:
+            difficulty_level (Optional[int]): The difficulty level (1-5); defaults to the current level.
+            
         Returns:
             Dict: A dictionary containing the test questions and metadata.
         """
-        # Get the test generator prompt
-        prompt = get_test_generator_prompt(
-            self.source_field,
-            self.target_field,
-            self.current_difficulty
-        )
+        difficulty_level = difficulty_level or self.current_difficulty
         
-        # Generate the test
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": "Generate a test with 5 MCQs."}
-            ],
-            temperature=0.7
-        )
+        # Serve a ready test from the bank, or generate one
+        if self.test_bank is not None:
+            test_data = self.test_bank.get_test(
+                self.source_field,
+                self.target_field,
+                difficulty_level,
+                self.learner_id,
+                self._create_test,
+                self._test_variant(difficulty_level)
+            )
+        else:
+            test_data = self._create_test(difficulty_level)
+        self._record_test(test_data)
+        return test_data
+    
+    def stream_test(self, difficulty_level: Optional[int] = None) -> Iterator[Dict]:
+        """Stream a test with test_questions MCQs question by question.
         
-        # Parse the response
-        try:
-            test_data = json.loads(response.choices[0].message.content)
-            self.test_history.append(test_data)
-            return test_data
-        except json.JSONDecodeError:
-            raise ValueError("Failed to generate a valid test format")
+        Each question is yielded as soon as the generator has finished writing it. A
+        ready test from the test bank is yielded at once. When the stream ends, the
+        complete test is appended to test_history.
+        
+        Args:
+            difficulty_level (Optional[int]): The difficulty level (1-5); defaults to the current level.
+            
+        Yields:
+            Dict: The test questions, in order.
+            
+        Raises:
+            ValueError: If no valid question could be generated.
+        """
+        difficulty_level = difficulty_level or self.current_difficulty
+        test_data = None
+        if self.test_bank is not None:
+            test_data = self.test_bank.take_test(
+                self.source_field,
+                self.target_field,
+                difficulty_level,
+                self.learner_id,
+                self._test_variant(difficulty_level)
+            )
+        
+        if test_data is not None:
+            yield from test_data["questions"]
+        else:
+            route = self._route_test(difficulty_level)
+            if self.test_generation_mode == "parallel":
+                generated = self._iter_parallel_questions(difficulty_level, route)
+            else:
+                generated = self._iter_streamed_questions(difficulty_level, route)
+            questions: List[Dict] = []
+            for question in generated:
+                questions.append(question)
+                yield question
+            
+            # Regenerate only the questions lost to malformed output or duplicates
+            missing_questions = self._generate_missing_questions(difficulty_level, questions, route)
+            yield from missing_questions
+            test_data = self._assemble_test(difficulty_level, questions + missing_questions)
+            if self.test_bank is not None:
+                self.test_bank.add_test(
+                    self.source_field,
+                    self.target_field,
+                    difficulty_level,
+                    self.learner_id,
+                    test_data,
+                    self._test_variant(difficulty_level)
+                )
+        
+        if self.test_bank is not None:
+            self.prefetch_tests()
+        self._record_test(test_data)
+    
+    def prefetch_tests(self) -> None:
+        """Start filling the test bank for the current difficulty level in the background."""
+        if self.test_bank is not None:
+            difficulty_level = self.current_difficulty
+            self.test_bank.request_refill(
+                self.source_field,
+                self.target_field,
+                difficulty_level,
+                self._create_background_test,
+                self._test_variant(difficulty_level)
+            )
+    
+    def _test_variant(self, difficulty_level: int) -> str:
+        """Identify the tests this tutor generates by question count and test generator prompt."""
+        prompt = self._system_prompt("test_generator", difficulty_level=difficulty_level, num_questions=self.test_questions)
+        return f"{self.test_questions}:{prompt.version}"
+    
+    def _create_background_test(self, difficulty_level: int) -> Dict:
+        """Generate a test for the test bank behind interactive calls and on-demand tests."""
+        with request_priority("background"):
+            return self._create_test(difficulty_level)
     
     def evaluate_test(self, test_data: Dict, user_answers: Dict[str, str]) -> Tuple[float, bool]:
         """Evaluate a test and determine if difficulty should increase.
@@ -94,68 +463,954 @@ class CrossDomainTutor:
         Returns:
             Tuple[float, bool]: (score as percentage, whether to increase difficulty)
         """
-        correct_count = 0
-        total_questions = len(test_data["questions"])
-        
-        for i, question in enumerate(test_data["questions"]):
-            if user_answers.get(str(i)) == question["correct_answer"]:
-                correct_count += 1
-        
-        score = (correct_count / total_questions) * 100
+        answer_key = encode_answer_key(test_data)
+        scores, promoted = grade_submissions(answer_key, encode_submissions([user_answers], len(answer_key)))
+        score = float(scores[0])
         
         # Increase difficulty if score is 80% or higher
-        should_increase = score >= 80
-        if should_increase and self.current_difficulty < 5:
-            self.current_difficulty += 1
+        should_increase = bool(promoted[0])
+        current_difficulty = self.current_difficulty
+        if should_increase and current_difficulty < MAX_DIFFICULTY:
+            self.current_difficulty = current_difficulty + 1
         
         return score, should_increase
     
-    def _generate_target_explanation(self, query: str) -> str:
+    def find_test(self, test_id: str) -> Optional[Dict]:
+        """Find a test the learner was given, so it is graded against the stored answer key.
+        
+        Args:
+            test_id (str): The test's fingerprint (see test_bank.fingerprint_test).
+            
+        Returns:
+            Optional[Dict]: The most recent test in test_history with that fingerprint, or None.
+        """
+        for test_data in reversed(self.test_history):
+            if fingerprint_test(test_data) == test_id:
+                return test_data
+        return None
+    
+    def _stream_two_stage(self, query: str, recent_context: List[Dict[str, str]], run: Dict) -> Iterator[str]:
+        """Stream the two-stage pipeline, adapting expert paragraphs as they complete.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            run (Dict): The run record to add stage metrics to.
+            
+        Yields:
+            str: Fragments of the adapted explanation as they arrive.
+        """
+        cached_target = self._cache_get(TARGET_TIER, self._target_key(query, recent_context))
+        if cached_target is not None:
+            self._record_cache_hit(run, "expert", "exact")
+        sections: "queue.Queue[Optional[str]]" = queue.Queue()
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        
+        def produce_sections() -> None:
+            # Step 1: Stream the target field explanation, split into paragraphs
+            try:
+                if cached_target is not None:
+                    fragments: Iterable[str] = [cached_target]
+                else:
+                    fragments = self._stream_completion("expert", self._target_messages(query, recent_context), run)
+                target_parts: List[str] = []
+                for section in _iter_sections(fragments):
+                    if stop.is_set():
+                        return
+                    target_parts.append(section)
+                    sections.put(section)
+                if cached_target is None:
+                    self._cache_set(TARGET_TIER, self._target_key(query, recent_context), "".join(target_parts), run)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                sections.put(None)
+        
+        producer = threading.Thread(target=produce_sections, daemon=True)
+        producer.start()
+        
+        adapted_so_far = ""
+        finished = False
+        try:
+            while not finished:
+                # Wait for the next section, then take everything else already queued
+                pending = [sections.get()]
+                while pending[-1] is not None and not sections.empty():
+                    pending.append(sections.get_nowait())
+                finished = pending[-1] is None
+                batch = "".join(section for section in pending if section is not None)
+                if not batch.strip():
+                    continue
+                
+                # Step 2: Adapt the completed sections for the source field
+                messages = self._adapter_messages(batch, recent_context, adapted_so_far)
+                for fragment in self._stream_completion("adapter", messages, run):
+                    adapted_so_far += fragment
+                    yield fragment
+                if not finished:
+                    adapted_so_far += "\n\n"
+                    yield "\n\n"
+        finally:
+            stop.set()
+        
+        if errors:
+            raise errors[0]
+    
+    def _choose_mode(self, query: str, recent_context: List[Dict[str, str]]) -> str:
+        """Choose the pipeline mode for a query.
+        
+        In "auto" mode short questions without code are answered by the fused
+        pipeline; longer or code-heavy questions get the full two-stage treatment.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            
+        Returns:
+            str: "two_stage" or "fused".
+        """
+        if self.pipeline_mode != "auto":
+            return self.pipeline_mode
+        if "```" in query or len(query.split()) > FUSED_MAX_QUERY_WORDS:
+            return "two_stage"
+        return "fused"
+    
+    def _new_run(self, query: str, recent_context: List[Dict[str, str]], streaming: bool = False) -> Dict:
+        """Start a record of one explanation run, choosing its pipeline mode and models.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            streaming (bool): Whether the explanation is streamed.
+            
+        Returns:
+            Dict: The run record, with the routing decision of each stage under "routes",
+                the run's deadline under "deadline" and the stages whose answer was cut off
+                at max_tokens under "truncated".
+        """
+        mode = self._choose_mode(query, recent_context)
+        routes: Dict[str, Dict] = {}
+        if self.router is not None:
+            difficulty_level = self.current_difficulty
+            for stage in (("fused",) if mode == "fused" else ("expert", "adapter")):
+                routes[stage] = self.router.route(
+                    stage,
+                    self.source_field,
+                    self.target_field,
+                    query,
+                    difficulty_level,
+                    recent_context,
+                    streaming
+                )
+        deadline = self.latency_budget.start() if self.latency_budget is not None else None
+        return {"mode": mode, "cache_hit": False, "stages": [], "routes": routes, "deadline": deadline, "truncated": []}
+    
+    def _route_test(self, difficulty_level: int) -> Optional[Dict]:
+        """Decide which model drafts a test, or None without a router."""
+        if self.router is None:
+            return None
+        return self.router.route("test_generator", self.source_field, self.target_field, difficulty_level=difficulty_level)
+    
+    def _repair_route(self, route: Optional[Dict]) -> Optional[Dict]:
+        """Get the route for topping up a test; a cascade escalates once the draft came up short."""
+        if route is not None and route["policy"] == "cascade" and not route["escalated"]:
+            return self.router.escalate(route)
+        return route
+    
+    def _resolve_route(self, stage: str, run: Optional[Dict], route: Optional[Dict]) -> Optional[Dict]:
+        """Find the routing decision of a call: given explicitly, or taken from the run record."""
+        if route is None and run is not None:
+            route = run.get("routes", {}).get(stage)
+        return route
+    
+    def _needs_escalation(self, route: Optional[Dict], content: str) -> bool:
+        """Check whether a cascade draft explanation failed validation."""
+        return (
+            route is not None
+            and route["policy"] == "cascade"
+            and not route["escalated"]
+            and route["stage"] != "test_generator"
+            and not validate_draft(content)
+        )
+    
+    def _escalate(self, run: Optional[Dict], route: Dict) -> Dict:
+        """Escalate a cascade decision to the strong model and record it in the run."""
+        escalated = self.router.escalate(route)
+        if run is not None:
+            run["routes"][route["stage"]] = escalated
+        return escalated
+    
+    def _call_options(self, stage: str, run: Optional[Dict], options: Dict) -> Dict:
+        """Add the stage's deadline to a call's options as its timeout.
+        
+        Raises:
+            DeadlineExceeded: If the run has no time left.
+        """
+        if self.latency_budget is None or "timeout" in options:
+            return options
+        deadline = run.get("deadline") if run is not None else None
+        return {**options, "timeout": self.latency_budget.stage_timeout(stage, deadline)}
+    
+    def _system_prompt(self, role: str, **params) -> RenderedPrompt:
+        """Get the rendered system prompt of a role in this tutor's preset."""
+        return self.prompts.render_selected(role, self.source_field, self.target_field, self.prompt_presets, **params)
+    
+    def _prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Count the tokens of a call's messages, reusing the registry's system prompt counts."""
+        return sum(
+            (self.prompts.count_tokens(msg["content"]) if msg["role"] == "system" else count_tokens(msg["content"]))
+            + MESSAGE_OVERHEAD_TOKENS
+            for msg in messages
+        )
+    
+    def _budget(self, stage: str, model: str, messages: List[Dict[str, str]], options: Dict) -> Tuple[int, Dict]:
+        """Fit a call into its model's context window.
+        
+        The completion is capped at the stage's max_tokens (or the caller's), and at
+        whatever the prompt leaves of the context window. The adapter's cap grows with
+        the explanation it adapts, so a long expert answer is not cut off in adaptation.
+        
+        Returns:
+            Tuple[int, Dict]: The prompt tokens and the options with max_tokens set.
+            
+        Raises:
+            ValueError: If the prompt leaves less than MIN_COMPLETION_TOKENS for the completion.
+        """
+        prompt_tokens = self._prompt_tokens(messages)
+        room = context_limit(model) - prompt_tokens
+        if room < MIN_COMPLETION_TOKENS:
+            raise ValueError(
+                f"The {stage} prompt takes {prompt_tokens} tokens, which leaves too little room "
+                f"for an answer in the {context_limit(model)}-token context window of {model}"
+            )
+        if "max_tokens" in options:
+            max_tokens = options["max_tokens"]
+        elif stage == "test_generator":
+            max_tokens = TEST_TOKENS_PER_QUESTION * self.test_questions + TEST_ENVELOPE_TOKENS
+        elif stage == "adapter":
+            max_tokens = max(STAGE_MAX_TOKENS["adapter"], round(ADAPTER_TOKENS_PER_INPUT_TOKEN * count_tokens(messages[-1]["content"])))
+        else:
+            max_tokens = STAGE_MAX_TOKENS.get(stage, room)
+        return prompt_tokens, {**options, "max_tokens": min(max_tokens, room)}
+    
+    def _admit(self, stage: str, run: Optional[Dict], prompt_tokens: int, options: Dict) -> Tuple[Optional[Ticket], Dict]:
+        """Wait until the scheduler lets a call through, then get the call's options.
+        
+        The wait is bounded by the call's timeout and counts against the run's deadline.
+        
+        Returns:
+            Tuple[Optional[Ticket], Dict]: The admission (None without a scheduler) and the call options.
+            
+        Raises:
+            DeadlineExceeded: If the call was not admitted in time.
+            SchedulerOverloaded: If too many calls of its priority class are waiting.
+        """
+        if self.scheduler is None:
+            return None, self._call_options(stage, run, options)
+        ticket = self.scheduler.acquire(
+            current_priority(stage),
+            self.learner_id,
+            estimate_call_tokens(prompt_tokens, options.get("max_tokens")),
+            self._call_options(stage, run, options).get("timeout")
+        )
+        try:
+            return ticket, self._ticketed(ticket, self._call_options(stage, run, options))
+        except Exception:
+            self._release(ticket, 0)
+            raise
+    
+    def _ticketed(self, ticket: Ticket, call_options: Dict) -> Dict:
+        """Hand the ticket to a backend that retries or hedges calls, so it charges those attempts too."""
+        return {**call_options, "ticket": ticket} if self.backend.handles_retries else call_options
+    
+    def _release(self, ticket: Optional[Ticket], used_tokens: int) -> None:
+        """Settle the tokens of a finished call with the scheduler."""
+        if ticket is not None:
+            self.scheduler.release(ticket, used_tokens)
+    
+    def _finish_run(self, run: Dict, started: float) -> None:
+        """Total a run record and publish it as last_run."""
+        run["latency_s"] = time.perf_counter() - started
+        run["prompt_tokens"] = sum(stage["prompt_tokens"] for stage in run["stages"])
+        run["completion_tokens"] = sum(stage["completion_tokens"] for stage in run["stages"])
+        run["cost_usd"] = sum(stage["cost_usd"] for stage in run["stages"])
+        self.last_run = run
+    
+    def _record_stage(
+        self,
+        run: Optional[Dict],
+        stage: str,
+        model: str,
+        started: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+        first_token_at: Optional[float] = None,
+        retries: int = 0,
+        error: Optional[BaseException] = None,
+        route: Optional[Dict] = None,
+        ticket: Optional[Ticket] = None
+    ) -> None:
+        """Add the metrics of one LLM call to a run record and report it to the instrumentation.
+        
+        Failed calls are only reported to the instrumentation.
+        """
+        route_name = None
+        if route is not None:
+            route_name = f"{route['policy']}:{route['tier']}" + (":escalated" if route["escalated"] else "")
+        latency = time.perf_counter() - started
+        time_to_first_token = first_token_at - started if first_token_at is not None else None
+        queue_wait = ticket.wait_s if ticket is not None else 0.0
+        if self.instrumentation is not None:
+            self.instrumentation.record_call(
+                self.learner_id,
+                stage,
+                model,
+                latency,
+                prompt_tokens,
+                completion_tokens,
+                time_to_first_token,
+                retries,
+                error=f"{type(error).__name__}: {error}" if error is not None else None,
+                route=route_name,
+                priority=ticket.priority if ticket is not None else None,
+                queue_wait_s=queue_wait
+            )
+        if run is None or error is not None:
+            return
+        run["stages"].append({
+            "stage": stage,
+            "model": model,
+            "latency_s": latency,
+            "time_to_first_token_s": time_to_first_token,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens),
+            "retries": retries,
+            "route": route_name,
+            "queue_wait_s": queue_wait
+        })
+    
+    def _note_truncation(self, run: Optional[Dict], stage: str, finish_reason: Optional[str]) -> None:
+        """Remember a stage whose answer was cut off at max_tokens, so the run does not cache it."""
+        if run is not None and finish_reason == "length" and stage not in run["truncated"]:
+            run["truncated"].append(stage)
+    
+    def _record_cache_hit(self, run: Optional[Dict], stage: str, cache_name: str) -> None:
+        """Report a stage served from a cache instead of the LLM.
+        
+        Args:
+            run (Optional[Dict]): The run record of the explanation.
+            stage (str): The pipeline stage the cache replaced.
+            cache_name (str): "prefill", "exact", "semantic" or "inflight" (joined an identical request in flight).
+        """
+        if run is not None and stage == "adapter":
+            run["cache_hit"] = True
+        if self.instrumentation is not None:
+            self.instrumentation.record_call(self.learner_id, stage, f"cache:{cache_name}", 0.0, cache_hit=True)
+    
+    def _recent_context(self) -> List[Dict[str, str]]:
+        """Get the conversation messages to include as prompt context.
+        
+        Returns:
+            List[Dict[str, str]]: The rolling summary (if any) and the recent turns that fit the budget.
+        """
+        self._sync_session()
+        return self.context.messages()
+    
+    def _sync_session(self) -> None:
+        """Reload the context window if the stored session changed, e.g. on another worker.
+        
+        Only the summary and the turns of the live window are loaded.
+        """
+        if self.session_store is None:
+            return
+        state = self.session_store.load(self.learner_id, self.source_field, self.target_field)
+        if state is None or state["revision"] == self._session_revision:
+            return
+        self.context.clear()
+        for turn in self.session_store.recent_turns(self.learner_id, self.source_field, self.target_field, state["window_turns"]):
+            self.context.add(turn["role"], turn["content"])
+        self.context.summary = state["summary"]
+        self._session_revision = state["revision"]
+    
+    def _persist_exchange(self, query: str, answer: str) -> None:
+        """Store an exchange with the current summary and window size."""
+        if self.session_store is None:
+            return
+        self._advance_revision(self.session_store.append_turns(
+            self.learner_id,
+            self.source_field,
+            self.target_field,
+            [{"role": "user", "content": query}, {"role": "assistant", "content": answer}],
+            summary=self.context.summary,
+            window_turns=len(self.context.turns)
+        ))
+    
+    def _advance_revision(self, revision: int) -> None:
+        """Accept a stored revision created by this tutor's own write.
+        
+        If another worker wrote in between, the window stays stale and is reloaded on
+        the next sync.
+        """
+        if revision == self._session_revision + 1:
+            self._session_revision = revision
+    
+    def _record_test(self, test_data: Dict) -> None:
+        """Add a test to the test history."""
+        if self.session_store is not None:
+            self._advance_revision(
+                self.session_store.append_test(self.learner_id, self.source_field, self.target_field, test_data)
+            )
+        else:
+            self._test_history.append(test_data)
+    
+    def _target_key(self, query: str, recent_context: List[Dict[str, str]]) -> str:
+        """Build the cache key for the expert explanation of a query."""
+        return target_key(self.target_field, query, recent_context)
+    
+    def _adapted_key(self, query: str, recent_context: List[Dict[str, str]]) -> str:
+        """Build the cache key for the adapted explanation of a query."""
+        return adapted_key(self.source_field, self.target_field, query, recent_context)
+    
+    def _lookup_adapted(self, query: str, recent_context: List[Dict[str, str]], run: Dict) -> Optional[str]:
+        """Look up a ready adapted explanation in the prefill store, the exact-match, then the semantic cache.
+        
+        Curriculum topics are standalone questions, so a prefilled answer is used
+        whatever the conversation so far.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            run (Dict): The run record, marked as a cache hit if an explanation is found.
+            
+        Returns:
+            Optional[str]: The cached adapted explanation, or None.
+        """
+        if self.prefill_store is not None:
+            adapted_explanation = self.prefill_store.get(ADAPTED_TIER, self._adapted_key(query, []), self._prefill_version)
+            if adapted_explanation is not None:
+                self._record_cache_hit(run, "adapter", "prefill")
+                return adapted_explanation
+        adapted_explanation = self._cache_get(ADAPTED_TIER, self._adapted_key(query, recent_context))
+        if adapted_explanation is not None:
+            self._record_cache_hit(run, "adapter", "exact")
+            return adapted_explanation
+        adapted_explanation = self._semantic_lookup(query, recent_context)
+        if adapted_explanation is not None:
+            self._record_cache_hit(run, "adapter", "semantic")
+        return adapted_explanation
+    
+    def _cache_get(self, tier: str, key: str) -> Optional[str]:
+        """Look up an explanation cached under the current prompts, if a cache is configured."""
+        return self.cache.get(tier, self._versioned_key(tier, key)) if self.cache is not None else None
+    
+    def _cache_set(self, tier: str, key: str, value: str, run: Optional[Dict] = None) -> None:
+        """Store an explanation under the current prompts, if a cache is configured and it was not cut off."""
+        if self.cache is not None and value and not self._truncated(run, tier):
+            self.cache.set(tier, self._versioned_key(tier, key), value)
+    
+    def _truncated(self, run: Optional[Dict], tier: str) -> bool:
+        """Check whether a stage feeding a cache tier was cut off at max_tokens in a run."""
+        return run is not None and any(stage in run["truncated"] for stage in TRUNCATION_SPOILS[tier])
+    
+    def _versioned_key(self, tier: str, key: str) -> str:
+        """Qualify a cache key with the prompt version of its tier."""
+        return f"{key}:{self._prompt_versions[tier]}"
+    
+    def _semantic_lookup(self, query: str, recent_context: List[Dict[str, str]]) -> Optional[str]:
+        """Find a stored explanation for a near-duplicate question.
+        
+        Only standalone questions are matched semantically; follow-ups depend on the
+        conversation and are left to the exact-match cache.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            
+        Returns:
+            Optional[str]: The stored adapted explanation, or None.
+        """
+        if self.semantic_cache is None or recent_context:
+            return None
+        return self.semantic_cache.lookup(self.source_field, self.target_field, query, self._prompt_versions[ADAPTED_TIER])
+    
+    def _semantic_insert(self, query: str, recent_context: List[Dict[str, str]], answer: str, run: Optional[Dict] = None) -> None:
+        """Store the explanation of a standalone question in the semantic cache, unless it was cut off."""
+        if self.semantic_cache is not None and not recent_context and answer and not self._truncated(run, ADAPTED_TIER):
+            self.semantic_cache.insert(self.source_field, self.target_field, query, answer, self._prompt_versions[ADAPTED_TIER])
+    
+    def _record_exchange(self, query: str, answer: str) -> None:
+        """Append a question and its adapted answer to the conversation history.
+        
+        Once the context outgrows its budget, the oldest turns are removed at once and
+        folded into the summary in the background, ready for a later turn.
+        
+        Args:
+            query (str): The user's question.
+            answer (str): The adapted explanation returned to the user.
+        """
+        self.context.add("user", query)
+        self.context.add("assistant", answer)
+        overflow = self.context.take_overflow() if self.context.over_budget() else []
+        self._persist_exchange(query, answer)
+        if overflow:
+            self._compaction = _summary_executor.submit(self._fold_summary, overflow, self._compaction)
+    
+    def _fold_summary(self, overflow: List[Dict[str, str]], previous: Optional[Future]) -> None:
+        """Fold removed turns into the rolling summary, after any earlier fold finishes."""
+        if previous is not None:
+            # Submitted earlier, so it is already running or done and this wait cannot starve the pool
+            try:
+                previous.result()
+            except Exception:
+                pass
+        try:
+            summary = self._summarize(self.context.summary, overflow)
+        except Exception:
+            summary = ""
+        self.context.fold(summary or extractive_summary(self.context.summary, overflow, self.context.max_summary_tokens))
+        if self.session_store is not None:
+            self._advance_revision(
+                self.session_store.save(self.learner_id, self.source_field, self.target_field, summary=self.context.summary)
+            )
+    
+    def _summary_messages(self, summary: str, turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Build the messages for folding turns into the rolling summary.
+        
+        Args:
+            summary (str): The current summary.
+            turns (List[Dict[str, str]]): The turns to fold in, oldest first.
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the summarizer.
+        """
+        transcript = "\n\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in turns)
+        max_words = int(self.context.max_summary_tokens * 0.7)
+        return [
+            {"role": "system", "content": self._system_prompt("summarizer", max_words=max_words).text},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNext part of the conversation:\n{transcript}"}
+        ]
+    
+    def _summarize(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold turns into the rolling conversation summary with a cheap model.
+        
+        Args:
+            summary (str): The current summary.
+            turns (List[Dict[str, str]]): The turns to fold in, oldest first.
+            
+        Returns:
+            str: The updated summary.
+        """
+        return self._complete(
+            "summarizer",
+            self._summary_messages(summary, turns),
+            model=SUMMARY_MODEL,
+            temperature=0.3,
+            max_tokens=self.context.max_summary_tokens
+        )
+    
+    def _target_messages(self, query: str, recent_context: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Build the messages for the target field explanation.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the expert stage.
+        """
+        return [
+            {"role": "system", "content": self._system_prompt("expert").text},
+            *[{"role": msg["role"], "content": msg["content"]} for msg in recent_context],
+            {"role": "user", "content": query}
+        ]
+    
+    def _adapter_messages(
+        self,
+        target_explanation: str,
+        recent_context: List[Dict[str, str]],
+        adapted_so_far: str = ""
+    ) -> List[Dict[str, str]]:
+        """Build the messages for adapting an explanation to the source field.
+        
+        Args:
+            target_explanation (str): The explanation (or next part of it) in the target field.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            adapted_so_far (str): Adapted text already sent to the user when streaming.
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the adapter stage.
+        """
+        messages = [
+            {"role": "system", "content": self._system_prompt("adapter").text},
+            *[{"role": msg["role"], "content": msg["content"]} for msg in recent_context]
+        ]
+        if not adapted_so_far:
+            messages.append({"role": "user", "content": f"Please adapt this explanation for someone with {self.source_field} background:\n\n{target_explanation}"})
+        else:
+            messages.append({"role": "assistant", "content": adapted_so_far})
+            messages.append({"role": "user", "content": f"Continue adapting the explanation with its next part, without repeating what you already covered:\n\n{target_explanation}"})
+        return messages
+    
+    def _create_test(self, difficulty_level: int) -> Dict:
+        """Generate a new test with the LLM.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            
+        Returns:
+            Dict: The test data.
+        """
+        # Generate the test
+        route = self._route_test(difficulty_level)
+        if self.test_generation_mode == "parallel":
+            questions = list(self._iter_parallel_questions(difficulty_level, route))
+        else:
+            content = self._complete("test_generator", self._test_messages(difficulty_level), route=route)
+            questions = self._new_questions([], parse_questions(content))
+        
+        # Keep every valid question and regenerate only the ones that are missing
+        questions += self._generate_missing_questions(difficulty_level, questions, route)
+        return self._assemble_test(difficulty_level, questions)
+    
+    def _iter_streamed_questions(self, difficulty_level: int, route: Optional[Dict] = None) -> Iterator[Dict]:
+        """Stream a whole test from one call, yielding each valid question as it completes.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            route (Optional[Dict]): The routing decision for the test generator.
+            
+        Yields:
+            Dict: The questions, in order.
+        """
+        parser = QuestionStreamParser()
+        accepted: List[Dict] = []
+        for fragment in self._stream_completion("test_generator", self._test_messages(difficulty_level), route=route):
+            new_questions = self._new_questions(accepted, parser.feed(fragment))
+            accepted += new_questions
+            yield from new_questions
+    
+    def _iter_parallel_questions(self, difficulty_level: int, route: Optional[Dict] = None) -> Iterator[Dict]:
+        """Generate slices of a test concurrently, yielding questions as each slice completes.
+        
+        Each call asks for a few questions at its own point on the difficulty ramp and
+        from its own angle, so wall time stays close to one short call however many
+        questions the test has. Near-duplicates across slices are dropped, and a failed
+        slice only leaves its questions to be topped up afterwards.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            route (Optional[Dict]): The routing decision for the test generator.
+            
+        Yields:
+            Dict: The accepted questions, in completion order.
+        """
+        sizes = [min(PARALLEL_SLICE_SIZE, self.test_questions - start) for start in range(0, self.test_questions, PARALLEL_SLICE_SIZE)]
+        accepted: List[Dict] = []
+        with ThreadPoolExecutor(max_workers=min(len(sizes), MAX_PARALLEL_TEST_REQUESTS)) as executor:
+            futures = [
+                # Copy the context so the slices keep the caller's priority class
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._complete,
+                    "test_generator",
+                    self._slice_messages(difficulty_level, i, len(sizes), size),
+                    route=route
+                )
+                for i, size in enumerate(sizes)
+            ]
+            for future in as_completed(futures):
+                try:
+                    content = future.result()
+                except Exception:
+                    continue
+                new_questions = self._new_questions(accepted, parse_questions(content))
+                accepted += new_questions
+                yield from new_questions
+    
+    def _generate_missing_questions(self, difficulty_level: int, questions: List[Dict], route: Optional[Dict] = None) -> List[Dict]:
+        """Generate the questions a test is missing after malformed output or duplicates.
+        
+        In a cascade the missing questions come from the strong model.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            questions (List[Dict]): The valid questions received so far.
+            route (Optional[Dict]): The routing decision the draft was generated with.
+            
+        Returns:
+            List[Dict]: The additional questions.
+        """
+        route = self._repair_route(route)
+        missing_questions: List[Dict] = []
+        for _ in range(MAX_TEST_REPAIRS):
+            have = questions + missing_questions
+            if len(have) >= self.test_questions:
+                break
+            content = self._complete(
+                "test_generator",
+                self._missing_question_messages(difficulty_level, have, self.test_questions - len(have)),
+                route=route
+            )
+            missing_questions += self._new_questions(have, parse_questions(content))
+        return missing_questions
+    
+    def _fused_messages(self, query: str, recent_context: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Build the messages for explaining and adapting in a single call.
+        
+        Args:
+            query (str): The user's question.
+            recent_context (List[Dict[str, str]]): Recent conversation messages.
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the fused pipeline.
+        """
+        return [
+            {"role": "system", "content": self._system_prompt("fused").text},
+            *[{"role": msg["role"], "content": msg["content"]} for msg in recent_context],
+            {"role": "user", "content": query}
+        ]
+    
+    def _test_messages(self, difficulty_level: int) -> List[Dict[str, str]]:
+        """Build the messages for generating a test.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the test generator.
+        """
+        # Get the test generator prompt
+        prompt = self._system_prompt("test_generator", difficulty_level=difficulty_level, num_questions=self.test_questions).text
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": f"Generate a test with {self.test_questions} MCQs."}
+        ]
+    
+    def _slice_messages(self, difficulty_level: int, index: int, slices: int, size: int) -> List[Dict[str, str]]:
+        """Build the messages for generating one slice of a parallel test.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            index (int): The position of the slice, from the easiest to the hardest.
+            slices (int): The number of slices in the test.
+            size (int): The number of questions in the slice.
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the test generator.
+        """
+        prompt = self._system_prompt("test_generator", difficulty_level=difficulty_level, num_questions=size).text
+        position = "the easier end" if index < slices / 3 else "the harder end" if index >= 2 * slices / 3 else "the middle"
+        angle = QUESTION_ANGLES[index % len(QUESTION_ANGLES)]
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": f"Generate {size} MCQs. They are part {index + 1} of {slices} of a longer test: pitch them at {position} of difficulty level {difficulty_level} and focus on {angle}."}
+        ]
+    
+    def _missing_question_messages(self, difficulty_level: int, questions: List[Dict], missing: int) -> List[Dict[str, str]]:
+        """Build the messages for topping up a test with the questions it is missing.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            questions (List[Dict]): The valid questions the test already has.
+            missing (int): How many questions to generate.
+            
+        Returns:
+            List[Dict[str, str]]: The chat messages for the test generator.
+        """
+        existing = "\n".join(f"- {question['question']}" for question in questions)
+        request = f"Generate {missing} more MCQs in the same JSON format."
+        if existing:
+            request += f" Do not repeat these questions:\n{existing}"
+        return [
+            {"role": "system", "content": self._system_prompt("test_generator", difficulty_level=difficulty_level, num_questions=missing).text},
+            {"role": "user", "content": request}
+        ]
+    
+    def _new_questions(self, questions: List[Dict], candidates: List[Dict]) -> List[Dict]:
+        """Keep the candidates that fit in the test and do not repeat a question it already has."""
+        room = self.test_questions - len(questions)
+        if room <= 0 or not candidates:
+            return []
+        return drop_near_duplicates(candidates, questions)[:room]
+    
+    def _assemble_test(self, difficulty_level: int, questions: List[Dict]) -> Dict:
+        """Build the test data from its questions.
+        
+        Args:
+            difficulty_level (int): The difficulty level (1-5).
+            questions (List[Dict]): The valid questions.
+            
+        Returns:
+            Dict: The test data.
+            
+        Raises:
+            ValueError: If there are no valid questions.
+        """
+        if not questions:
+            raise ValueError("Failed to generate a valid test format")
+        return {
+            "questions": questions,
+            "difficulty_level": difficulty_level,
+            "total_questions": len(questions)
+        }
+    
+    def _complete(
+        self,
+        stage: str,
+        messages: List[Dict[str, str]],
+        run: Optional[Dict] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        route: Optional[Dict] = None,
+        **options
+    ) -> str:
+        """Run a chat completion and record its metrics.
+        
+        A cascade draft explanation that fails validation is retried on the strong model.
+        
+        Args:
+            stage (str): The pipeline stage making the call.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            run (Optional[Dict]): The run record to add stage metrics to.
+            model (Optional[str]): The model to use; defaults to the routed model.
+            temperature (float): The sampling temperature.
+            route (Optional[Dict]): The routing decision; defaults to the stage's decision in the run.
+            **options: Extra completion options such as max_tokens.
+            
+        Returns:
+            str: The completion content.
+        """
+        route = self._resolve_route(stage, run, route)
+        model = model or (route["model"] if route is not None else STRONG_MODEL)
+        prompt_tokens, budgeted = self._budget(stage, model, messages, options)
+        ticket, call_options = self._admit(stage, run, prompt_tokens, budgeted)
+        stats = CallStats()
+        started = time.perf_counter()
+        try:
+            completion = self.backend.complete(model, messages, temperature, stats=stats, **call_options)
+        except Exception as e:
+            self._release(ticket, prompt_tokens)
+            self._record_stage(run, stage, model, started, prompt_tokens, 0, retries=stats.retries, error=e, route=route, ticket=ticket)
+            raise
+        self._release(ticket, completion.prompt_tokens + completion.completion_tokens)
+        self._record_stage(
+            run,
+            stage,
+            model,
+            started,
+            completion.prompt_tokens,
+            completion.completion_tokens,
+            retries=stats.retries,
+            route=route,
+            ticket=ticket
+        )
+        if self._needs_escalation(route, completion.content):
+            return self._complete(stage, messages, run, None, temperature, self._escalate(run, route), **options)
+        self._note_truncation(run, stage, completion.finish_reason)
+        return completion.content
+    
+    def _stream_completion(
+        self,
+        stage: str,
+        messages: List[Dict[str, str]],
+        run: Optional[Dict] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        route: Optional[Dict] = None,
+        **options
+    ) -> Iterator[str]:
+        """Stream a chat completion and record its metrics.
+        
+        Token usage is not reported for streams, so it is counted locally.
+        
+        Args:
+            stage (str): The pipeline stage making the call.
+            messages (List[Dict[str, str]]): The chat messages to send.
+            run (Optional[Dict]): The run record to add stage metrics to.
+            model (Optional[str]): The model to use; defaults to the routed model.
+            temperature (float): The sampling temperature.
+            route (Optional[Dict]): The routing decision; defaults to the stage's decision in the run.
+            **options: Extra completion options such as max_tokens.
+            
+        Yields:
+            str: Content fragments as they arrive.
+        """
+        route = self._resolve_route(stage, run, route)
+        model = model or (route["model"] if route is not None else STRONG_MODEL)
+        prompt_tokens, budgeted = self._budget(stage, model, messages, options)
+        ticket, call_options = self._admit(stage, run, prompt_tokens, budgeted)
+        stats = CallStats()
+        started = time.perf_counter()
+        first_token_at = None
+        parts: List[str] = []
+        try:
+            for fragment in self.backend.stream(model, messages, temperature, stats=stats, **call_options):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(fragment)
+                yield fragment
+        except Exception as e:
+            self._record_stage(
+                run,
+                stage,
+                model,
+                started,
+                prompt_tokens,
+                count_tokens("".join(parts)),
+                first_token_at,
+                retries=stats.retries,
+                error=e,
+                route=route,
+                ticket=ticket
+            )
+            raise
+        finally:
+            # Also settles streams the caller stopped reading
+            self._release(ticket, prompt_tokens + count_tokens("".join(parts)))
+        self._record_stage(
+            run,
+            stage,
+            model,
+            started,
+            prompt_tokens,
+            count_tokens("".join(parts)),
+            first_token_at,
+            retries=stats.retries,
+            route=route,
+            ticket=ticket
+        )
+        self._note_truncation(run, stage, stats.finish_reason)
+    
+    def _generate_target_explanation(self, query: str, run: Optional[Dict] = None) -> str:
         """Generate a detailed explanation in the target field.
         
         Args:
             query (str): The user's question.
+            run (Optional[Dict]): The run record to add stage metrics to.
             
         Returns:
             str: A detailed explanation in the target field.
         """
         # Get recent context
-        recent_context = self.conversation_history[-4:] if self.conversation_history else []
+        recent_context = self._recent_context()
         
         # Generate the explanation
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": get_expert_prompt(self.target_field)},
-                *[{"role": msg["role"], "content": msg["content"]} for msg in recent_context],
-                {"role": "user", "content": query}
-            ],
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content
+        return self._complete("expert", self._target_messages(query, recent_context), run)
     
-    def _adapt_for_source_field(self, target_explanation: str) -> str:
+    def _adapt_for_source_field(self, target_explanation: str, run: Optional[Dict] = None) -> str:
         """Adapt an explanation for the source field.
         
         Args:
             target_explanation (str): The explanation in the target field.
+            run (Optional[Dict]): The run record to add stage metrics to.
             
         Returns:
             str: An explanation adapted for the source field.
         """
         # Get recent context
-        recent_context = self.conversation_history[-4:] if self.conversation_history else []
+        recent_context = self._recent_context()
         
         # Adapt the explanation
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": get_adapter_prompt(self.source_field, self.target_field)},
-                *[{"role": msg["role"], "content": msg["content"]} for msg in recent_context],
-                {"role": "user", "content": f"Please adapt this explanation for someone with {self.source_field} background:\n\n{target_explanation}"}
-            ],
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content 
\ No newline at end of file
+        return self._complete("adapter", self._adapter_messages(target_explanation, recent_context), run)
\ No newline at end of file
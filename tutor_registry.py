@@ -0,0 +1,180 @@
+"""Session-scoped tutor registry for the Cross-Domain Learning Tutor.
+
+Building a CrossDomainTutor per request creates a fresh OpenAI client (and with it a
+fresh TCP/TLS connection) and throws away the conversation history and adaptive
+difficulty. The registry keeps one tutor per (session, field pair), shares a single
+process-wide client with a tuned keep-alive connection pool between them, and evicts
+tutors that have been idle for too long.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from tutor_pipeline import CrossDomainTutor
+
+
+def create_shared_client(
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 120.0,
+    timeout: float = 120.0,
+    max_retries: int = 2
+) -> OpenAI:
+    """Create an OpenAI client backed by a pooled keep-alive HTTP connection pool.
+
+    Args:
+        max_connections (int): The maximum number of concurrent connections.
+        max_keepalive_connections (int): How many idle connections are kept open for reuse.
+        keepalive_expiry (float): Seconds an idle connection is kept open.
+        timeout (float): The default request timeout in seconds.
+        max_retries (int): Retries made inside the SDK; pass 0 when a ResilientBackend retries instead.
+
+    Returns:
+        OpenAI: A client that is safe to share between threads.
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=10.0)
+    )
+    return OpenAI(http_client=http_client, max_retries=max_retries)
+
+
+def create_shared_async_client(
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 120.0,
+    timeout: float = 120.0,
+    max_retries: int = 2
+) -> AsyncOpenAI:
+    """Create an AsyncOpenAI client backed by a pooled keep-alive HTTP connection pool.
+
+    Args:
+        max_connections (int): The maximum number of concurrent connections.
+        max_keepalive_connections (int): How many idle connections are kept open for reuse.
+        keepalive_expiry (float): Seconds an idle connection is kept open.
+        timeout (float): The default request timeout in seconds.
+        max_retries (int): Retries made inside the SDK; pass 0 when a ResilientBackend retries instead.
+
+    Returns:
+        AsyncOpenAI: A client to share between the tutors of one event loop.
+    """
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=10.0)
+    )
+    return AsyncOpenAI(http_client=http_client, max_retries=max_retries)
+
+
+class TutorRegistry:
+    """Keeps one tutor per session and field pair, sharing one OpenAI client."""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any] = create_shared_client,
+        tutor_factory: Callable[..., CrossDomainTutor] = CrossDomainTutor,
+        idle_timeout: float = 30 * 60,
+        sweep_interval: float = 60.0,
+        **tutor_kwargs: Any
+    ):
+        """Initialize the registry.
+
+        Args:
+            client_factory (Callable[[], Any]): Creates the process-wide client on first use.
+            tutor_factory (Callable[..., CrossDomainTutor]): Creates a tutor for a session.
+            idle_timeout (float): Seconds after which an unused tutor is evicted.
+            sweep_interval (float): Minimum seconds between idle sweeps.
+            **tutor_kwargs: Extra keyword arguments for every tutor, such as shared caches.
+        """
+        self.client_factory = client_factory
+        self.tutor_factory = tutor_factory
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.tutor_kwargs = tutor_kwargs
+        self._client: Optional[Any] = None
+        self._tutors: Dict[Tuple[str, str, str], CrossDomainTutor] = {}
+        self._last_used: Dict[Tuple[str, str, str], float] = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        """The process-wide client shared by every tutor."""
+        with self._lock:
+            if self._client is None:
+                self._client = self.client_factory()
+            return self._client
+
+    def get(self, session_id: str, source_field: str, target_field: str) -> CrossDomainTutor:
+        """Get the tutor for a session and field pair, creating it if needed.
+
+        Args:
+            session_id (str): Identifies the user session.
+            source_field (str): The field the user is proficient in.
+            target_field (str): The field the user wants to learn about.
+
+        Returns:
+            CrossDomainTutor: The session's tutor, with its history and difficulty intact.
+        """
+        key = (session_id, source_field.strip(), target_field.strip())
+        client = self.client
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._evict_idle(now)
+            tutor = self._tutors.get(key)
+            if tutor is None:
+                tutor = self.tutor_factory(
+                    key[1],
+                    key[2],
+                    client=client,
+                    learner_id=session_id,
+                    **self.tutor_kwargs
+                )
+                self._tutors[key] = tutor
+            self._last_used[key] = now
+            return tutor
+
+    def evict_idle(self) -> int:
+        """Evict every tutor that has been idle longer than the timeout.
+
+        Returns:
+            int: The number of tutors evicted.
+        """
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def remove_session(self, session_id: str) -> None:
+        """Drop every tutor belonging to a session.
+
+        Args:
+            session_id (str): Identifies the user session.
+        """
+        with self._lock:
+            for key in [key for key in self._tutors if key[0] == session_id]:
+                del self._tutors[key]
+                del self._last_used[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tutors)
+
+    def _evict_idle(self, now: float) -> int:
+        """Evict idle tutors. Must be called with the lock held."""
+        self._last_sweep = now
+        expired = [key for key, last_used in self._last_used.items() if now - last_used > self.idle_timeout]
+        for key in expired:
+            del self._tutors[key]
+            del self._last_used[key]
+        return len(expired)